@@ -22,6 +22,11 @@ from beacon.request import ontologies
 from beacon.response import middlewares
 from beacon.request.routes import routes
 from beacon.db import client
+from beacon.db.sample_index import SAMPLE_MEMBERSHIP_INDEX
+from beacon.db.variant_index import VARIANT_POSITION_INDEX
+from beacon.request.datasets_registry import DATASET_REGISTRY
+from beacon.request.jobs import QUERY_JOBS
+from beacon.utils.auth import open_permissions_session, close_permissions_session
 
 LOG = logging.getLogger(__name__)
 
@@ -43,12 +48,40 @@ async def initialize(app):
 
     setattr(conf, 'update_datetime', datetime.now().isoformat())
 
+    # connection pool for the permissions server
+    await open_permissions_session()
+
+    # load the datasets before the first request
+    try:
+        await DATASET_REGISTRY.refresh()
+    except Exception as e:
+        LOG.error(f"Couldn't load the datasets from the DB, will retry on the first request: {e}")
+
+    # variant positions, indexed in the background if there are no snapshots
+    if VARIANT_POSITION_INDEX.enabled:
+        try:
+            await VARIANT_POSITION_INDEX.load()
+        except Exception as e:
+            LOG.error(f"Couldn't load the variant position index, will index on the first queries: {e}")
+
+    # samples of the variants, indexed in the background
+    if SAMPLE_MEMBERSHIP_INDEX.enabled:
+        try:
+            await SAMPLE_MEMBERSHIP_INDEX.load()
+        except Exception as e:
+            LOG.error(f"Couldn't load the sample membership index, will index on the first queries: {e}")
+
+    # removal of the expired query jobs
+    QUERY_JOBS.start()
+
     LOG.info("Initialization done.")
 
 
 async def destroy(app):
     """Upon server close, close the DB connections."""
     LOG.info("Shutting down.")
+    await QUERY_JOBS.close()
+    await close_permissions_session()
     client.close()
 
 
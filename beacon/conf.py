@@ -23,6 +23,57 @@ default_beacon_granularity = "record"
 max_beacon_granularity = "record"
 MAX_LIMIT = 100
 
+#
+# Query execution
+#
+query_concurrency = 8  # max number of per-dataset queries running at the same time
+group_dataset_queries = True  # query all datasets in one roundtrip (False: one query per dataset)
+facet_max_datasets = 8  # max number of datasets whose pages are taken in one aggregation (see get_documents_by_dataset)
+datasets_refresh_interval = 60  # seconds between reloads of the dataset ids in the DB
+json_encoder = 'orjson'  # 'orjson' (encodes whole records in C, if installed) or 'python'
+result_cache_size = 256  # MB of query results kept in memory (0 disables the cache)
+result_cache_ttl = 300  # seconds a cached query result is reused
+coalesce_queries = True  # identical queries running at the same time share one DB query
+boolean_by_dataset = True  # boolean responses tell which datasets have hits (False: only if any has, the query stops at the first hit)
+batch_max_queries = 100  # max number of queries of a batch (POST /api/g_variants/batch)
+# queries run in the background (POST /api/g_variants/jobs), their records spooled to query_jobs_dir
+query_jobs_dir = '/tmp/beacon_jobs'
+query_job_workers = 2  # jobs running at the same time
+query_job_max_jobs = 100  # jobs queued or running, more are refused
+query_job_max_time = 600  # seconds of the time limit of the DB queries of a job (10 for the requests)
+query_job_page_size = 1000  # records spooled at a time, and max limit of the results pages
+query_job_ttl = 3600  # seconds the results of a finished job are kept
+query_job_max_retained = 1000  # finished jobs kept, the oldest are removed before their ttl
+query_job_purge_interval = 60  # seconds between the removals of the expired jobs
+query_job_max_records = 1000000  # records spooled by a job, it stops (truncated) at the first limit
+query_job_max_bytes = 1024 ** 3  # bytes of the spool file of a job
+# how the results of each collection are counted (default: 'exact'):
+#   'capped': stops at count_cap results, reported as a lower bound
+#   'estimated': region queries of genomicVariations from the per-bin statistics of beacon/db/count_stats.py,
+#                the rest capped
+count_policies = {
+    'genomicVariations': 'exact',
+}
+count_cap = 10000
+count_stats_bin_size = 100000  # bases of the bins of the count statistics
+# region, sequence and genomic allele (HGVS) queries look up the variants by _position.bin,
+# _position.variantKey and _position.hgvsKey instead of comparing the positions, alleles and HGVS ids.
+# deploy/load_json.py and 'make load' write them, the variants loaded before need 'make variant-fields'
+# before turning it on: the variants without them are never found
+variant_fields = False
+# gene queries also match the variants in the region of the gene ('make gene-regions') when less
+# than this fraction of them is annotated with it, e.g. 0.5 (0: only the annotated ones). It changes
+# the results of the gene queries, that include variants not annotated with the gene
+gene_region_min_annotated = 0
+# boolean and count answers of sequence and region queries from in-memory NumPy arrays of the
+# variant positions (about 24 bytes per variant), snapshotted to the directory to load them faster
+variant_position_index = False
+variant_position_index_dir = None
+# joins between the variants and their biosamples (and the boolean and count answers of the variants
+# of a biosample or individual) from in-memory compressed bitmaps of the samples of every variant
+# (needs pyroaring)
+sample_membership_index = False
+
 #
 #  Organization info
 #
@@ -115,6 +166,8 @@ CA_cert = '/etc/ega/CA.cert'
 # Permissions server configuration
 #
 permissions_url = 'http://beacon-permissions'
+permissions_cache_max_age = 300  # seconds a permissions response is reused (never past the token's exp)
+permissions_cache_size = 10000  # max number of cached tokens
 #permissions_url = 'http://localhost:5051/'
 
 #
@@ -1,7 +1,8 @@
-from pymongo.mongo_client import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from beacon import conf
 
-client = MongoClient("mongodb://{}:{}@{}:{}/{}?authSource={}".format(
+# asyncio client: queries are awaited and don't block the event loop
+client = AsyncIOMotorClient("mongodb://{}:{}@{}:{}/{}?authSource={}".format(
     conf.database_user,
     conf.database_password,
     conf.database_host,
@@ -0,0 +1,107 @@
+"""
+Per-bin variant statistics, used by the 'estimated' counting policy (see ``conf.count_policies``).
+
+The ``count_stats`` collection has, for every dataset, chromosome and bin of ``conf.count_stats_bin_size``
+bases, the number of variants that start in the bin (``count``) and of the ones that started before and
+overlap it (``continuing``). Only the variants with an end are counted, the ones a region query can
+match (see ``positions.position_predicates``). The count of a region query is estimated as the variants
+that start in the bins it overlaps, prorating the ones it only covers partially, and the ones that
+continue into its first bin.
+
+The statistics are rebuilt (after loading data) with:
+
+    python -m beacon.db.count_stats
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from beacon import conf
+from beacon.db import client
+from beacon.db.positions import END, OVERLAP_FIELDS, REFSEQ_ID, START, last_position_expression, scalar_expression
+from beacon.db.utils import Estimate
+
+LOG = logging.getLogger(__name__)
+
+COUNT_STATS_COLLECTION = "count_stats"
+
+
+def get_bin_size() -> int:
+    return getattr(conf, 'count_stats_bin_size', 100000)
+
+
+async def build_count_stats():
+    """Counts the variants of every (dataset, chromosome, bin) into the count_stats collection"""
+    bin_size = get_bin_size()
+    start = scalar_expression(START)
+    last = last_position_expression(start, scalar_expression(END))
+    pipeline = [
+        {"$match": OVERLAP_FIELDS},
+        {"$project": {
+            "datasetId": "$_info.datasetId",
+            "refseqId": scalar_expression(REFSEQ_ID),
+            "first": {"$toInt": {"$floor": {"$divide": [start, bin_size]}}},
+            "last": {"$toInt": {"$floor": {"$divide": [last, bin_size]}}},
+        }},
+        # the variant starts in its first bin and continues into the rest
+        {"$addFields": {"bins": {"$range": ["$first", {"$add": ["$last", 1]}]}}},
+        {"$unwind": "$bins"},
+        {"$group": {
+            "_id": {
+                "datasetId": "$datasetId",
+                "refseqId": "$refseqId",
+                "bin": "$bins",
+            },
+            "count": {"$sum": {"$cond": [{"$eq": ["$bins", "$first"]}, 1, 0]}},
+            "continuing": {"$sum": {"$cond": [{"$eq": ["$bins", "$first"]}, 0, 1]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "datasetId": "$_id.datasetId",
+            "refseqId": "$_id.refseqId",
+            "bin": "$_id.bin",
+            "binSize": {"$literal": bin_size},
+            "count": 1,
+            "continuing": 1,
+        }},
+        # replaces the collection once it's complete
+        {"$out": COUNT_STATS_COLLECTION},
+    ]
+    await client.beacon.genomicVariations.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    await client.beacon[COUNT_STATS_COLLECTION].create_index(
+        [("binSize", 1), ("refseqId", 1), ("datasetId", 1), ("bin", 1)],
+        name="count stats"
+    )
+
+
+async def estimate_region_counts(datasets: List[str], refseq_id: str, start: int, end: int) -> Optional[Dict[str, Estimate]]:
+    """Estimates the number of variants overlapping [start, end] of every dataset.
+
+    Returns None if there are no statistics (for the current bin size)."""
+    bin_size = get_bin_size()
+    stats = client.beacon[COUNT_STATS_COLLECTION]
+    if await stats.find_one({"binSize": bin_size}, {"_id": 1}) is None:
+        LOG.debug("No count statistics, the counts can't be estimated")
+        return None
+
+    query = {
+        "binSize": bin_size,
+        "refseqId": refseq_id,
+        "datasetId": {"$in": datasets},
+        "bin": {"$gte": start // bin_size, "$lte": end // bin_size},
+    }
+    counts = dict.fromkeys(datasets, 0.0)
+    async for doc in stats.find(query, {"_id": 0, "datasetId": 1, "bin": 1, "count": 1, "continuing": 1}):
+        bin_start = int(doc["bin"]) * bin_size
+        overlap = min(end + 1, bin_start + bin_size) - max(start, bin_start)
+        counts[doc["datasetId"]] += doc["count"] * overlap / bin_size
+        if int(doc["bin"]) == start // bin_size:
+            # the ones that started before the region and overlap it
+            counts[doc["datasetId"]] += doc.get("continuing", 0)
+    return {dataset_id: Estimate(round(count)) for dataset_id, count in counts.items()}
+
+
+if __name__ == "__main__":
+    asyncio.run(build_count_stats())
+    print(f"*** {COUNT_STATS_COLLECTION} built with bins of {get_bin_size()} bases ***")
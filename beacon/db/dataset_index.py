@@ -0,0 +1,107 @@
+"""
+In-memory indexes of the datasets, tied to their data versions (see ``datasets_registry``).
+
+An index keeps one entry per dataset, built from the DB in the background. At startup the
+snapshots of the current versions are loaded (if the index has them), and the rest of the
+datasets are indexed. When the version of a dataset changes, ``get`` returns None (its queries
+go to the DB) until it's indexed again.
+"""
+
+import abc
+import asyncio
+import logging
+from typing import Dict, Generic, Optional, Tuple, TypeVar
+
+from beacon.request.datasets_registry import DATASET_REGISTRY
+
+LOG = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DatasetIndex(abc.ABC, Generic[T]):
+    """Base of the dataset indexes, the entries must have the ``version`` they were built from"""
+
+    # what is indexed, for the logs
+    name = "dataset index"
+
+    def __init__(self):
+        self._datasets: Dict[str, T] = {}
+        self._indexing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    @abc.abstractmethod
+    def enabled(self) -> bool:
+        """Whether the index answers queries (see conf)"""
+
+    @abc.abstractmethod
+    async def read(self, dataset_id: str, version: Tuple) -> T:
+        """Indexes the dataset from the DB"""
+
+    def load_snapshot(self, dataset_id: str) -> Optional[T]:
+        """Entry of the dataset saved by ``save_snapshot``, if any"""
+        return None
+
+    def save_snapshot(self, dataset_id: str, entry: T):
+        """Saves the entry of the dataset (runs in an executor)"""
+
+    def nbytes(self, entry: T) -> int:
+        return 0
+
+    async def load(self):
+        """Loads the snapshots of the current versions, and indexes the rest of the datasets"""
+        for dataset_id in await DATASET_REGISTRY.db_datasets():
+            version = await DATASET_REGISTRY.dataset_version(dataset_id)
+            entry = self.load_snapshot(dataset_id)
+            if entry is not None and entry.version == version:
+                self._datasets[dataset_id] = entry
+                LOG.info(f"Loaded the {self.name} of {dataset_id} ({self.nbytes(entry) / 2**20:.1f} MB)")
+            else:
+                self._start_indexing(dataset_id, version)
+
+    def _start_indexing(self, dataset_id: str, version: Tuple):
+        if dataset_id not in self._indexing:
+            self._indexing[dataset_id] = asyncio.create_task(self._index(dataset_id, version))
+
+    async def _index(self, dataset_id: str, version: Tuple):
+        try:
+            entry = await self.read(dataset_id, version)
+            await asyncio.get_running_loop().run_in_executor(None, self.save_snapshot, dataset_id, entry)
+            self._datasets[dataset_id] = entry
+            LOG.info(f"Indexed the {self.name} of {dataset_id} ({self.nbytes(entry) / 2**20:.1f} MB)")
+        except Exception as e:
+            LOG.error(f"Couldn't index the {self.name} of {dataset_id}: {e}")
+        finally:
+            del self._indexing[dataset_id]
+
+    async def get(self, dataset_id: str) -> Optional[T]:
+        """Index of the current version of the dataset, or None (then it's indexed in the background)"""
+        version = await DATASET_REGISTRY.dataset_version(dataset_id)
+        entry = self._datasets.get(dataset_id)
+        if entry is not None and entry.version == version:
+            return entry
+        self._start_indexing(dataset_id, version)
+        return None
+
+    async def get_all(self, datasets) -> Optional[Dict[str, T]]:
+        """{ dataset_id:entry } of the datasets, or None if any of them isn't indexed (counted as a miss)"""
+        entries = {}
+        for dataset_id in datasets:
+            entry = await self.get(dataset_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            entries[dataset_id] = entry
+        self.hits += 1
+        return entries
+
+    def metrics(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "datasets": len(self._datasets),
+            "indexing": len(self._indexing),
+            "bytes": sum(self.nbytes(entry) for entry in self._datasets.values()),
+        }
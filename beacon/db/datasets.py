@@ -2,7 +2,7 @@ from typing import Optional
 from typing import Dict, List, Optional
 from beacon.db.filters import apply_filters
 from beacon.db.schemas import DefaultSchemas
-from beacon.db.utils import query_id, get_count, get_documents, get_cross_query
+from beacon.db.utils import query_id, get_join_results, get_count_and_page
 from beacon.request.model import RequestParams
 from beacon.db import client
 
@@ -53,13 +53,12 @@ def apply_request_parameters(query: Dict[str, List[dict]], qparams: RequestParam
     LOG.debug(query)
     return query
 
-def get_datasets(entry_id: Optional[str], qparams: RequestParams):
+async def get_datasets(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
     query = apply_request_parameters({}, qparams)
-    #query = apply_filters({}, qparams.query.filters, collection)
+    #query = await apply_filters({}, qparams.query.filters, collection)
     schema = DefaultSchemas.DATASETS
-    count = get_count(client.beacon.datasets, query)
-    docs = get_documents(
+    count, docs = await get_count_and_page(
         client.beacon.datasets,
         query,
         qparams.query.pagination.skip,
@@ -68,14 +67,13 @@ def get_datasets(entry_id: Optional[str], qparams: RequestParams):
     return schema, count, docs
 
 
-def get_dataset_with_id(entry_id: Optional[str], qparams: RequestParams):
+async def get_dataset_with_id(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
     query = apply_request_parameters({}, qparams)
-    #query = apply_filters({}, qparams.query.filters, collection)
+    #query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
     schema = DefaultSchemas.DATASETS
-    count = get_count(client.beacon.datasets, query)
-    docs = get_documents(
+    count, docs = await get_count_and_page(
         client.beacon.datasets,
         query,
         qparams.query.pagination.skip,
@@ -84,69 +82,44 @@ def get_dataset_with_id(entry_id: Optional[str], qparams: RequestParams):
     return schema, count, docs
 
 
-def get_variants_of_dataset(entry_id: Optional[str], qparams: RequestParams):
+async def get_variants_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
-    query = apply_filters({}, qparams.query.filters, collection)
+    query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
-    count = get_count(client.beacon.datasets, query)
-    individual_ids = client.beacon.datasets \
-        .find_one(query, {"ids.individualIds": 1, "_id": 0})
-    biosample_ids = client.beacon.datasets \
-        .find_one(query, {"ids.biosampleIds": 1, "_id": 0})
-    #LOG.debug(individual_ids['ids'])
-    individual_ids['ids']['individualIds']=individual_ids['ids']['individualIds']+biosample_ids['ids']['biosampleIds']
-    
-    individual_ids=get_cross_query(individual_ids['ids'],'individualIds','caseLevelData.biosampleId')
-    query = apply_filters(individual_ids, qparams.query.filters, collection)
+    target_query = await apply_filters({}, qparams.query.filters, collection)
     schema = DefaultSchemas.GENOMICVARIATIONS
-    count = get_count(client.beacon.genomicVariations, query)
-    docs = get_documents(
-        client.beacon.genomicVariations,
-        query,
-        qparams.query.pagination.skip,
-        qparams.query.pagination.limit
+    count, docs = await get_join_results(
+        client.beacon.datasets, query, ["ids.individualIds", "ids.biosampleIds"],
+        client.beacon.genomicVariations, "caseLevelData.biosampleId", target_query, qparams,
+        multikey=True
     )
     return schema, count, docs
 
 
-def get_biosamples_of_dataset(entry_id: Optional[str], qparams: RequestParams):
+async def get_biosamples_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
-    query = apply_filters({}, qparams.query.filters, collection)
+    query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
-    count = get_count(client.beacon.datasets, query)
-    biosample_ids = client.beacon.datasets \
-        .find_one(query, {"ids.biosampleIds": 1, "_id": 0})
-    biosample_ids=get_cross_query(biosample_ids['ids'],'biosampleIds','id')
-    query = apply_filters(biosample_ids, qparams.query.filters, collection)
+    target_query = await apply_filters({}, qparams.query.filters, collection)
 
     schema = DefaultSchemas.BIOSAMPLES
-    count = get_count(client.beacon.biosamples, query)
-    docs = get_documents(
-        client.beacon.biosamples,
-        query,
-        qparams.query.pagination.skip,
-        qparams.query.pagination.limit
+    count, docs = await get_join_results(
+        client.beacon.datasets, query, ["ids.biosampleIds"],
+        client.beacon.biosamples, "id", target_query, qparams
     )
     return schema, count, docs
 
 
-def get_individuals_of_dataset(entry_id: Optional[str], qparams: RequestParams):
+async def get_individuals_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
-    query = apply_filters({}, qparams.query.filters, collection)
+    query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
-    count = get_count(client.beacon.datasets, query)
-    individual_ids = client.beacon.datasets \
-        .find_one(query, {"ids.individualIds": 1, "_id": 0})
-    individual_ids=get_cross_query(individual_ids['ids'],'individualIds','id')
-    query = apply_filters(individual_ids, qparams.query.filters, collection)
+    target_query = await apply_filters({}, qparams.query.filters, collection)
 
     schema = DefaultSchemas.INDIVIDUALS
-    count = get_count(client.beacon.individuals, query)
-    docs = get_documents(
-        client.beacon.individuals,
-        query,
-        qparams.query.pagination.skip,
-        qparams.query.pagination.limit
+    count, docs = await get_join_results(
+        client.beacon.datasets, query, ["ids.individualIds"],
+        client.beacon.individuals, "id", target_query, qparams
     )
     return schema, count, docs
 
@@ -163,11 +136,10 @@ def filter_public_datasets(requested_datasets_ids):
         .find(query)
 
 
-def get_filtering_terms_of_dataset(entry_id: Optional[str], qparams: RequestParams):
+async def get_filtering_terms_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     query = {'scope': 'datasets'}
     schema = DefaultSchemas.FILTERINGTERMS
-    count = get_count(client.beacon.filtering_terms, query)
-    docs = get_documents(
+    count, docs = await get_count_and_page(
         client.beacon.filtering_terms,
         query,
         qparams.query.pagination.skip,
@@ -176,43 +148,29 @@ def get_filtering_terms_of_dataset(entry_id: Optional[str], qparams: RequestPara
     return schema, count, docs
 
 
-def get_runs_of_dataset(entry_id: Optional[str], qparams: RequestParams):
+async def get_runs_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
-    query = apply_filters({}, qparams.query.filters, collection)
+    query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
-    count = get_count(client.beacon.datasets, query)
-    biosample_ids = client.beacon.datasets \
-        .find_one(query, {"ids.biosampleIds": 1, "_id": 0})
-    biosample_ids=get_cross_query(biosample_ids['ids'],'biosampleIds','biosampleId')
-    query = apply_filters(biosample_ids, qparams.query.filters, collection)
+    target_query = await apply_filters({}, qparams.query.filters, collection)
 
     schema = DefaultSchemas.RUNS
-    count = get_count(client.beacon.runs, query)
-    docs = get_documents(
-        client.beacon.runs,
-        query,
-        qparams.query.pagination.skip,
-        qparams.query.pagination.limit
+    count, docs = await get_join_results(
+        client.beacon.datasets, query, ["ids.biosampleIds"],
+        client.beacon.runs, "biosampleId", target_query, qparams
     )
     return schema, count, docs
 
 
-def get_analyses_of_dataset(entry_id: Optional[str], qparams: RequestParams, allowed_ids: list):
+async def get_analyses_of_dataset(entry_id: Optional[str], qparams: RequestParams):
     collection = 'datasets'
-    query = apply_filters({}, qparams.query.filters, collection)
+    query = await apply_filters({}, qparams.query.filters, collection)
     query = query_id(query, entry_id)
-    count = get_count(client.beacon.datasets, query)
-    biosample_ids = client.beacon.datasets \
-        .find_one(query, {"ids.biosampleIds": 1, "_id": 0})
-    biosample_ids=get_cross_query(biosample_ids['ids'],'biosampleIds','biosampleId')
-    query = apply_filters(biosample_ids, qparams.query.filters, collection)
+    target_query = await apply_filters({}, qparams.query.filters, collection)
 
     schema = DefaultSchemas.ANALYSES
-    count = get_count(client.beacon.analyses, query)
-    docs = get_documents(
-        client.beacon.analyses,
-        query,
-        qparams.query.pagination.skip,
-        qparams.query.pagination.limit
+    count, docs = await get_join_results(
+        client.beacon.datasets, query, ["ids.biosampleIds"],
+        client.beacon.analyses, "biosampleId", target_query, qparams
     )
     return schema, count, docs
@@ -6,6 +6,7 @@ from copy import deepcopy
 
 from beacon.request import ontologies
 from beacon.request.model import AlphanumericFilter, CustomFilter, OntologyFilter, Operator, Similarity
+from beacon.db.positions import END, REFSEQ_ID, START, canonical_refseq_id, to_position
 from beacon.db.utils import get_documents
 from beacon.db import client
 
@@ -17,7 +18,7 @@ LOG = logging.getLogger(__name__)
 
 CURIE_REGEX = r'^([a-zA-Z0-9]*):\/?[a-zA-Z0-9\.]*$'
 
-def apply_filters(query: dict, filters: List[dict], collection: str) -> dict:
+async def apply_filters(query: dict, filters: List[dict], collection: str) -> dict:
     LOG.debug("")
     LOG.debug(f"QUERY AT THE START OF APPLY FILTERS")
     LOG.debug(f"query = {query}")
@@ -42,14 +43,14 @@ def apply_filters(query: dict, filters: List[dict], collection: str) -> dict:
                 #partial_query = {"$text": defaultdict(str) }
                 #partial_query =  { "$text": { "$search": "" } } 
                 LOG.debug(partial_query)
-                partial_query = apply_ontology_filter(partial_query, filter, collection)
+                partial_query = await apply_ontology_filter(partial_query, filter, collection)
             elif "similarity" in filter or "includeDescendantTerms" in filter or re.match(CURIE_REGEX, filter["id"]) and filter["id"].isupper():
                 filter = OntologyFilter(**filter)
                 LOG.debug("Ontology filter: %s", filter.id)
                 #partial_query = {"$text": defaultdict(str) }
                 #partial_query =  { "$text": { "$search": "" } } 
                 LOG.debug(partial_query)
-                partial_query = apply_ontology_filter(partial_query, filter, collection)
+                partial_query = await apply_ontology_filter(partial_query, filter, collection)
             else:
                 filter = CustomFilter(**filter)
                 LOG.debug("Custom filter: %s", filter.id)
@@ -65,7 +66,7 @@ def apply_filters(query: dict, filters: List[dict], collection: str) -> dict:
     return query
 
 
-def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str) -> dict:
+async def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str) -> dict:
     is_filter_id_required = True
 
     # Search similar
@@ -114,7 +115,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
             1
         )
             
-        for doc_term in docs:
+        async for doc_term in docs:
             label = doc_term['label']
         query_filtering={}
         query_filtering['$and']=[]
@@ -133,7 +134,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
             0,
             1
         )
-        for doc2 in docs_2:
+        async for doc2 in docs_2:
             query_terms = doc2['id']
         query_terms = query_terms.split(':')
         query_term = query_terms[0] + '.id'
@@ -188,7 +189,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
         
         # get label from the term to find descendants
         # (label might not exist)
-        for doc_term in docs:
+        async for doc_term in docs:
             LOG.debug(f"Filtering doc found! {doc_term}")
             label = doc_term['label']
             break
@@ -219,7 +220,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
                 1
             )
             
-            for doc2 in docs_2:
+            async for doc2 in docs_2:
                 query_terms = doc2['id']
                 break
             else:
@@ -253,7 +254,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
             1
         )
         
-        for doc_term in docs:
+        async for doc_term in docs:
             label = doc_term['label']
         query_filtering={}
         query_filtering['$and']=[]
@@ -269,7 +270,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
             0,
             1
         )
-        for doc2 in docs_2:
+        async for doc2 in docs_2:
             query_terms = doc2['id']
         query_terms = query_terms.split(':')
         query_term = query_terms[0] + '.id'
@@ -279,7 +280,7 @@ def apply_ontology_filter(query: dict, filter: OntologyFilter, collection: str)
     return query
 
 def format_value(value: Union[str, List[int]]) -> Union[List[int], str, int, float]:
-    if isinstance(value, list):
+    if isinstance(value, list) or not isinstance(value, str):
         return value
     
     elif value.isnumeric():
@@ -317,10 +318,11 @@ def apply_alphanumeric_filter(query: dict, filter: AlphanumericFilter, collectio
     LOG.debug(f"filter val = {formatted_value}")
     
     if collection == 'g_variants':
-        if filter.id == "_position.refseqId":
-            filter.value = str(filter.value)
-            formatted_value = filter.value
-            #LOG.debug(formatted_value)
+        if filter.id == REFSEQ_ID:
+            formatted_value = canonical_refseq_id(filter.value)
+        elif filter.id in (START, END):
+            # int64 scalars, so they are an index range (see beacon.db.positions)
+            formatted_value = to_position(filter.value)
         else:
             formatted_value = format_value(filter.value)
         formatted_operator = format_operator(filter.operator)
@@ -1,10 +1,18 @@
+import copy
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from beacon import conf
+from beacon.db.count_stats import estimate_region_counts
 from beacon.db.filters import apply_alphanumeric_filter, apply_filters
+from beacon.db.gene_regions import apply_gene_regions
+from beacon.db.positions import HGVS_KEY, VARIANT_KEY, canonical_hgvs_id, canonical_refseq_id, position_predicates, to_positions, variant_key, variant_keys_query
 from beacon.db.schemas import DefaultSchemas
-from beacon.db.utils import query_id, query_ids, get_count, get_documents, get_cross_query, get_cross_query_variants, get_filtering_documents
-from beacon.request.model import AlphanumericFilter, Operator, RequestParams
+from beacon.db.sample_index import SAMPLE_MEMBERSHIP_INDEX
+from beacon.db.variant_index import VARIANT_POSITION_INDEX
+from beacon.db.utils import DOCUMENT_PROJECTION, QUERY_MAX_TIME_MS, DatasetPage, get_dataset_field, get_sort_keys, scope_query, query_id, query_ids, get_cross_query, get_index_results, get_results, get_semi_join_results, get_count_and_page
+from beacon.request.model import AlphanumericFilter, RequestParams
 from beacon.db import client
+from beacon.request.datasets_registry import DATASET_REGISTRY
 import json
 from bson import json_util
 from aiohttp import web
@@ -30,6 +38,9 @@ VARIANTS_PROPERTY_MAP = {
     "genomicAlleleShortForm":"genomicHGVSId"
 }
 
+# the parameters of a sequence query, all in its variant key
+SEQUENCE_QUERY_PARAMETERS = ("referenceName", "start", "referenceBases", "alternateBases")
+
 def is_genomicallele_query(qparams: RequestParams) -> bool:
     """
     Check if the query is a genomic allele query (short form)
@@ -107,91 +118,51 @@ def include_resultset_responses(query: Dict[str, List[dict]], qparams: RequestPa
     return query
 
 
-def generate_position_filter_start(key: str, value: List[int], is_region_query:bool) -> List[AlphanumericFilter]:
-    LOG.debug("len value = {}".format(len(value)))
-    filters = []
-    if len(value) == 1:
-        if is_region_query:
-            operator = Operator.GREATER_EQUAL
-        else:
-            operator = Operator.EQUAL
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[0]],
-            operator=operator
-        ))
-    elif len(value) == 2:
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[0]],
-            operator=Operator.GREATER_EQUAL
-        ))
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[1]],
-            operator=Operator.LESS_EQUAL
-        ))
-    return filters
-
-
-def generate_position_filter_end(key: str, value: List[int], is_region_query:bool) -> List[AlphanumericFilter]:
-    LOG.debug("len value = {}".format(len(value)))
-    filters = []
-    if len(value) == 1:
-        if is_region_query:
-            operator = Operator.LESS_EQUAL
-        else:
-            operator = Operator.EQUAL
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[0]],
-            operator=operator
-        ))
-    elif len(value) == 2:
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[0]],
-            operator=Operator.GREATER_EQUAL
-        ))
-        filters.append(AlphanumericFilter(
-            id=VARIANTS_PROPERTY_MAP[key],
-            value=[value[1]],
-            operator=Operator.LESS_EQUAL
-        ))
-    return filters
+def sequence_query_keys(qparams: RequestParams) -> Optional[List[str]]:
+    """Variant keys of a sequence query, one by alternate allele (e.g. alternateBases=A,T),
+    or None if it isn't a sequence query"""
+    if not is_sequence_query(qparams):
+        return None
+    request_parameters = qparams.query.request_parameters
+    try:
+        return [
+            variant_key(
+                request_parameters["referenceName"],
+                request_parameters["start"],
+                str(request_parameters["referenceBases"]),
+                alternate_bases
+            )
+            for alternate_bases in str(request_parameters["alternateBases"]).split(",")
+        ]
+    except ValueError:
+        return None
 
 
 def apply_request_parameters(query: Dict[str, List[dict]], qparams: RequestParams):
     collection = 'g_variants'
     LOG.debug("Request parameters len = {}".format(len(qparams.query.request_parameters)))
-    # check if it is a region query (has start and end)
-    is_region_query = True
-    for param in ("start", "end"):
-        if param not in qparams.query.request_parameters.keys():
-            is_region_query = False
-            break
-    
-    #LOG.debug(f"is_region_query = {is_region_query}")
     
     if len(qparams.query.request_parameters) > 0 and "$and" not in query:
         query["$and"] = []
+    # sequence queries are a point lookup by variant key, instead of comparing its parts
+    use_variant_fields = getattr(conf, 'variant_fields', False)
+    keys = sequence_query_keys(qparams) if use_variant_fields else None
+    if keys is not None:
+        query["$and"].append(variant_keys_query(keys))
+    start, end = None, None
     for k, v in qparams.query.request_parameters.items():
-        if k == "start":
-            if isinstance(v, str):
-                v = v.split(',')
-            filters = generate_position_filter_start(k, v, is_region_query)
-            for filter in filters:
-                query["$and"].append(apply_alphanumeric_filter({}, filter, collection))
+        if keys is not None and k in SEQUENCE_QUERY_PARAMETERS:
+            continue
+        elif k == "start":
+            start = to_positions(v)
         elif k == "end":
-            if isinstance(v, str):
-                v = v.split(',')
-            filters = generate_position_filter_end(k, v, is_region_query)
-            for filter in filters:
-                query["$and"].append(apply_alphanumeric_filter({}, filter, collection))
+            end = to_positions(v)
         elif k == "variantMinLength" or k == "variantMaxLength" or k == "mateName":
             continue
         elif k == "datasets":
             pass
+        elif k == "genomicAlleleShortForm" and use_variant_fields:
+            query["$and"].append({ HGVS_KEY: canonical_hgvs_id(v) })
         else:
             try:
                 query["$and"].append(apply_alphanumeric_filter({}, AlphanumericFilter(
@@ -201,305 +172,250 @@ def apply_request_parameters(query: Dict[str, List[dict]], qparams: RequestParam
             except KeyError:
                 LOG.error(f"Invalid parameter: {k}")
                 raise ValueError(f"Invalid parameter: {k}")
+    # one range document by position field (see beacon.db.positions)
+    for field, predicate in position_predicates(start, end, use_variant_fields).items():
+        query["$and"].append({ field: predicate })
     return query
 
 
-def get_variants(entry_id: Optional[str], qparams: RequestParams):
+def get_query_region(qparams: RequestParams) -> Optional[Tuple[str, int, int]]:
+    """Returns (referenceName, start, end) of a plain overlap region query (no other parameters or filters),
+    whose count can be estimated from the count statistics, or None for the rest"""
+    request_parameters = qparams.query.request_parameters
+    if qparams.query.filters or qparams.query.include_resultset_responses != 'HIT':
+        return None
+    # the statistics aren't split by assembly, and the brackets (two starts or ends) aren't overlaps
+    if not {"referenceName", "start", "end"} <= request_parameters.keys() \
+        or not request_parameters.keys() <= {"referenceName", "start", "end", "datasets"}:
+        return None
+    try:
+        start, end = to_positions(request_parameters["start"]), to_positions(request_parameters["end"])
+        if len(start) != 1 or len(end) != 1:
+            return None
+        return canonical_refseq_id(request_parameters["referenceName"]), start[0], end[0]
+    except ValueError:
+        return None
+
+
+def get_genomic_qparams(qparams: RequestParams) -> Optional[RequestParams]:
+    """The genomic request parameters of a query of another entry type (e.g. individuals), as the params
+    of a variant query without filters, or None if it has none"""
+    request_parameters = {
+        k: v for k, v in qparams.query.request_parameters.items() if k in VARIANTS_PROPERTY_MAP
+    }
+    if not request_parameters:
+        return None
+    genomic_qparams = copy.deepcopy(qparams)
+    genomic_qparams.query.request_parameters = request_parameters
+    genomic_qparams.query.filters = []
+    return genomic_qparams
+
+
+def split_scoped_filters(qparams: RequestParams, scope: str) -> Tuple[RequestParams, List[dict]]:
+    """Separates the filters of the given scope (e.g. 'individuals') from the rest, returns the params
+    with the rest and the filters of the scope"""
+    scoped_filters = [
+        filter for filter in qparams.query.filters if isinstance(filter, dict) and filter.get("scope") == scope
+    ]
+    if not scoped_filters:
+        return qparams, []
+    variant_qparams = copy.deepcopy(qparams)
+    variant_qparams.query.filters = [filter for filter in qparams.query.filters if filter not in scoped_filters]
+    return variant_qparams, scoped_filters
+
+
+async def get_variants_query(qparams: RequestParams) -> dict:
+    """The query of the variants matching the request parameters and filters"""
     collection = 'g_variants'
     query = apply_request_parameters({}, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
-    query = include_resultset_responses(query, qparams)
+    query = await apply_gene_regions(client.beacon.genomicVariations, query, qparams)
+    query = await apply_filters(query, qparams.query.filters, collection)
+    return query
+
+
+async def get_variants(entry_id: Optional[str], qparams: RequestParams):
+    # boolean and count answers of sequence and region queries, without the DB
+    # the sequence queries looked up by variant key compare the alleles normalized, the rest as they are
+    normalized_alleles = getattr(conf, 'variant_fields', False) and sequence_query_keys(qparams) is not None
+    counts = await VARIANT_POSITION_INDEX.count(qparams, normalized_alleles)
+    if counts is not None:
+        return DefaultSchemas.GENOMICVARIATIONS, *get_index_results(counts, qparams.granularity)
     schema = DefaultSchemas.GENOMICVARIATIONS
-    count = get_count(client.beacon.genomicVariations, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.genomicVariations, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
+    # filters of the individuals: the variants carried by the individuals that match them
+    variant_qparams, individual_filters = split_scoped_filters(qparams, 'individuals')
+    query = await get_variants_query(variant_qparams)
+    query = include_resultset_responses(query, qparams)
+    if individual_filters:
+        individuals_query = await apply_filters({}, individual_filters, 'individuals')
+        count, docs = await get_semi_join_results(
+            client.beacon.genomicVariations, query, "caseLevelData.biosampleId",
+            client.beacon.individuals, "id", individuals_query, qparams,
+            multikey=True
         )
+        return schema, count, docs
+    region = get_query_region(qparams)
+    count_estimator = (lambda datasets: estimate_region_counts(datasets, *region)) if region else None
+    count, docs = await get_results(client.beacon.genomicVariations, query, qparams, count_estimator)
     return schema, count, docs
 
 
-def get_variant_with_id(entry_id: Optional[str], qparams: RequestParams):
+def get_batch_keys(qparams: RequestParams) -> Optional[List[str]]:
+    """Variant keys of a sequence query of a batch, looked up with the rest of the batch (see
+    ``get_variants_batch``), or None if it runs on its own"""
+    if not getattr(conf, 'variant_fields', False):
+        return None
+    if qparams.query.filters or qparams.query.include_resultset_responses != 'HIT':
+        return None
+    if not qparams.query.request_parameters.keys() <= {*SEQUENCE_QUERY_PARAMETERS, "datasets"}:
+        return None
+    return sequence_query_keys(qparams)
+
+
+async def get_variants_batch(batch: List[RequestParams], datasets: List[str]):
+    """Results ({ dataset_id:(count, docs) }) of the sequence queries of a batch in the given datasets,
+    all looked up in one query by variant key, with their records (the RIP algorithm needs them).
+
+    Only the first ``skip + limit`` documents (the largest of the batch) of each variant key and dataset
+    are fetched, with the count of the key, so a common variant doesn't bring all of its documents.
+
+    Returns (schema, [results of each query]), where the rest of the queries of the batch are None,
+    they run on their own (see ``get_variants``)."""
+    batch_keys = [get_batch_keys(qparams) for qparams in batch]
+    results: List[Optional[Dict[str, Tuple[int, DatasetPage]]]] = [None] * len(batch)
+    keys = [key for query_keys in batch_keys if query_keys is not None for key in query_keys]
+    schema = DefaultSchemas.GENOMICVARIATIONS
+    if not keys:
+        return schema, results
+
+    max_docs = max(
+        qparams.query.pagination.skip + qparams.query.pagination.limit
+        for qparams, query_keys in zip(batch, batch_keys) if query_keys is not None
+    )
+    collection = client.beacon.genomicVariations
+    sort = {key: 1 for key in get_sort_keys(collection)}
+    pipeline = [
+        {"$match": scope_query(collection, variant_keys_query(keys), datasets)},
+        {"$addFields": {"_key": f"${VARIANT_KEY}", "_dataset": f"${get_dataset_field(collection)}"}},
+        {"$setWindowFields": {
+            "partitionBy": {"key": "$_key", "dataset": "$_dataset"},
+            "sortBy": sort,
+            "output": {
+                "_rank": {"$documentNumber": {}},
+                "_count": {"$count": {}, "window": {"documents": ["unbounded", "unbounded"]}},
+            },
+        }},
+        {"$match": {"_rank": {"$lte": max_docs}}},
+        {"$sort": sort},
+        {"$project": DOCUMENT_PROJECTION},
+    ]
+    LOG.debug("FINAL PIPELINE (BATCH): {}".format(pipeline))
+    docs_by_dataset = {dataset_id: [] for dataset_id in datasets}
+    # { dataset_id:{ variant_key:count } }
+    counts_by_dataset = {dataset_id: {} for dataset_id in datasets}
+    async for doc in collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS.get()):
+        docs_by_dataset.setdefault(doc["_dataset"], []).append(doc)
+        counts_by_dataset.setdefault(doc["_dataset"], {})[doc["_key"]] = doc["_count"]
+
+    def without_batch_fields(doc):
+        return {k: v for k, v in doc.items() if k not in ("_key", "_dataset", "_rank", "_count")}
+
+    for i, (qparams, query_keys) in enumerate(zip(batch, batch_keys)):
+        if query_keys is None:
+            continue
+        skip = qparams.query.pagination.skip
+        limit = qparams.query.pagination.limit
+        query_keys = set(query_keys)
+        results[i] = {}
+        for dataset_id in datasets:
+            count = sum(counts_by_dataset[dataset_id].get(key, 0) for key in query_keys)
+            docs = [doc for doc in docs_by_dataset[dataset_id] if doc["_key"] in query_keys]
+            results[i][dataset_id] = (count, DatasetPage(without_batch_fields(doc) for doc in docs[skip:skip + limit]))
+    return schema, results
+
+
+async def get_variant_with_id(entry_id: Optional[str], qparams: RequestParams):
     collection = 'g_variants'
     query = {"$and": [{"variantInternalId": entry_id}]}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.GENOMICVARIATIONS
-    count = get_count(client.beacon.genomicVariations, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.genomicVariations, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.genomicVariations, query, qparams)
     return schema, count, docs
 
 
-def get_biosamples_of_variant(entry_id: Optional[str], qparams: RequestParams):
+async def get_biosample_ids_of_variant(entry_id: Optional[str], qparams: RequestParams) -> List[str]:
+    """Ids of the biosamples that carry the variant, from the sample membership index if the query
+    has no other conditions (see ``sample_index``)"""
     collection = 'g_variants'
+    if not qparams.query.request_parameters and not qparams.query.filters:
+        biosample_ids = await SAMPLE_MEMBERSHIP_INDEX.biosamples_of_variant(entry_id, await DATASET_REGISTRY.db_datasets())
+        if biosample_ids is not None:
+            return biosample_ids
     query = {"$and": [{"variantInternalId": entry_id}]}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters)
-    
-    variantDoc = client.beacon.genomicVariations \
-        .find_one(query)
-    
+    query = await apply_filters(query, qparams.query.filters, collection)
+    variant = await client.beacon.genomicVariations \
+        .find_one(query, {"caseLevelData.biosampleId": 1, "_id": 0})
+
     # extract biosample ids from g_variant document
     biosample_ids = []
-    if "caseLevelData" in variantDoc:
-        for case in variantDoc["caseLevelData"]:
-            if "biosampleId" in case and case["biosampleId"]:
-                biosample_ids.append(case["biosampleId"])
+    for case in (variant or {}).get("caseLevelData", []):
+        if "biosampleId" in case and case["biosampleId"]:
+            biosample_ids.append(case["biosampleId"])
+    return biosample_ids
+
+
+async def get_biosamples_of_variant(entry_id: Optional[str], qparams: RequestParams):
+    collection = 'g_variants'
+    biosample_ids = await get_biosample_ids_of_variant(entry_id, qparams)
     
     # build query to find all matches for ids in biosample collection
     query = apply_request_parameters({}, qparams)
     query["id"] = {"$in": biosample_ids}
-    query = apply_filters(query, qparams.query.filters)
+    query = await apply_filters(query, qparams.query.filters, collection)
     
     schema = DefaultSchemas.BIOSAMPLES
     
-    # handle MISS case
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.biosamples,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.biosamples,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.biosamples, negative_query)
-    else:
-        # normal case (HIT)
-        count = len(biosample_ids)
-        docs = get_documents(
-            client.beacon.biosamples,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-
+    count, docs = await get_results(client.beacon.biosamples, query, qparams)
     return schema, count, docs
 
 
-def get_individuals_of_variant(entry_id: Optional[str], qparams: RequestParams):
+async def get_individuals_of_variant(entry_id: Optional[str], qparams: RequestParams):
     collection = 'g_variants'
-    query = {"$and": [{"variantInternalId": entry_id}]}
-    query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
-    count = get_count(client.beacon.genomicVariations, query)
-    individual_ids = client.beacon.genomicVariations \
-        .find_one(query, {"caseLevelData.biosampleId": 1, "_id": 0})
-
-    individual_ids = get_cross_query_variants(individual_ids,'biosampleId','id')
-    query = apply_filters(individual_ids, qparams.query.filters, collection)
+    biosample_ids = await get_biosample_ids_of_variant(entry_id, qparams)
+    query = await apply_filters({"id": {"$in": biosample_ids}}, qparams.query.filters, collection)
 
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.INDIVIDUALS
-    count = get_count(client.beacon.individuals, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.individuals,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.individuals, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.individuals, query, qparams)
     return schema, count, docs
 
-def get_runs_of_variant(entry_id: Optional[str], qparams: RequestParams):
+async def get_runs_of_variant(entry_id: Optional[str], qparams: RequestParams):
     collection = 'g_variants'
-    query = {"$and": [{"variantInternalId": entry_id}]}
-    query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
-    count = get_count(client.beacon.genomicVariations, query)
-    run_ids = client.beacon.genomicVariations \
-        .find_one(query, {"caseLevelData.biosampleId": 1, "_id": 0})
-    
-    run_ids=get_cross_query_variants(run_ids,'biosampleId','biosampleId')
-    query = apply_filters(run_ids, qparams.query.filters, collection)
+    biosample_ids = await get_biosample_ids_of_variant(entry_id, qparams)
+    query = await apply_filters({"biosampleId": {"$in": biosample_ids}}, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.RUNS
-    count = get_count(client.beacon.runs, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.runs,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.runs, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.runs, query, qparams)
     return schema, count, docs
 
 
-def get_analyses_of_variant(entry_id: Optional[str], qparams: RequestParams):
+async def get_analyses_of_variant(entry_id: Optional[str], qparams: RequestParams):
     collection = 'g_variants'
-    query = {"$and": [{"variantInternalId": entry_id}]}
-    query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
-    count = get_count(client.beacon.genomicVariations, query)
-    analysis_ids = client.beacon.genomicVariations \
-        .find_one(query, {"caseLevelData.biosampleId": 1, "_id": 0})
-
-    analysis_ids=get_cross_query_variants(analysis_ids,'biosampleId','biosampleId')
-    query = apply_filters(analysis_ids, qparams.query.filters, collection)
+    biosample_ids = await get_biosample_ids_of_variant(entry_id, qparams)
+    query = await apply_filters({"biosampleId": {"$in": biosample_ids}}, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.ANALYSES
-    count = get_count(client.beacon.analyses, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.analyses,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.analyses, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.analyses, query, qparams)
     return schema, count, docs
 
-def get_filtering_terms_of_genomicvariation(entry_id: Optional[str], qparams: RequestParams):
+async def get_filtering_terms_of_genomicvariation(entry_id: Optional[str], qparams: RequestParams):
     query = {'scope': 'genomicVariations'}
     schema = DefaultSchemas.FILTERINGTERMS
-    count = get_count(client.beacon.filtering_terms, query)
-    remove_id={'_id':0}
-    docs = get_filtering_documents(
+    count, docs = await get_count_and_page(
         client.beacon.filtering_terms,
         query,
-        remove_id,
         qparams.query.pagination.skip,
         qparams.query.pagination.limit
     )
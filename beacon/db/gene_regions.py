@@ -0,0 +1,194 @@
+"""
+Gene regions, to answer gene queries by region when the variants are sparsely annotated.
+
+The ``gene_regions`` collection has the region of every gene, ``{ _id: gene, refseqId, start, end }``,
+loaded from a local annotation file, BED (chromosome, start, end, gene) or GTF (the ``gene`` lines,
+by ``gene_name`` and ``gene_id``), optionally gzipped, e.g.:
+
+    python -m beacon.db.gene_regions Homo_sapiens.GRCh38.110.gtf.gz
+
+A gene query looks up the variants annotated with the gene (``molecularAttributes.geneIds``).
+With ``conf.gene_region_min_annotated`` (off by default, as it changes the results), when less than
+that fraction of the variants in the region of the gene are annotated, which the index statistics
+(or the count statistics, see ``count_stats``) tell, the variants in its region are matched too.
+The decision is kept by gene and data version of the datasets, so only the first query of a gene
+pays its lookups.
+"""
+
+import argparse
+import asyncio
+import gzip
+import io
+import logging
+import math
+import sys
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from bson.int64 import Int64
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne
+
+from beacon import conf
+from beacon.db import client
+from beacon.db.count_stats import estimate_region_counts
+from beacon.db.positions import REFSEQ_ID, canonical_refseq_id, position_predicates
+from beacon.db.utils import scope_query
+from beacon.request.datasets_registry import DATASET_REGISTRY
+
+LOG = logging.getLogger(__name__)
+
+GENE_REGIONS_COLLECTION = "gene_regions"
+GENE_FIELD = "molecularAttributes.geneIds"
+
+LOAD_BATCH_SIZE = 1000
+
+# { (gene, datasets, versions):region to match too, or None }, least recently used first
+GENE_REGION_DECISIONS: "OrderedDict[tuple, Optional[Tuple[str, int, int]]]" = OrderedDict()
+MAX_GENE_REGION_DECISIONS = 10000
+
+
+def parse_gtf_attributes(attributes: str) -> Dict[str, str]:
+    parsed = {}
+    for attribute in attributes.strip().split(";"):
+        key, _, value = attribute.strip().partition(" ")
+        if key:
+            parsed[key] = value.strip('"')
+    return parsed
+
+
+def read_gene_regions(lines: Iterable[str]) -> Iterator[Tuple[str, str, int, int]]:
+    """(gene, refseqId, start, end) of the genes of a BED or GTF file, in 1-based closed coordinates"""
+    for line in lines:
+        if not line.strip() or line.startswith(("#", "track", "browser")):
+            continue
+        columns = line.rstrip("\n").split("\t")
+        if len(columns) >= 9:
+            # GTF: 1-based, closed
+            if columns[2] != "gene":
+                continue
+            attributes = parse_gtf_attributes(columns[8])
+            start, end = int(columns[3]), int(columns[4])
+            for gene in {attributes.get("gene_name"), attributes.get("gene_id")} - {None}:
+                yield gene, canonical_refseq_id(columns[0]), start, end
+        elif len(columns) >= 4:
+            # BED: 0-based, half-open
+            yield columns[3], canonical_refseq_id(columns[0]), int(columns[1]) + 1, int(columns[2])
+
+
+async def load_gene_regions(lines: Iterable[str]) -> int:
+    """Replaces the regions of the genes in the file, returns how many were loaded"""
+    collection = client.beacon[GENE_REGIONS_COLLECTION]
+    loaded = 0
+    batch = []
+    for gene, refseq_id, start, end in read_gene_regions(lines):
+        batch.append(ReplaceOne(
+            {"_id": gene},
+            {"_id": gene, "refseqId": refseq_id, "start": Int64(start), "end": Int64(end)},
+            upsert=True
+        ))
+        if len(batch) == LOAD_BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        loaded += len(batch)
+    # the gene queries of all datasets might match other variants now
+    await client.beacon.dataset_versions.update_one({"_id": "*"}, {"$inc": {"version": 1}}, upsert=True)
+    return loaded
+
+
+async def get_gene_region(gene: str) -> Optional[Tuple[str, int, int]]:
+    region = await client.beacon[GENE_REGIONS_COLLECTION].find_one({"_id": gene})
+    if region is None:
+        return None
+    return region["refseqId"], region["start"], region["end"]
+
+
+def region_query(refseq_id: str, start: int, end: int) -> dict:
+    """Variants overlapping the region"""
+    use_bins = getattr(conf, 'variant_fields', False)
+    predicates = position_predicates([Int64(start)], [Int64(end)], use_bins)
+    return {"$and": [{REFSEQ_ID: refseq_id}] + [{field: predicate} for field, predicate in predicates.items()]}
+
+
+async def count_region_variants(collection: AsyncIOMotorCollection, datasets, region: Tuple[str, int, int]) -> int:
+    """Number of variants in the region, estimated from the count statistics if there are"""
+    if datasets:
+        estimates = await estimate_region_counts(datasets, *region)
+        if estimates is not None:
+            return sum(estimates.values())
+    query = region_query(*region)
+    if datasets:
+        query = scope_query(collection, query, datasets)
+    count_cap = getattr(conf, 'count_cap', 0)
+    return await collection.count_documents(query, **({"limit": count_cap} if count_cap else {}))
+
+
+async def is_sparsely_annotated(collection: AsyncIOMotorCollection, datasets, gene: str, region: Tuple[str, int, int]) -> bool:
+    """Whether less than conf.gene_region_min_annotated of the variants of the region are annotated with the gene"""
+    in_region = await count_region_variants(collection, datasets, region)
+    min_annotated = math.ceil(getattr(conf, 'gene_region_min_annotated', 0) * in_region)
+    if min_annotated == 0:
+        return False
+    query = {GENE_FIELD: gene}
+    if datasets:
+        query = scope_query(collection, query, datasets)
+    # only counts (index keys) up to the minimum
+    annotated = await collection.count_documents(query, limit=min_annotated)
+    LOG.debug(f"Gene {gene}: {annotated} annotated variants, {in_region} in {region}")
+    return annotated < min_annotated
+
+
+async def get_widening_region(collection: AsyncIOMotorCollection, datasets, gene: str) -> Optional[Tuple[str, int, int]]:
+    """Region of the gene if its variants are sparsely annotated (None otherwise), decided once by
+    data version of the datasets"""
+    dataset_ids = tuple(sorted(datasets)) if datasets is not None else None
+    versions = tuple([await DATASET_REGISTRY.dataset_version(dataset_id) for dataset_id in dataset_ids or ["*"]])
+    key = (gene, dataset_ids, versions)
+    if key in GENE_REGION_DECISIONS:
+        GENE_REGION_DECISIONS.move_to_end(key)
+        return GENE_REGION_DECISIONS[key]
+
+    region = await get_gene_region(gene)
+    if region is not None and not await is_sparsely_annotated(collection, datasets, gene, region):
+        region = None
+    GENE_REGION_DECISIONS[key] = region
+    if len(GENE_REGION_DECISIONS) > MAX_GENE_REGION_DECISIONS:
+        GENE_REGION_DECISIONS.popitem(last=False)
+    return region
+
+
+async def apply_gene_regions(collection: AsyncIOMotorCollection, query: dict, qparams) -> dict:
+    """Extends the gene clause of the query ({ molecularAttributes.geneIds: {'$eq': gene} }) to the
+    variants in the region of the gene, if they are sparsely annotated"""
+    if not getattr(conf, 'gene_region_min_annotated', 0):
+        return query
+    for i, clause in enumerate(query.get("$and", [])):
+        if list(clause) != [GENE_FIELD] or not isinstance(clause[GENE_FIELD], dict) \
+            or list(clause[GENE_FIELD]) != ["$eq"]:
+            continue
+        gene = clause[GENE_FIELD]["$eq"]
+        region = await get_widening_region(collection, qparams.target_datasets, gene)
+        if region is not None:
+            LOG.debug(f"Gene {gene} queried by region {region}")
+            query["$and"][i] = {"$or": [clause, region_query(*region)]}
+    return query
+
+
+def open_annotation_file(path: str) -> io.TextIOBase:
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Gene regions loader")
+    parser.add_argument("file", help="BED or GTF file (optionally gzipped), or - for the standard input")
+    args = parser.parse_args()
+
+    with open_annotation_file(args.file) as lines:
+        loaded = asyncio.run(load_gene_regions(lines))
+    print(f"*** {loaded} gene regions loaded ***")
@@ -1,11 +1,13 @@
 import logging
 from typing import Dict, List, Optional
 from beacon.db.filters import apply_alphanumeric_filter, apply_filters
-from beacon.db.utils import query_id, query_ids, get_count, get_documents, get_cross_query, get_filtering_documents
+from beacon.db.utils import query_id, query_ids, get_cross_query, get_index_results, get_results, get_semi_join_results, get_count_and_page
+from beacon.db.g_variants import get_genomic_qparams, get_variants_query
+from beacon.db.sample_index import SAMPLE_MEMBERSHIP_INDEX
 from beacon.db import client
 from beacon.request.model import AlphanumericFilter, Operator, RequestParams
 from beacon.db.schemas import DefaultSchemas
-from beacon.db.utils import query_id, get_count, get_documents
+from beacon.db.utils import query_id
 from beacon.request.model import RequestParams
 import json
 from bson import json_util
@@ -44,274 +46,97 @@ def apply_request_parameters(query: Dict[str, List[dict]], qparams: RequestParam
     return query
 
 
-def get_individuals(entry_id: Optional[str], qparams: RequestParams):
+async def get_individuals(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
     query = apply_request_parameters({}, qparams)
     LOG.debug(qparams.query.filters)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.INDIVIDUALS
-    count = get_count(client.beacon.individuals, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.individuals,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.individuals, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    # genomic request parameters: the individuals that carry the variants matching them
+    genomic_qparams = get_genomic_qparams(qparams)
+    if genomic_qparams is not None:
+        variants_query = await get_variants_query(genomic_qparams)
+        count, docs = await get_semi_join_results(
+            client.beacon.individuals, query, "id",
+            client.beacon.genomicVariations, "caseLevelData.biosampleId", variants_query, qparams
+        )
+        return schema, count, docs
+    count, docs = await get_results(client.beacon.individuals, query, qparams)
     return schema, count, docs
 
 
-def get_individual_with_id(entry_id: Optional[str], qparams: RequestParams):
+async def get_individual_with_id(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
     query = apply_request_parameters({}, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = query_id(query, entry_id)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.INDIVIDUALS
-    count = get_count(client.beacon.individuals, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.individuals,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.individuals, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.individuals,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.individuals, query, qparams)
     return schema, count, docs
 
 
-def get_variants_of_individual(entry_id: Optional[str], qparams: RequestParams):
+async def get_variants_of_individual(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
+    # the variants carried by the individual (the biosampleId of its variants, as below), without going to the DB (see beacon.db.sample_index)
+    counts = await SAMPLE_MEMBERSHIP_INDEX.count_variants_of_samples([entry_id], qparams)
+    if counts is not None:
+        return DefaultSchemas.GENOMICVARIATIONS, *get_index_results(counts, qparams.granularity)
     query = {"$and": [{"id": entry_id}]}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
-    count = get_count(client.beacon.individuals, query)
-    individual_ids = client.beacon.individuals \
+    query = await apply_filters(query, qparams.query.filters, collection)
+    individual_ids = await client.beacon.individuals \
         .find_one(query, {"id": 1, "_id": 0})
     LOG.debug(individual_ids)
     individual_ids=get_cross_query(individual_ids,'id','caseLevelData.biosampleId')
     LOG.debug(individual_ids)
-    query = apply_filters(individual_ids, qparams.query.filters, collection)
+    query = await apply_filters(individual_ids, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.GENOMICVARIATIONS
-    count = get_count(client.beacon.genomicVariations, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.genomicVariations, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.genomicVariations, query, qparams)
     return schema, count, docs
 
 
-def get_biosamples_of_individual(entry_id: Optional[str], qparams: RequestParams):
+async def get_biosamples_of_individual(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
     query = {"individualId": entry_id}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.BIOSAMPLES
-    count = get_count(client.beacon.biosamples, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.biosamples,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.biosamples,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.biosamples, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.biosamples,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.biosamples, query, qparams)
     return schema, count, docs
 
 
-def get_filtering_terms_of_individual(entry_id: Optional[str], qparams: RequestParams):
+async def get_filtering_terms_of_individual(entry_id: Optional[str], qparams: RequestParams):
     query = {'scope': 'individuals'}
     schema = DefaultSchemas.FILTERINGTERMS
-    count = get_count(client.beacon.filtering_terms, query)
-    remove_id={'_id':0}
-    docs = get_filtering_documents(
+    count, docs = await get_count_and_page(
         client.beacon.filtering_terms,
         query,
-        remove_id,
         qparams.query.pagination.skip,
         qparams.query.pagination.limit
     )
     return schema, count, docs
 
 
-def get_runs_of_individual(entry_id: Optional[str], qparams: RequestParams):
+async def get_runs_of_individual(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
     query = {"individualId": entry_id}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.RUNS
-    count = get_count(client.beacon.runs, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.runs,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.runs, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.runs, query, qparams)
     return schema, count, docs
 
-def get_analyses_of_individual(entry_id: Optional[str], qparams: RequestParams):
+async def get_analyses_of_individual(entry_id: Optional[str], qparams: RequestParams):
     collection = 'individuals'
     query = {"individualId": entry_id}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.ANALYSES
-    count = get_count(client.beacon.analyses, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.analyses,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.analyses, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.analyses, query, qparams)
     return schema, count, docs
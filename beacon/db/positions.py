@@ -0,0 +1,277 @@
+"""
+Typed predicates on the genomic coordinates of the variants.
+
+The positions are compared as int64 scalars and all the bounds of a field are merged into a single
+range document, e.g. ``{'_position.start': {'$gte': 69000, '$lte': 70000}}``, so a region query is
+one tight range over the ``genomic variation & region query`` index (datasetId, refseqId, start, ...).
+The reference names are compared in their canonical form (see ``canonical_refseq_id``).
+
+Region queries (a single start and end) return the variants that overlap the region. Those are
+looked up by ``_position.bin``, the UCSC-style hierarchical bin of the variant (the smallest of
+128kb, 1Mb, 8Mb, 64Mb, 512Mb or 4Gb that contains it), which the index has before the start
+(see ``variant_fields``). A region only has to search the bins it overlaps at every level.
+
+Sequence queries (an exact start and alleles) are a point lookup on ``_position.variantKey``,
+the canonical key of the variant, ``refseqId:start:referenceBases:alternateBases``, and genomic
+allele queries (HGVS) on ``_position.hgvsKey``, the canonical form of its ``genomicHGVSId``.
+"""
+
+import logging
+from typing import List, Optional, Union
+
+from bson.int64 import Int64
+
+LOG = logging.getLogger(__name__)
+
+START = "_position.start"
+END = "_position.end"
+REFSEQ_ID = "_position.refseqId"
+BIN = "_position.bin"
+VARIANT_KEY = "_position.variantKey"
+HGVS_KEY = "_position.hgvsKey"
+HGVS_ID = "genomicHGVSId"
+
+# RefSeq accessions of the human chromosomes (without version, the same in all the assemblies)
+REFSEQ_CHROMOSOMES = {
+    **{f"NC_{chromosome:06d}": str(chromosome) for chromosome in range(1, 23)},
+    "NC_000023": "X",
+    "NC_000024": "Y",
+    "NC_012920": "MT",
+}
+
+# the extended UCSC binning scheme: the bins of a level are numbered from its offset
+BIN_FIRST_SHIFT = 17
+BIN_NEXT_SHIFT = 3
+BIN_OFFSETS = [4096 + 512 + 64 + 8 + 1, 512 + 64 + 8 + 1, 64 + 8 + 1, 8 + 1, 1, 0]
+
+# the variants that can overlap a region: the ones without an end never do
+OVERLAP_FIELDS = {START: {"$type": "number"}, END: {"$type": "number"}}
+
+
+def to_position(value: Union[int, str, List]) -> Int64:
+    """Position as an int64 scalar, from an int, a numeric string or a single-element list"""
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if isinstance(value, bool) or isinstance(value, list):
+        raise ValueError(f"Invalid position: {value}")
+    if isinstance(value, int):
+        return Int64(value)
+    try:
+        position = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid position: {value}")
+    if not position.is_integer():
+        raise ValueError(f"Invalid position: {value}")
+    return Int64(position)
+
+
+def to_positions(value: Union[int, str, List]) -> List[Int64]:
+    """Positions of a start/end request parameter: an int, a list or a comma separated string"""
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, list):
+        value = [value]
+    return [to_position(item) for item in value]
+
+
+def canonical_refseq_id(value: Union[int, str, List]) -> str:
+    """Reference name as the loaded data has it: a string, without the 'chr' prefix (e.g. '1', 'X')"""
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    refseq_id = str(value).strip()
+    if refseq_id[:3].lower() == "chr":
+        refseq_id = refseq_id[3:]
+    return refseq_id
+
+
+def bin_shifts():
+    return [(offset, BIN_FIRST_SHIFT + level * BIN_NEXT_SHIFT) for level, offset in enumerate(BIN_OFFSETS)]
+
+
+def position_bin(start: int, end: Optional[int] = None) -> int:
+    """Bin of a variant from start to end (both included)"""
+    last = start if end is None else max(start, end)
+    for offset, shift in bin_shifts():
+        if start >> shift == last >> shift:
+            return offset + (start >> shift)
+    raise ValueError(f"Position out of range: {start}-{end}")
+
+
+def overlapping_bins(start: int, end: int) -> List[int]:
+    """Bins of the variants that can overlap the region from start to end (both included)"""
+    bins = []
+    for offset, shift in bin_shifts():
+        bins.extend(range(offset + (start >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+def scalar_expression(field: str) -> dict:
+    """The value of the field as an aggregation expression, with single-element lists unwrapped
+    (as ``to_position`` and ``canonical_refseq_id`` do)"""
+    return {"$cond": [{"$isArray": "$" + field}, {"$arrayElemAt": ["$" + field, 0]}, "$" + field]}
+
+
+def last_position_expression(start, end) -> dict:
+    """Last position of a variant as an aggregation expression (its start without an end)"""
+    return {"$max": [start, {"$ifNull": [end, start]}]}
+
+
+def bin_expression() -> dict:
+    """``position_bin`` as an aggregation expression, to compute the bins in the DB"""
+    start = scalar_expression(START)
+    last = last_position_expression(start, scalar_expression(END))
+    branches = []
+    for offset, shift in bin_shifts()[:-1]:
+        first_bin = {"$floor": {"$divide": [start, 2**shift]}}
+        branches.append({
+            "case": {"$eq": [first_bin, {"$floor": {"$divide": [last, 2**shift]}}]},
+            "then": {"$toLong": {"$add": [offset, first_bin]}},
+        })
+    return {"$switch": {"branches": branches, "default": Int64(BIN_OFFSETS[-1])}}
+
+
+def variant_key(refseq_id, start, reference_bases: str, alternate_bases: str) -> str:
+    return ":".join((
+        canonical_refseq_id(refseq_id),
+        str(to_position(start)),
+        reference_bases.strip().upper(),
+        alternate_bases.strip().upper(),
+    ))
+
+
+def variant_key_expression() -> dict:
+    """``variant_key`` as an aggregation expression, to compute the keys in the DB"""
+    refseq_id = {"$toString": scalar_expression(REFSEQ_ID)}
+    return {"$concat": [
+        {"$cond": [
+            {"$eq": [{"$toLower": {"$substrCP": [refseq_id, 0, 3]}}, "chr"]},
+            {"$substrCP": [refseq_id, 3, {"$strLenCP": refseq_id}]},
+            refseq_id,
+        ]},
+        ":", {"$toString": {"$toLong": scalar_expression(START)}},
+        ":", {"$toUpper": {"$trim": {"input": "$variation.referenceBases"}}},
+        ":", {"$toUpper": {"$trim": {"input": "$variation.alternateBases"}}},
+    ]}
+
+
+def variant_keys_query(keys: List[str]) -> dict:
+    """Point lookup of the variants with any of the keys"""
+    keys = sorted(set(keys))
+    if len(keys) == 1:
+        return {VARIANT_KEY: keys[0]}
+    return {VARIANT_KEY: {"$in": keys}}
+
+
+def canonical_hgvs_id(value: str) -> str:
+    """HGVS id as compared: upper-cased, with the reference name in its canonical form and
+    chromosome accessions as their chromosome (e.g. NC_000001.11:g.69091a>g is 1:G.69091A>G)"""
+    reference, separator, description = str(value).strip().partition(":")
+    if not separator:
+        return reference.upper()
+    reference = REFSEQ_CHROMOSOMES.get(reference.split(".")[0].upper()) or canonical_refseq_id(reference).upper()
+    if reference == "M":
+        reference = "MT"
+    return f"{reference}:{description.strip().upper()}"
+
+
+def variant_fields(variant: dict) -> dict:
+    """{ field:value } of the fields of ``variant_fields`` that the variant can have, computed here
+    (e.g. when loading it) instead of in the DB"""
+    position = variant.get("_position") or {}
+    variation = variant.get("variation") or {}
+    fields = {}
+    try:
+        start = to_position(position["start"])
+    except (KeyError, ValueError):
+        start = None
+    if start is not None:
+        try:
+            end = to_position(position["end"]) if position.get("end") is not None else None
+            fields[BIN] = Int64(position_bin(start, end))
+        except ValueError:
+            pass
+        reference_bases, alternate_bases = variation.get("referenceBases"), variation.get("alternateBases")
+        if position.get("refseqId") is not None and isinstance(reference_bases, str) and isinstance(alternate_bases, str):
+            fields[VARIANT_KEY] = variant_key(position["refseqId"], start, reference_bases, alternate_bases)
+    if isinstance(variant.get(HGVS_ID), str):
+        fields[HGVS_KEY] = canonical_hgvs_id(variant[HGVS_ID])
+    return fields
+
+
+class PositionRange:
+    """Closed range of positions, narrowed by every bound added to it"""
+
+    def __init__(self):
+        self.lower: Optional[Int64] = None
+        self.upper: Optional[Int64] = None
+
+    def at_least(self, position: Int64):
+        self.lower = position if self.lower is None else max(self.lower, position)
+
+    def at_most(self, position: Int64):
+        self.upper = position if self.upper is None else min(self.upper, position)
+
+    def between(self, lower: Int64, upper: Int64):
+        self.at_least(lower)
+        self.at_most(upper)
+
+    def is_empty(self) -> bool:
+        return self.lower is None and self.upper is None
+
+    def predicate(self) -> Union[Int64, dict]:
+        if self.lower is not None and self.lower == self.upper:
+            return self.lower
+        predicate = {}
+        if self.lower is not None:
+            predicate["$gte"] = self.lower
+        if self.upper is not None:
+            predicate["$lte"] = self.upper
+        return predicate
+
+
+def position_predicates(start: Optional[List[Int64]], end: Optional[List[Int64]], use_bins: bool = False) -> dict:
+    """{ field:predicate } of the start and end request parameters.
+
+    A single start and end are a region, that matches the variants overlapping it (by bin, with
+    ``use_bins``), which are the ones with an end (see ``OVERLAP_FIELDS``, the count statistics
+    and the variant position index count the same ones). Two values are a range of positions, and a single start or end is the first or
+    last one when the other is a range, an exact position otherwise."""
+    if start is not None and end is not None and len(start) == 1 and len(end) == 1:
+        predicates = {
+            START: {"$lte": end[0]},
+            END: {"$gte": start[0]},
+        }
+        if use_bins:
+            predicates[BIN] = {"$in": [Int64(bin) for bin in overlapping_bins(start[0], end[0])]}
+        LOG.debug(f"position predicates = {predicates}")
+        return predicates
+
+    is_region_query = start is not None and end is not None
+    start_range, end_range = PositionRange(), PositionRange()
+    for positions, position_range, single in (
+            (start, start_range, PositionRange.at_least),
+            (end, end_range, PositionRange.at_most)):
+        if positions is None:
+            continue
+        if len(positions) == 1:
+            if is_region_query:
+                single(position_range, positions[0])
+            else:
+                position_range.between(positions[0], positions[0])
+        elif len(positions) == 2:
+            position_range.between(positions[0], positions[1])
+        else:
+            raise ValueError(f"Invalid positions: {positions}, expected one or two")
+
+    # a variant can't start after its end: same results, but the start range (the one in the
+    # index) is bounded on both sides
+    if end_range.upper is not None:
+        start_range.at_most(end_range.upper)
+
+    predicates = {}
+    if not start_range.is_empty():
+        predicates[START] = start_range.predicate()
+    if not end_range.is_empty():
+        predicates[END] = end_range.predicate()
+    LOG.debug(f"position predicates = {predicates}")
+    return predicates
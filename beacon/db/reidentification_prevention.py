@@ -22,7 +22,7 @@ INITIAL_BUDGET = -(math.log10(P_VALUE))  # initial budget
 
 # support functions for the budget strategy
 
-def update_individual_budget(user_id, individual_id, dataset_id, amount):
+async def update_individual_budget(user_id, individual_id, dataset_id, amount):
     """Updates the budget of a specific individual for a user in the budget collection.
     
     Returns the new DB document, or None if there is not enough budget. May throw an Exception
@@ -34,9 +34,9 @@ def update_individual_budget(user_id, individual_id, dataset_id, amount):
     or running the risk of permitting too many queries."""
     
     # try to find and update document
-    def find_and_modify_document(amount):
+    async def find_and_modify_document(amount):
         # Find the document and update it, returning the updated document
-        updated_document = budget_collection.find_one_and_update(
+        updated_document = await budget_collection.find_one_and_update(
             {
                 FIELD_INDIVIDUAL_ID: individual_id,
                 FIELD_USER_ID: user_id,
@@ -50,30 +50,30 @@ def update_individual_budget(user_id, individual_id, dataset_id, amount):
         return updated_document
     
     # try to create document (can return unique-related error)
-    def create_budget_document():
+    async def create_budget_document():
         new_doc = {
           FIELD_INDIVIDUAL_ID: individual_id,
           FIELD_USER_ID: user_id,
           FIELD_DATASET_ID: dataset_id,
           FIELD_BUDGET: INITIAL_BUDGET - amount
         }
-        client.beacon['budget'].insert_one(new_doc)
+        await client.beacon['budget'].insert_one(new_doc)
         return new_doc
     
     try:
         budget_collection = client.beacon['budget']
         #LOG.debug(f"Updating budget for individual_id={individual_id} by amount={amount}")
         # try to find and update document
-        updated_document = find_and_modify_document(amount)
+        updated_document = await find_and_modify_document(amount)
         # try to create document if it doesn't exist yet
         if updated_document is None:
             try:
-                new_doc = create_budget_document()
+                new_doc = await create_budget_document()
                 updated_document = new_doc
             except Exception as e:
                 # another thread created the document
                 # try to find and modify it again
-                updated_document = find_and_modify_document(amount)
+                updated_document = await find_and_modify_document(amount)
         
             # not found again, something is wrong
             if updated_document is None:
@@ -86,7 +86,7 @@ def update_individual_budget(user_id, individual_id, dataset_id, amount):
             # there might be enough budget for other queries
             # so, we need to increment it back
             if res_budget + amount >= 0:
-                find_and_modify_document(-amount)
+                await find_and_modify_document(-amount)
             # Budget below zero anyway, no point incrementing
             #else:
             #    pass
@@ -98,7 +98,7 @@ def update_individual_budget(user_id, individual_id, dataset_id, amount):
         LOG.error(f"Unexpected error updating budget: {str(e)}")
         return None
 
-def pvalue_strategy(user_id, records, qparams, dataset_id):
+async def pvalue_strategy(user_id, records, qparams, dataset_id):
     """
     Applies the p-value strategy to the given records.
     This function computes the risk for each record and updates the budget
@@ -115,13 +115,13 @@ def pvalue_strategy(user_id, records, qparams, dataset_id):
         # step 4: compute the risk for that query: ri = -log(1 - Di)
         allele_frequency = record.get('alleleFrequency')
         # total number of individuals
-        N = client.beacon.get_collection('individuals').estimated_document_count() 
+        N = await client.beacon.get_collection('individuals').estimated_document_count() 
         Di = (1 - allele_frequency) ** (2 * N)
         ri = -(math.log10(1 - Di))
         LOG.debug(f"Query RIP cost: {ri}")
         
         # Check if query has been asked before
-        response_history = client.beacon['history'].find_one({
+        response_history = await client.beacon['history'].find_one({
             FIELD_USER_ID: user_id,
             FIELD_QUERY: qparams.summary(),
             FIELD_DATASET_ID: dataset_id
@@ -143,7 +143,7 @@ def pvalue_strategy(user_id, records, qparams, dataset_id):
         for idx, individual_id in enumerate(individual_ids):
 
             # Try to update budget
-            budget_info = update_individual_budget(
+            budget_info = await update_individual_budget(
                             user_id=user_id,
                             individual_id=individual_id,
                             dataset_id=dataset_id, 
@@ -154,7 +154,7 @@ def pvalue_strategy(user_id, records, qparams, dataset_id):
                 LOG.debug(f"RIP: Not enough budget for individual {individual_id}")
                 # revert previous individual updates
                 for prev_individual_id in individual_ids[0:idx]:
-                    update_individual_budget(
+                    await update_individual_budget(
                         user_id=user_id,
                         individual_id=prev_individual_id,
                         dataset_id=dataset_id, 
@@ -172,12 +172,12 @@ def pvalue_strategy(user_id, records, qparams, dataset_id):
                 "response": records,
                 "datasetId": dataset_id
             }
-            client.beacon['history'].insert_one(history_document)
+            await client.beacon['history'].insert_one(history_document)
         
     return records
 
 # facade function for the RIP logic
-def apply_rip_logic(user_id:str, qparams:RequestParams, records:List[dict], is_authenticated,
+async def apply_rip_logic(user_id:str, qparams:RequestParams, records:List[dict], is_authenticated,
     dataset_is_accessible, dataset_id):
         
     """
@@ -208,7 +208,7 @@ def apply_rip_logic(user_id:str, qparams:RequestParams, records:List[dict], is_a
     
     LOG.debug("RIP access granted to query")
     #(user_id, records, qparams, dataset_id)
-    records = pvalue_strategy(
+    records = await pvalue_strategy(
         user_id=user_id,
         records=records,
         qparams=qparams,
@@ -1,11 +1,11 @@
 import logging
 from typing import Dict, List, Optional
 from beacon.db.filters import apply_alphanumeric_filter, apply_filters
-from beacon.db.utils import query_id, query_ids, get_count, get_documents, get_cross_query, get_filtering_documents
+from beacon.db.utils import query_id, query_ids, get_cross_query, get_results, get_count_and_page
 from beacon.db import client
 from beacon.request.model import AlphanumericFilter, Operator, RequestParams
 from beacon.db.schemas import DefaultSchemas
-from beacon.db.utils import query_id, get_count, get_documents
+from beacon.db.utils import query_id
 from beacon.request.model import RequestParams
 
 LOG = logging.getLogger(__name__)
@@ -37,184 +37,56 @@ def apply_request_parameters(query: Dict[str, List[dict]], qparams: RequestParam
             query["$text"]["$search"]=v
     return query
 
-def get_runs(entry_id: Optional[str], qparams: RequestParams):
+async def get_runs(entry_id: Optional[str], qparams: RequestParams):
     collection = 'runs'
     query = apply_request_parameters({}, qparams)
-    query = query = apply_filters(query, qparams.query.filters, collection)
+    query = query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.RUNS
-    count = get_count(client.beacon.runs, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.runs,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.runs, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.runs, query, qparams)
     return schema, count, docs
 
-def get_run_with_id(entry_id: Optional[str], qparams: RequestParams):
+async def get_run_with_id(entry_id: Optional[str], qparams: RequestParams):
     collection = 'runs'
     query = apply_request_parameters({}, qparams)
-    query = query = apply_filters(query, qparams.query.filters, collection)
+    query = query = await apply_filters(query, qparams.query.filters, collection)
     query = query_id(query, entry_id)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.RUNS
-    count = get_count(client.beacon.runs, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.runs,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.runs, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.runs,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.runs, query, qparams)
     return schema, count, docs
 
 
-def get_variants_of_run(entry_id: Optional[str], qparams: RequestParams):
+async def get_variants_of_run(entry_id: Optional[str], qparams: RequestParams):
     collection = 'runs'
     query = {"$and": [{"id": entry_id}]}
     query = apply_request_parameters(query, qparams)
-    query = query = apply_filters(query, qparams.query.filters, collection)
-    count = get_count(client.beacon.runs, query)
-    run_ids = client.beacon.runs \
+    query = query = await apply_filters(query, qparams.query.filters, collection)
+    run_ids = await client.beacon.runs \
         .find_one(query, {"biosampleId": 1, "_id": 0})
     run_ids=get_cross_query(run_ids,'biosampleId','caseLevelData.biosampleId')
-    query = apply_filters(run_ids, qparams.query.filters, collection)
+    query = await apply_filters(run_ids, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.GENOMICVARIATIONS
-    count = get_count(client.beacon.genomicVariations, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.genomicVariations, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.genomicVariations,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.genomicVariations, query, qparams)
     return schema, count, docs
 
-def get_analyses_of_run(entry_id: Optional[str], qparams: RequestParams):
+async def get_analyses_of_run(entry_id: Optional[str], qparams: RequestParams):
     collection = 'runs'
     query = {"runId": entry_id}
     query = apply_request_parameters(query, qparams)
-    query = apply_filters(query, qparams.query.filters, collection)
+    query = await apply_filters(query, qparams.query.filters, collection)
     query = include_resultset_responses(query, qparams)
     schema = DefaultSchemas.ANALYSES
-    count = get_count(client.beacon.analyses, query)
-    include = qparams.query.include_resultset_responses
-    if include == 'MISS':
-        pre_docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            count
-        )
-        negative_query={}
-        ids_array = []
-        for doc in pre_docs:
-            elem_query={}
-            elem_query['_id']=doc['_id']
-            ids_array.append(elem_query)
-        
-        negative_query['$nor']=ids_array
-        LOG.debug(negative_query)
-        docs = get_documents(
-            client.beacon.analyses,
-            negative_query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
-        count = get_count(client.beacon.analyses, negative_query)
-    else:
-        docs = get_documents(
-            client.beacon.analyses,
-            query,
-            qparams.query.pagination.skip,
-            qparams.query.pagination.limit
-        )
+    count, docs = await get_results(client.beacon.analyses, query, qparams)
     return schema, count, docs
 
-def get_filtering_terms_of_run(entry_id: Optional[str], qparams: RequestParams):
+async def get_filtering_terms_of_run(entry_id: Optional[str], qparams: RequestParams):
     query = {'scope': 'runs'}
     schema = DefaultSchemas.FILTERINGTERMS
-    count = get_count(client.beacon.filtering_terms, query)
-    remove_id={'_id':0}
-    docs = get_filtering_documents(
+    count, docs = await get_count_and_page(
         client.beacon.filtering_terms,
         query,
-        remove_id,
         qparams.query.pagination.skip,
         qparams.query.pagination.limit
     )
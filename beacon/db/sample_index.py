@@ -0,0 +1,182 @@
+"""
+In-memory sample membership index, for the joins between the variants and the biosamples that
+carry them (``caseLevelData.biosampleId``) without going to the DB.
+
+For every dataset, the biosample ids are encoded as dense ints (the sample dictionary), and:
+
+* every variant has the ints of its samples, in NumPy arrays (``carriers[offsets[row]:offsets[row + 1]]``),
+  found by a 64-bit hash of its ``variantInternalId``;
+* every sample has a compressed (roaring) bitmap of the rows of the variants it carries.
+
+So the samples of a variant are a lookup, and the variants carried by some samples are a bitmap
+union or intersection. Enable it with ``conf.sample_membership_index`` (needs ``pyroaring``).
+
+The index of a dataset is tied to its data version (see ``dataset_index``), the datasets are
+indexed in the background and their queries go to the DB until then.
+"""
+
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from pyroaring import BitMap
+except ImportError:
+    BitMap = None
+
+from beacon import conf
+from beacon.db import client
+from beacon.db.dataset_index import DatasetIndex
+from beacon.request.model import Granularity, RequestParams
+
+LOG = logging.getLogger(__name__)
+
+PROJECTION = {"_id": 0, "variantInternalId": 1, "caseLevelData.biosampleId": 1}
+
+
+def variant_hash(variant_id) -> int:
+    return int.from_bytes(hashlib.blake2b(str(variant_id).encode(), digest_size=8).digest(), "little")
+
+
+class DatasetSamples:
+    """The samples of the variants of a dataset, and the variants of its samples"""
+
+    def __init__(self, version: Tuple, samples: List[str], variant_hashes: np.ndarray, variant_rows: np.ndarray,
+            offsets: np.ndarray, carriers: np.ndarray, sample_variants: List["BitMap"]):
+        self.version = version
+        # sample int -> biosample id
+        self.samples = samples
+        self.sample_numbers = {sample_id: i for i, sample_id in enumerate(samples)}
+        # sorted hashes of the variant ids, and the row of each
+        self.variant_hashes = variant_hashes
+        self.variant_rows = variant_rows
+        # the samples of the variant of each row: carriers[offsets[row]:offsets[row + 1]]
+        self.offsets = offsets
+        self.carriers = carriers
+        # the rows of the variants carried by each sample
+        self.sample_variants = sample_variants
+
+    def samples_of_variant(self, variant_id) -> "BitMap":
+        h = np.uint64(variant_hash(variant_id))
+        lo = np.searchsorted(self.variant_hashes, h, side="left")
+        hi = np.searchsorted(self.variant_hashes, h, side="right")
+        samples = BitMap()
+        for row in self.variant_rows[lo:hi]:
+            samples.update(self.carriers[self.offsets[row]:self.offsets[row + 1]].tolist())
+        return samples
+
+    def variants_of_samples(self, sample_ids: Iterable[str], carried_by_all: bool = False) -> "BitMap":
+        """Rows of the variants carried by any (or, with ``carried_by_all``, all) of the samples"""
+        bitmaps = []
+        for sample_id in sample_ids:
+            number = self.sample_numbers.get(sample_id)
+            if number is not None:
+                bitmaps.append(self.sample_variants[number])
+            elif carried_by_all:
+                return BitMap()
+        if not bitmaps:
+            return BitMap()
+        return BitMap.intersection(*bitmaps) if carried_by_all else BitMap.union(*bitmaps)
+
+    def sample_ids(self, samples: "BitMap") -> List[str]:
+        return [self.samples[number] for number in samples]
+
+    def nbytes(self) -> int:
+        arrays = self.variant_hashes.nbytes + self.variant_rows.nbytes + self.offsets.nbytes + self.carriers.nbytes
+        return arrays + sum(bitmap_nbytes(bitmap) for bitmap in self.sample_variants)
+
+
+def bitmap_nbytes(bitmap: "BitMap") -> int:
+    statistics = bitmap.get_statistics()
+    return (statistics["n_bytes_array_containers"] + statistics["n_bytes_bitset_containers"]
+        + statistics["n_bytes_run_containers"])
+
+
+async def read_dataset_samples(dataset_id: str, version: Tuple) -> DatasetSamples:
+    """Indexes the samples of the variants of the dataset from the DB"""
+    samples: List[str] = []
+    sample_numbers: Dict[str, int] = {}
+    hashes, offsets, carriers = [], [0], []
+    # sample int -> rows of its variants
+    sample_rows = defaultdict(list)
+    cursor = client.beacon.genomicVariations.find({"_info.datasetId": dataset_id}, PROJECTION, batch_size=10000)
+    async for variant in cursor:
+        row = len(hashes)
+        hashes.append(variant_hash(variant.get("variantInternalId")))
+        numbers = set()
+        for case in variant.get("caseLevelData") or []:
+            sample_id = case.get("biosampleId") if isinstance(case, dict) else None
+            if not sample_id:
+                continue
+            number = sample_numbers.get(sample_id)
+            if number is None:
+                number = sample_numbers[sample_id] = len(samples)
+                samples.append(sample_id)
+            numbers.add(number)
+        for number in sorted(numbers):
+            carriers.append(number)
+            sample_rows[number].append(row)
+        offsets.append(len(carriers))
+
+    variant_hashes = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    order = np.argsort(variant_hashes, kind="stable")
+    return DatasetSamples(
+        version,
+        samples,
+        variant_hashes[order],
+        order.astype(np.int64),
+        np.array(offsets, dtype=np.int64),
+        np.array(carriers, dtype=np.int32),
+        [BitMap(sample_rows[number]) for number in range(len(samples))],
+    )
+
+
+class SampleMembershipIndex(DatasetIndex[DatasetSamples]):
+
+    name = "sample memberships"
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(conf, 'sample_membership_index', False) and BitMap is not None
+
+    async def read(self, dataset_id: str, version: Tuple) -> DatasetSamples:
+        return await read_dataset_samples(dataset_id, version)
+
+    def nbytes(self, samples: DatasetSamples) -> int:
+        return samples.nbytes()
+
+    async def biosamples_of_variant(self, variant_id, datasets: Iterable[str]) -> Optional[List[str]]:
+        """Ids of the biosamples that carry the variant in any of the datasets, or None if they have to
+        be read from the DB"""
+        if not self.enabled:
+            return None
+        indexed = await self.get_all(datasets)
+        if indexed is None:
+            return None
+        biosample_ids = {}
+        for samples in indexed.values():
+            biosample_ids.update(dict.fromkeys(samples.sample_ids(samples.samples_of_variant(variant_id))))
+        return list(biosample_ids)
+
+    async def count_variants_of_samples(self, sample_ids: List[str], qparams: RequestParams,
+            carried_by_all: bool = False) -> Optional[Dict[str, int]]:
+        """{ dataset_id:count } of the variants carried by the samples, for the boolean and count answers
+        of the queries without other conditions, or None if it has to go to the DB"""
+        if not self.enabled or qparams.granularity not in (Granularity.BOOLEAN, Granularity.COUNT) \
+            or qparams.target_datasets is None:
+            return None
+        if qparams.query.filters or qparams.query.request_parameters or qparams.query.include_resultset_responses != 'HIT':
+            return None
+        indexed = await self.get_all(qparams.target_datasets)
+        if indexed is None:
+            return None
+        return {
+            dataset_id: len(samples.variants_of_samples(sample_ids, carried_by_all))
+            for dataset_id, samples in indexed.items()
+        }
+
+
+SAMPLE_MEMBERSHIP_INDEX = SampleMembershipIndex()
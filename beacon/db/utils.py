@@ -1,12 +1,41 @@
-from typing import Dict, Optional
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-from pymongo.cursor import Cursor
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorCursor
 
 import logging
 
+from beacon import conf
+from beacon.request.model import Granularity, InvalidPageToken, UnsupportedQuery, is_sort_key
+
 LOG = logging.getLogger(__name__)
 
+# time limit of the queries, longer for the query jobs (see beacon.request.jobs)
+QUERY_MAX_TIME_MS: ContextVar[int] = ContextVar("query_max_time_ms", default=10 * 1000)
+
+# internal fields, never returned to the user
+DOCUMENT_PROJECTION = {"_id":0, "_position":0, "_info":0}
+
+# field with the dataset id of the documents, for the collections where it isn't "datasetId"
+DATASET_FIELDS = {
+    "genomicVariations": "_info.datasetId",
+}
+
+# order of the pages of the collections where it isn't (dataset id, _id), it must end in a unique field
+# (the keyset pagination continues after the key of the last document of a page)
+SORT_KEYS = {
+    "genomicVariations": ["_info.datasetId", "_position.refseqId", "_position.start", "_id"],
+}
+
+
+class DatasetPage(list):
+    """Page of documents of a dataset, with the sort key of its last document (None if it's the last page)"""
+
+    def __init__(self, docs=(), next_key: Optional[list] = None):
+        super().__init__(docs)
+        self.next_key = next_key
+
 
 def query_id(query: dict, document_id) -> dict:
     query["id"] = document_id
@@ -23,23 +52,535 @@ def query_property(query: dict, property_id: str, value: str, property_map: Dict
     return query
 
 
-def get_count(collection: Collection, query: dict) -> int:
+async def get_count(collection: AsyncIOMotorCollection, query: dict) -> int:
     if not query:
         LOG.debug("Returning estimated count")
-        return collection.estimated_document_count()
+        return await collection.estimated_document_count()
     else:
         LOG.debug("FINAL QUERY (COUNT): {}".format(query))
         LOG.debug("Returning count")
-        return collection.count_documents(query)
+        return await collection.count_documents(query)
+
 
+async def get_exists(collection: AsyncIOMotorCollection, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    """Returns the first document matching the query (or None), without counting the rest"""
+    LOG.debug("FINAL QUERY (EXISTS): {}".format(query))
+    docs = await collection.find(query, projection=projection or {"_id": 1}).limit(1).max_time_ms(QUERY_MAX_TIME_MS.get()).to_list(1)
+    return docs[0] if docs else None
 
-def get_documents(collection: Collection, query: dict, skip: int, limit: int) -> Cursor:
+
+def get_documents(collection: AsyncIOMotorCollection, query: dict, skip: int, limit: int) -> AsyncIOMotorCursor:
+    """Returns an async cursor, the query only runs when it's iterated (``async for`` / ``to_list``)"""
     LOG.debug("FINAL QUERY: {}".format(query))
-    return collection.find(query, projection={"_id":0, "_position":0, "_info":0}).skip(skip).limit(limit).max_time_ms(10 * 1000)
+    return collection.find(query, projection=DOCUMENT_PROJECTION).skip(skip).limit(limit).max_time_ms(QUERY_MAX_TIME_MS.get())
+
+def get_dataset_field(collection: AsyncIOMotorCollection) -> str:
+    return DATASET_FIELDS.get(collection.name, "datasetId")
+
+
+def get_sort_keys(collection: AsyncIOMotorCollection) -> List[str]:
+    return SORT_KEYS.get(collection.name, [get_dataset_field(collection), "_id"])
+
+
+def seek_query(sort_keys: List[str], after: list) -> dict:
+    """Matches the documents after the given key (from the client, checked), in the order of the sort keys"""
+    if not is_sort_key(after) or len(after) != len(sort_keys):
+        raise InvalidPageToken("Invalid pagination token")
+    clauses = []
+    for i, (key, value) in enumerate(zip(sort_keys, after)):
+        clause = {previous_key: previous_value for previous_key, previous_value in zip(sort_keys[:i], after[:i])}
+        # null (or missing) goes first, and {"$gt": null} wouldn't match anything
+        clause[key] = {"$ne": None} if value is None else {"$gt": value}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def page_pipeline(collection: AsyncIOMotorCollection, skip: int, limit: int, after: Optional[list]) -> List[dict]:
+    """Stages that sort the documents and take a page, with the sort key of each document in ``_next``"""
+    sort_keys = get_sort_keys(collection)
+    stages = []
+    if after is not None:
+        stages.append({"$match": seek_query(sort_keys, after)})
+    stages.append({"$sort": {key: 1 for key in sort_keys}})
+    if after is None and skip:
+        stages.append({"$skip": skip})
+    stages += [
+        {"$limit": limit},
+        {"$addFields": {"_next": {str(i): f"${key}" for i, key in enumerate(sort_keys)}}},
+        {"$project": DOCUMENT_PROJECTION},
+    ]
+    return stages
+
+
+def to_page(collection: AsyncIOMotorCollection, docs: List[dict], limit: int) -> DatasetPage:
+    """Removes the ``_next`` sort keys of the documents of a page"""
+    sort_keys = get_sort_keys(collection)
+    next_key = None
+    for doc in docs:
+        next_fields = doc.pop("_next", {})
+        # the missing fields aren't in _next (and sort as null)
+        next_key = [next_fields.get(str(i)) for i in range(len(sort_keys))]
+    # a full page might not be the last one
+    return DatasetPage(docs, next_key if len(docs) == limit else None)
+
+
+def scope_query(collection: AsyncIOMotorCollection, query: dict, datasets: List[str]) -> dict:
+    """Restricts the query to the documents of the given datasets"""
+    dataset_field = get_dataset_field(collection)
+    if len(datasets) == 1:
+        scope = {dataset_field: datasets[0]}
+    else:
+        scope = {dataset_field: {"$in": datasets}}
+
+    if not query:
+        return scope
+    return {"$and": [query, scope]}
+
+
+async def get_documents_by_dataset(collection: AsyncIOMotorCollection, query: dict, datasets: List[str], skip: int, limit: int,
+        after_keys: Optional[Dict[str, list]] = None) -> Dict[str, Tuple[int, DatasetPage]]:
+    """{ dataset_id: (count, docs) } of the datasets, in one $facet roundtrip by ``conf.facet_max_datasets``"""
+    max_datasets = max(getattr(conf, 'facet_max_datasets', 8), 1)
+
+    async def get_chunk_results(chunk: List[str]) -> Dict[str, Tuple[int, DatasetPage]]:
+        pipeline = [
+            {"$match": scope_query(collection, query, chunk)},
+            {"$facet": dataset_facets(collection, chunk, skip, limit, after_keys)},
+        ]
+        LOG.debug("FINAL PIPELINE: {}".format(pipeline))
+        result, = await collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=QUERY_MAX_TIME_MS.get()).to_list(1)
+        return from_dataset_facets(collection, result, chunk, limit)
+
+    chunk_results = await asyncio.gather(*[
+        get_chunk_results(datasets[i:i + max_datasets]) for i in range(0, len(datasets), max_datasets)
+    ])
+    return {dataset_id: results for chunk in chunk_results for dataset_id, results in chunk.items()}
+
+
+def dataset_facets(collection: AsyncIOMotorCollection, datasets: List[str], skip: int, limit: int,
+        after_keys: Optional[Dict[str, list]], pages: bool = True) -> Dict[str, List[dict]]:
+    """Sub-pipelines ($facet) for the counts of the datasets and, with ``pages``, the page of each one"""
+    dataset_field = get_dataset_field(collection)
+
+    # one sub-pipeline for the counts and one for the page of each dataset
+    facets = {
+        "counts": [
+            {"$group": {"_id": f"${dataset_field}", "count": {"$sum": 1}}}
+        ]
+    }
+    if not pages:
+        return facets
+    for i, dataset_id in enumerate(datasets):
+        if after_keys is not None and dataset_id not in after_keys:
+            continue
+        facets[f"dataset_{i}"] = [
+            {"$match": {dataset_field: dataset_id}},
+            *page_pipeline(collection, skip, limit, after_keys[dataset_id] if after_keys is not None else None),
+        ]
+    return facets
+
+
+def from_dataset_facets(collection: AsyncIOMotorCollection, result: dict, datasets: List[str],
+        limit: int) -> Dict[str, Tuple[int, DatasetPage]]:
+    """{ dataset_id: (count, docs) } of the result of the ``dataset_facets``"""
+    counts = {doc["_id"]: doc["count"] for doc in result["counts"]}
+    return {
+        dataset_id: (counts.get(dataset_id, 0), to_page(collection, result.get(f"dataset_{i}", []), limit))
+        for i, dataset_id in enumerate(datasets)
+    }
+
+
+async def get_page(collection: AsyncIOMotorCollection, query: dict, skip: int, limit: int, after: Optional[list]) -> DatasetPage:
+    """Gets a page of documents, after the given key or (without one) skipping ``skip`` documents"""
+    pipeline = [{"$match": query}, *page_pipeline(collection, skip, limit, after)]
+    LOG.debug("FINAL PIPELINE: {}".format(pipeline))
+    docs = await collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS.get()).to_list(None)
+    return to_page(collection, docs, limit)
+
+
+class LowerBound(int):
+    """Count that stopped at ``conf.count_cap``: there are at least this many results"""
+    precision = "lowerBound"
+
+
+class Estimate(int):
+    """Count estimated from the count statistics"""
+    precision = "estimated"
+
+
+def get_count_policy(collection: AsyncIOMotorCollection) -> str:
+    """How the results of the collection are counted: 'exact', 'capped' or 'estimated'"""
+    return conf.count_policies.get(collection.name, "exact")
+
+
+def get_count_cap(collection: AsyncIOMotorCollection) -> int:
+    """Where the counts of the collection stop (0: they don't), the estimated ones are capped when they can't be estimated"""
+    return conf.count_cap if get_count_policy(collection) in ("capped", "estimated") else 0
+
+
+async def get_capped_count(collection: AsyncIOMotorCollection, query: dict, cap: int) -> int:
+    """Counts the documents matching the query, stopping at ``cap`` (0: exact count)"""
+    if not cap:
+        return await get_count(collection, query)
+    LOG.debug("FINAL QUERY (COUNT UP TO {}): {}".format(cap, query))
+    count = await collection.count_documents(query, limit=cap)
+    return LowerBound(count) if count >= cap else count
+
+
+async def get_count_and_page(collection: AsyncIOMotorCollection, query: dict, skip: int, limit: int,
+        after: Optional[list] = None) -> Tuple[int, DatasetPage]:
+    """Gets the number of documents matching the query (a LowerBound past the count cap) and a page of them in one roundtrip"""
+    cap = get_count_cap(collection)
+    if not query or (cap and (after is not None or skip + limit > cap)):
+        # without a query, the estimated count of the collection is cheaper, and with a cap the page
+        # might not be among the documents counted: both are fetched at the same time instead
+        count, docs = await asyncio.gather(
+            get_capped_count(collection, query, cap),
+            get_page(collection, query, skip, limit, after),
+        )
+        return count, docs
+
+    pipeline = [{"$match": query}]
+    if cap:
+        # the count stops at the first documents found, as in get_capped_count
+        pipeline.append({"$limit": cap})
+    pipeline.append({"$facet": {
+        "count": [{"$count": "count"}],
+        "page": page_pipeline(collection, skip, limit, after),
+    }})
+    LOG.debug("FINAL PIPELINE: {}".format(pipeline))
+    result, = await collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS.get()).to_list(1)
+
+    count = result["count"][0]["count"] if result["count"] else 0
+    if cap and count >= cap:
+        # the documents counted aren't the first ones in the order of the pages
+        return LowerBound(count), await get_page(collection, query, skip, limit, after)
+    return count, to_page(collection, result["page"], limit)
+
+
+async def get_counts_by_dataset(collection: AsyncIOMotorCollection, query: dict, datasets: List[str]) -> Dict[str, int]:
+    """Counts the documents of every dataset in a single roundtrip (on its own, stopping at the count cap, with one)"""
+    cap = get_count_cap(collection)
+    if cap:
+        counts = await asyncio.gather(*[
+            get_capped_count(collection, scope_query(collection, query, [dataset_id]), cap)
+            for dataset_id in datasets
+        ])
+        return dict(zip(datasets, counts))
+
+    dataset_field = get_dataset_field(collection)
+    pipeline = [
+        {"$match": scope_query(collection, query, datasets)},
+        {"$group": {"_id": f"${dataset_field}", "count": {"$sum": 1}}},
+    ]
+    LOG.debug("FINAL PIPELINE: {}".format(pipeline))
+    counts = {doc["_id"]: doc["count"] async for doc in collection.aggregate(pipeline, maxTimeMS=QUERY_MAX_TIME_MS.get())}
+    return {dataset_id: counts.get(dataset_id, 0) for dataset_id in datasets}
+
+
+async def get_exists_by_dataset(collection: AsyncIOMotorCollection, query: dict, datasets: List[str], any_dataset: bool) -> Dict[str, bool]:
+    """Checks which datasets have documents matching the query, with a limit(1) probe by dataset (or one for all, with ``any_dataset``)"""
+    if any_dataset:
+        dataset_field = get_dataset_field(collection)
+        doc = await get_exists(collection, scope_query(collection, query, datasets), {dataset_field: 1})
+        hit_dataset = doc
+        for key in dataset_field.split("."):
+            hit_dataset = hit_dataset.get(key) if isinstance(hit_dataset, dict) else None
+        return {dataset_id: dataset_id == hit_dataset for dataset_id in datasets}
+
+    docs = await asyncio.gather(*[
+        get_exists(collection, scope_query(collection, query, [dataset_id])) for dataset_id in datasets
+    ])
+    return {dataset_id: doc is not None for dataset_id, doc in zip(datasets, docs)}
+
+
+# operators that MongoDB doesn't allow inside a $nor
+NOT_NEGATABLE_OPERATORS = {"$text", "$near", "$nearSphere"}
+
+
+def has_operator(query, operators) -> bool:
+    if isinstance(query, dict):
+        return any(key in operators or has_operator(value, operators) for key, value in query.items())
+    if isinstance(query, list):
+        return any(has_operator(item, operators) for item in query)
+    return False
+
+
+def get_miss_query(query: dict) -> dict:
+    """The negation of the query, the MISS results are its complement"""
+    if not query:
+        # everything is a hit
+        return {"$nor": [{}]}
+    if has_operator(query, NOT_NEGATABLE_OPERATORS):
+        raise UnsupportedQuery("The MISS results of a text search aren't supported")
+    return {"$nor": [query]}
+
+
+async def get_estimated_results(collection: AsyncIOMotorCollection, query: dict, qparams,
+        estimates: Dict[str, Estimate]) -> Tuple[int, Dict[str, Tuple[int, DatasetPage]]]:
+    """Gets the pages of the datasets of a scoped query, with their estimated counts instead of counting them"""
+    skip = qparams.query.pagination.skip
+    limit = qparams.query.pagination.limit
+    after_keys = qparams.query.pagination.after_keys
+    datasets = qparams.target_datasets
+
+    if qparams.granularity == Granularity.COUNT:
+        return sum(estimates.values()), {dataset_id: (estimates[dataset_id], []) for dataset_id in datasets}
+
+    async def get_dataset_results(dataset_id):
+        estimate = estimates[dataset_id]
+        if after_keys is not None and dataset_id not in after_keys:
+            # no more pages
+            return estimate, DatasetPage()
+        after = after_keys[dataset_id] if after_keys is not None else None
+        docs = await get_page(collection, scope_query(collection, query, [dataset_id]), skip, limit, after)
+        # the page tells the exact count when it's the last one, and a minimum otherwise
+        if after is None and len(docs) < limit:
+            if docs or not skip:
+                return skip + len(docs), docs
+            # skipped past the end: there are at most `skip`
+            return (estimate if estimate <= skip else Estimate(skip)), docs
+        seen = len(docs) if after is not None else skip + len(docs)
+        return (estimate if estimate >= seen else Estimate(seen)), docs
+
+    dataset_results = await asyncio.gather(*[get_dataset_results(dataset_id) for dataset_id in datasets])
+    results = dict(zip(datasets, dataset_results))
+    return sum(count for count, _ in results.values()), results
+
+
+async def get_results(collection: AsyncIOMotorCollection, query: dict, qparams,
+        count_estimator: Optional[Callable[[List[str]], Awaitable[Optional[Dict[str, Estimate]]]]] = None):
+    """Gets (count, docs) of the query, or (total_count, { dataset_id: (count, docs) }) if it's scoped to some datasets"""
+    if qparams.query.include_resultset_responses == 'MISS':
+        query = get_miss_query(query)
+
+    skip = qparams.query.pagination.skip
+    limit = qparams.query.pagination.limit
+    datasets = qparams.target_datasets
+
+    if datasets and qparams.granularity == Granularity.BOOLEAN:
+        any_dataset = not conf.boolean_by_dataset
+        exists = await get_exists_by_dataset(collection, query, datasets, any_dataset)
+        return int(any(exists.values())), {dataset_id: (int(hit), []) for dataset_id, hit in exists.items()}
+
+    estimates = None
+    if datasets and get_count_policy(collection) == "estimated" and count_estimator is not None:
+        estimates = await count_estimator(datasets)
+    if estimates is not None:
+        return await get_estimated_results(collection, query, qparams, estimates)
+
+    if datasets and qparams.granularity == Granularity.COUNT:
+        counts = await get_counts_by_dataset(collection, query, datasets)
+        return sum(counts.values()), {dataset_id: (count, []) for dataset_id, count in counts.items()}
+
+    if datasets is None:
+        return await get_count_and_page(collection, query, skip, limit)
+
+    if not datasets:
+        return 0, {}
+
+    after_keys = qparams.query.pagination.after_keys
+    if len(datasets) == 1 or get_count_cap(collection):
+        # with a cap, every dataset is counted on its own, so it stops at the cap
+        async def get_dataset_results(dataset_id):
+            dataset_query = scope_query(collection, query, [dataset_id])
+            if after_keys is not None and dataset_id not in after_keys:
+                # no more pages
+                return await get_capped_count(collection, dataset_query, get_count_cap(collection)), DatasetPage()
+            after = after_keys[dataset_id] if after_keys is not None else None
+            return await get_count_and_page(collection, dataset_query, skip, limit, after)
+
+        dataset_results = await asyncio.gather(*[get_dataset_results(dataset_id) for dataset_id in datasets])
+        results = dict(zip(datasets, dataset_results))
+    else:
+        results = await get_documents_by_dataset(collection, query, datasets, skip, limit, after_keys)
+    count = sum(dataset_count for dataset_count, _ in results.values())
+    return count, results
+
+
+# field with the join key of the source documents of the joins
+JOIN_KEY = "_joinKey"
+# field with the matches of the other collection of a semi-join
+SEMI_JOIN_MATCHES = "_semiJoinMatches"
+
+
+def join_ids(source_fields: List[str]) -> dict:
+    """Expression with the ids in the ``source_fields`` (arrays or single values) of a document, each once"""
+    return {"$setUnion": [
+        {"$filter": {
+            "input": {"$cond": [{"$isArray": f"${field}"}, f"${field}", [f"${field}"]]},
+            "cond": {"$ne": ["$$this", None]},
+        }}
+        for field in source_fields
+    ]}
+
+
+def join_pipeline(source_query: dict, source_fields: List[str], target: AsyncIOMotorCollection, target_field: str,
+        target_query: dict, multikey: bool = False) -> List[dict]:
+    """Stages, on the source collection, that return the target documents joined to the source documents"""
+    stages = [
+        {"$match": source_query},
+        {"$project": {"_id": 0, JOIN_KEY: join_ids(source_fields)}},
+        {"$unwind": f"${JOIN_KEY}"},
+        {"$group": {"_id": f"${JOIN_KEY}"}},
+        {"$lookup": {
+            "from": target.name,
+            "localField": "_id",
+            "foreignField": target_field,
+            # no $text search inside a $lookup
+            "pipeline": [{"$match": target_query}] if target_query else [],
+            "as": "_docs",
+        }},
+        {"$unwind": "$_docs"},
+        {"$replaceRoot": {"newRoot": "$_docs"}},
+    ]
+    if multikey:
+        stages += [
+            {"$group": {"_id": "$_id", "_doc": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$_doc"}},
+        ]
+    return stages
+
+
+def semi_join_lookups(local_field: str, other: AsyncIOMotorCollection, foreign_fields: List[str], other_query: dict) -> List[dict]:
+    """A probe of the other collection by foreign field, stopping at its first match"""
+    return [
+        {"$lookup": {
+            "from": other.name,
+            "localField": local_field,
+            "foreignField": foreign_field,
+            "pipeline": [{"$match": other_query}, {"$limit": 1}, {"$project": {"_id": 1}}],
+            "as": f"{SEMI_JOIN_MATCHES}{i}",
+        }}
+        for i, foreign_field in enumerate(foreign_fields)
+    ]
+
+
+def semi_join_pipeline(query: dict, local_field: str, other: AsyncIOMotorCollection, foreign_field: str,
+        other_query: dict) -> List[dict]:
+    """Stages that keep the documents matching the query joined to a document matching ``other_query``"""
+    lookup, = semi_join_lookups(local_field, other, [foreign_field], other_query)
+    matches = lookup["$lookup"]["as"]
+    return [
+        {"$match": query},
+        lookup,
+        {"$match": {f"{matches}.0": {"$exists": True}}},
+        {"$unset": matches},
+    ]
+
+
+def anti_join_pipeline(collection: AsyncIOMotorCollection, query: dict, local_field: str, other: AsyncIOMotorCollection,
+        foreign_fields: List[str], other_query: dict, datasets: Optional[List[str]]) -> List[dict]:
+    """Stages that return the documents of the datasets that aren't in the semi-join (the MISS results)"""
+    if has_operator(other_query, NOT_NEGATABLE_OPERATORS):
+        raise UnsupportedQuery("The MISS results of a text search aren't supported")
+    lookups = semi_join_lookups(local_field, other, foreign_fields, other_query)
+    matches = [lookup["$lookup"]["as"] for lookup in lookups]
+    without_match = [
+        {"$match": scope_query(collection, query, datasets) if datasets else query},
+        *lookups,
+        {"$match": {"$or": [
+            {local_field: {"$exists": False}},
+            {f"{field}.0": {"$exists": False} for field in matches},
+        ]}},
+        {"$unset": matches},
+    ]
+    if not query:
+        return without_match
+    miss_query = get_miss_query(query)
+    return [
+        {"$match": scope_query(collection, miss_query, datasets) if datasets else miss_query},
+        {"$unionWith": {"coll": collection.name, "pipeline": without_match}},
+    ]
+
+
+async def get_pipeline_results(collection: AsyncIOMotorCollection, stages: List[dict], target: AsyncIOMotorCollection, qparams):
+    """Gets the count and the page of the target documents returned by the stages, in one aggregation"""
+    skip = qparams.query.pagination.skip
+    limit = qparams.query.pagination.limit
+    after_keys = qparams.query.pagination.after_keys
+    datasets = qparams.target_datasets
+    if datasets is not None and not datasets:
+        return 0, {}
+
+    if datasets is None:
+        facets = {
+            "count": [{"$count": "count"}],
+            "page": page_pipeline(target, skip, limit, None),
+        }
+    else:
+        pages = qparams.granularity not in (Granularity.BOOLEAN, Granularity.COUNT)
+        facets = dataset_facets(target, datasets, skip, limit, after_keys, pages)
+
+    pipeline = [*stages, {"$facet": facets}]
+    LOG.debug("FINAL PIPELINE (JOIN): {}".format(pipeline))
+    result, = await collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=QUERY_MAX_TIME_MS.get()).to_list(1)
+
+    if datasets is None:
+        count = result["count"][0]["count"] if result["count"] else 0
+        return count, to_page(target, result["page"], limit)
+    results = from_dataset_facets(target, result, datasets, limit)
+    if qparams.granularity == Granularity.BOOLEAN:
+        results = {dataset_id: (int(count > 0), docs) for dataset_id, (count, docs) in results.items()}
+        return int(any(count for count, _ in results.values())), results
+    return sum(count for count, _ in results.values()), results
+
+
+async def get_join_results(source: AsyncIOMotorCollection, source_query: dict, source_fields: List[str],
+        target: AsyncIOMotorCollection, target_field: str, target_query: dict, qparams, multikey: bool = False):
+    """Count and page of the target documents joined to the source documents matching the query, in one aggregation"""
+    datasets = qparams.target_datasets
+    if qparams.query.include_resultset_responses == 'MISS':
+        stages = anti_join_pipeline(target, target_query, target_field, source, source_fields, source_query, datasets)
+        return await get_pipeline_results(target, stages, target, qparams)
+
+    if datasets:
+        target_query = scope_query(target, target_query, datasets)
+    stages = join_pipeline(source_query, source_fields, target, target_field, target_query, multikey)
+    return await get_pipeline_results(source, stages, target, qparams)
+
+
+async def get_semi_join_results(collection: AsyncIOMotorCollection, query: dict, local_field: str,
+        other: AsyncIOMotorCollection, foreign_field: str, other_query: dict, qparams, multikey: bool = False):
+    """Count and page of the documents matching the query joined to a document matching ``other_query``"""
+    include = qparams.query.include_resultset_responses
+    if include in ('ALL', 'NONE'):
+        # the query already matches all (or none) of the documents, whatever the other side
+        return await get_results(collection, query, qparams)
+
+    datasets = qparams.target_datasets
+    if datasets is not None and not datasets:
+        return 0, {}
+    other_query = scope_query(other, other_query, datasets) if datasets else other_query
+
+    if include == 'MISS':
+        stages = anti_join_pipeline(collection, query, local_field, other, [foreign_field], other_query, datasets)
+        return await get_pipeline_results(collection, stages, collection, qparams)
+
+    scoped_query = scope_query(collection, query, datasets) if datasets else query
+    count, other_count = await asyncio.gather(
+        get_capped_count(collection, scoped_query, conf.count_cap),
+        get_capped_count(other, other_query, conf.count_cap),
+    )
+    LOG.debug(f"Semi-join of {collection.name} ({count}) and {other.name} ({other_count})")
+    if other_count < count:
+        stages = join_pipeline(other_query, [foreign_field], collection, local_field, scoped_query, multikey)
+        return await get_pipeline_results(other, stages, collection, qparams)
+    stages = semi_join_pipeline(scoped_query, local_field, other, foreign_field, other_query)
+    return await get_pipeline_results(collection, stages, collection, qparams)
+
+
+def get_index_results(counts: Dict[str, int], granularity: Granularity) -> Tuple[int, Dict[str, Tuple[int, list]]]:
+    """Results of the boolean and count answers of an in-memory index, from its { dataset_id:count }"""
+    if granularity == Granularity.BOOLEAN:
+        counts = {dataset_id: int(count > 0) for dataset_id, count in counts.items()}
+        return int(any(counts.values())), {dataset_id: (hit, []) for dataset_id, hit in counts.items()}
+    return sum(counts.values()), {dataset_id: (count, []) for dataset_id, count in counts.items()}
+
 
-def get_filtering_documents(collection: Collection, query: dict, remove_id: dict,skip: int, limit: int) -> Cursor:
+def get_filtering_documents(collection: AsyncIOMotorCollection, query: dict, remove_id: dict,skip: int, limit: int) -> AsyncIOMotorCursor:
     LOG.debug("FINAL QUERY: {}".format(query))
-    return collection.find(query,remove_id).skip(skip).limit(limit).max_time_ms(10 * 1000)
+    return collection.find(query,remove_id).skip(skip).limit(limit).max_time_ms(QUERY_MAX_TIME_MS.get())
 
 def get_cross_query(ids: dict, cross_type: str, collection_id: str):
     id_list=[]
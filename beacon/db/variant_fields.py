@@ -0,0 +1,69 @@
+"""
+Writes the fields of the variants that the genomic variation indexes are built on (see
+``beacon.db.positions``), in the variants that don't have them yet:
+
+- ``_position.bin``, for the region queries
+- ``_position.variantKey``, for the sequence queries
+- ``_position.hgvsKey``, for the genomic allele (HGVS) queries
+
+The bins and keys are computed in the DB, the HGVS ids (with more cases than an aggregation
+expression should have) here. This is run after loading variants (``make load`` does it):
+
+    python -m beacon.db.variant_fields
+
+``deploy/load_json.py`` writes them when it inserts the variants (see ``positions.variant_fields``).
+"""
+
+import asyncio
+import logging
+
+from pymongo import UpdateOne
+
+from beacon.db import client
+from beacon.db.positions import BIN, HGVS_ID, HGVS_KEY, START, VARIANT_KEY, bin_expression, canonical_hgvs_id, variant_key_expression
+
+LOG = logging.getLogger(__name__)
+
+HGVS_BATCH_SIZE = 1000
+
+
+async def write_hgvs_keys() -> int:
+    genomic_variations = client.beacon.genomicVariations
+    modified_count = 0
+    batch = []
+    async for doc in genomic_variations.find({HGVS_KEY: {"$exists": False}, HGVS_ID: {"$type": "string"}}, {HGVS_ID: 1}):
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {HGVS_KEY: canonical_hgvs_id(doc[HGVS_ID])}}))
+        if len(batch) == HGVS_BATCH_SIZE:
+            modified_count += (await genomic_variations.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        modified_count += (await genomic_variations.bulk_write(batch, ordered=False)).modified_count
+    return modified_count
+
+
+async def write_variant_fields() -> int:
+    """Writes the fields of the variants without them, returns how many were written"""
+    genomic_variations = client.beacon.genomicVariations
+    result = await genomic_variations.update_many(
+        {BIN: {"$exists": False}, START: {"$type": "number"}},
+        [{"$set": {BIN: bin_expression()}}]
+    )
+    modified_count = result.modified_count
+    result = await genomic_variations.update_many(
+        {
+            VARIANT_KEY: {"$exists": False},
+            START: {"$type": "number"},
+            "variation.referenceBases": {"$type": "string"},
+            "variation.alternateBases": {"$type": "string"},
+        },
+        [{"$set": {VARIANT_KEY: variant_key_expression()}}]
+    )
+    modified_count += result.modified_count
+    modified_count += await write_hgvs_keys()
+    LOG.debug(f"Wrote {modified_count} variant fields")
+    return modified_count
+
+
+if __name__ == "__main__":
+    modified_count = asyncio.run(write_variant_fields())
+    print(f"*** {modified_count} variant fields written ***")
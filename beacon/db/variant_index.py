@@ -0,0 +1,264 @@
+"""
+In-memory variant position index, for the boolean and count answers of the sequence and region
+queries without going to the DB.
+
+For every dataset, the variants are kept as NumPy columns (start, end and a 64-bit hash of the
+alleles), sorted by start within every (assemblyId, refseqId) partition, so a query is a couple of
+``searchsorted`` on the partition. Enable it with ``conf.variant_position_index``.
+
+The index of a dataset is tied to its data version (see ``dataset_index``). At startup the
+snapshots of ``conf.variant_position_index_dir`` (memory-mapped ``.npy`` files) of the current
+versions are loaded, and the rest of the datasets are indexed in the background. When the version
+of a dataset changes, its queries go to the DB until it's indexed again. Record queries always go
+to the DB.
+"""
+
+import hashlib
+import json
+import logging
+import shutil
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from beacon import conf
+from beacon.db import client
+from beacon.db.dataset_index import DatasetIndex
+from beacon.db.positions import canonical_refseq_id, to_position, to_positions
+from beacon.request.model import Granularity, RequestParams
+
+LOG = logging.getLogger(__name__)
+
+COLUMNS = ("start", "end", "allele")
+PROJECTION = {
+    "_id": 0,
+    "_position.assemblyId": 1,
+    "_position.refseqId": 1,
+    "_position.start": 1,
+    "_position.end": 1,
+    "variation.referenceBases": 1,
+    "variation.alternateBases": 1,
+}
+SEQUENCE_QUERY_PARAMETERS = {"referenceName", "start", "referenceBases", "alternateBases", "assemblyId", "datasets"}
+REGION_QUERY_PARAMETERS = {"referenceName", "start", "end", "assemblyId", "datasets"}
+# end of the variants without one, so they don't overlap any region (as in the DB query)
+NO_END = -1
+
+
+def alleles_normalized() -> bool:
+    """Whether the DB compares the alleles trimmed and upper-cased (the variant keys of the sequence
+    queries, see ``conf.variant_fields``) or as they are, the index hashes them the same way"""
+    return getattr(conf, 'variant_fields', False)
+
+
+def allele_hash(reference_bases, alternate_bases, normalized: bool) -> int:
+    if normalized:
+        reference_bases, alternate_bases = str(reference_bases).strip().upper(), str(alternate_bases).strip().upper()
+    alleles = f"{reference_bases}:{alternate_bases}"
+    return int.from_bytes(hashlib.blake2b(alleles.encode(), digest_size=8).digest(), "little")
+
+
+class DatasetPositions:
+    """The variants of a dataset, in columns sorted by (assemblyId, refseqId, start)"""
+
+    def __init__(self, version: Tuple, partitions: Dict[str, Dict[str, List[int]]], columns: Dict[str, np.ndarray],
+            normalized_alleles: bool):
+        self.version = version
+        # how the alleles were hashed (see ``allele_hash``)
+        self.normalized_alleles = normalized_alleles
+        # { refseqId:{ assemblyId:[first, last + 1, max length] } }
+        self.partitions = partitions
+        self.start = columns["start"]
+        self.end = columns["end"]
+        self.allele = columns["allele"]
+
+    def _partitions(self, refseq_id: str, assembly_id: Optional[str]) -> Iterable[List[int]]:
+        assemblies = self.partitions.get(refseq_id, {})
+        if assembly_id is None:
+            return assemblies.values()
+        return [assemblies[assembly_id]] if assembly_id in assemblies else []
+
+    def count_sequence(self, refseq_id: str, assembly_id: Optional[str], start: int, allele_hashes: List[int]) -> int:
+        count = 0
+        for first, last, _ in self._partitions(refseq_id, assembly_id):
+            starts = self.start[first:last]
+            lo = first + np.searchsorted(starts, start, side="left")
+            hi = first + np.searchsorted(starts, start, side="right")
+            count += int(np.count_nonzero(np.isin(self.allele[lo:hi], np.array(allele_hashes, dtype=np.uint64))))
+        return count
+
+    def count_overlapping(self, refseq_id: str, assembly_id: Optional[str], start: int, end: int) -> int:
+        count = 0
+        for first, last, max_length in self._partitions(refseq_id, assembly_id):
+            starts = self.start[first:last]
+            # no variant is longer than max_length, so the ones starting before can't overlap
+            lo = first + np.searchsorted(starts, start - max_length, side="left")
+            hi = first + np.searchsorted(starts, end, side="right")
+            count += int(np.count_nonzero(self.end[lo:hi] >= start))
+        return count
+
+    def nbytes(self) -> int:
+        return self.start.nbytes + self.end.nbytes + self.allele.nbytes
+
+
+def get_index_counter(qparams: RequestParams, normalized_alleles: bool) -> Optional[Callable[[DatasetPositions], int]]:
+    """Counts the variants of a dataset that match the query, or None if the index can't answer it.
+
+    ``normalized_alleles`` tells how the DB query compares the alleles (see ``alleles_normalized``),
+    the sequence queries that it compares differently from how the index hashed them go to the DB."""
+    if qparams.granularity not in (Granularity.BOOLEAN, Granularity.COUNT) or qparams.target_datasets is None:
+        return None
+    if qparams.query.filters or qparams.query.include_resultset_responses != 'HIT':
+        return None
+    request_parameters = qparams.query.request_parameters
+    if "referenceName" not in request_parameters or "start" not in request_parameters:
+        return None
+    try:
+        refseq_id = canonical_refseq_id(request_parameters["referenceName"])
+        assembly_id = request_parameters.get("assemblyId")
+        starts = to_positions(request_parameters["start"])
+        if request_parameters.keys() <= SEQUENCE_QUERY_PARAMETERS and "end" not in request_parameters \
+            and {"referenceBases", "alternateBases"} <= request_parameters.keys() and len(starts) == 1:
+            reference_bases, alternate_bases = request_parameters["referenceBases"], request_parameters["alternateBases"]
+            if normalized_alleles != alleles_normalized():
+                return None
+            if normalized_alleles:
+                # one variant key by alternate allele (see g_variants.sequence_query_keys)
+                allele_hashes = [
+                    allele_hash(reference_bases, alternate, normalized=True)
+                    for alternate in str(alternate_bases).split(",")
+                ]
+            elif isinstance(reference_bases, str) and isinstance(alternate_bases, str):
+                # compared as they are
+                allele_hashes = [allele_hash(reference_bases, alternate_bases, normalized=False)]
+            else:
+                return None
+            return lambda positions: positions.count_sequence(refseq_id, assembly_id, starts[0], allele_hashes)
+        if request_parameters.keys() <= REGION_QUERY_PARAMETERS and "end" in request_parameters:
+            ends = to_positions(request_parameters["end"])
+            if len(starts) == 1 and len(ends) == 1:
+                return lambda positions: positions.count_overlapping(refseq_id, assembly_id, starts[0], ends[0])
+    except ValueError:
+        pass
+    return None
+
+
+async def read_dataset_positions(dataset_id: str, version: Tuple) -> DatasetPositions:
+    """Indexes the variants of the dataset from the DB"""
+    # { (assemblyId, refseqId):[(start, end, allele), ...] }
+    variants = defaultdict(list)
+    normalized = alleles_normalized()
+    cursor = client.beacon.genomicVariations.find({"_info.datasetId": dataset_id}, PROJECTION, batch_size=10000)
+    async for variant in cursor:
+        position = variant.get("_position", {})
+        variation = variant.get("variation", {})
+        try:
+            start = int(to_position(position["start"]))
+            end = int(to_position(position["end"])) if position.get("end") is not None else NO_END
+        except (KeyError, ValueError):
+            continue
+        key = (str(position.get("assemblyId")), canonical_refseq_id(position.get("refseqId")))
+        allele = allele_hash(variation.get("referenceBases"), variation.get("alternateBases"), normalized)
+        variants[key].append((start, end, allele))
+
+    partitions: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+    columns = {"start": [], "end": [], "allele": []}
+    first = 0
+    for (assembly_id, refseq_id), rows in sorted(variants.items()):
+        start = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        end = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        allele = np.fromiter((row[2] for row in rows), dtype=np.uint64, count=len(rows))
+        order = np.argsort(start, kind="stable")
+        columns["start"].append(start[order])
+        columns["end"].append(end[order])
+        columns["allele"].append(allele[order])
+        max_length = int(np.max(end - start, initial=0))
+        partitions[refseq_id][assembly_id] = [first, first + len(rows), max_length]
+        first += len(rows)
+
+    arrays = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64 if name == "allele" else np.int64)
+        for name, parts in columns.items()
+    }
+    return DatasetPositions(version, dict(partitions), arrays, normalized)
+
+
+def snapshot_dir(directory: Path, dataset_id: str) -> Path:
+    return directory / hashlib.sha1(dataset_id.encode()).hexdigest()
+
+
+def save_snapshot(directory: Path, dataset_id: str, positions: DatasetPositions):
+    target = snapshot_dir(directory, dataset_id)
+    tmp = target.with_suffix(".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name in COLUMNS:
+        np.save(tmp / f"{name}.npy", getattr(positions, name))
+    with open(tmp / "index.json", "w") as f:
+        json.dump({
+            "datasetId": dataset_id,
+            "version": list(positions.version),
+            "partitions": positions.partitions,
+            "normalizedAlleles": positions.normalized_alleles,
+        }, f)
+    # the mapped files of the previous snapshot stay readable until they are unmapped
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+
+
+def load_snapshot(directory: Path, dataset_id: str) -> Optional[DatasetPositions]:
+    path = snapshot_dir(directory, dataset_id)
+    try:
+        with open(path / "index.json") as f:
+            index = json.load(f)
+        columns = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+    except (OSError, ValueError) as e:
+        LOG.debug(f"No snapshot of the variant positions of {dataset_id}: {e}")
+        return None
+    if index.get("normalizedAlleles") != alleles_normalized():
+        LOG.debug(f"The snapshot of the variant positions of {dataset_id} hashed the alleles differently")
+        return None
+    return DatasetPositions(tuple(index["version"]), index["partitions"], columns, index["normalizedAlleles"])
+
+
+class VariantPositionIndex(DatasetIndex[DatasetPositions]):
+
+    name = "variant positions"
+
+    def __init__(self, directory: Optional[str]):
+        super().__init__()
+        self.directory = Path(directory) if directory else None
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(conf, 'variant_position_index', False)
+
+    async def read(self, dataset_id: str, version: Tuple) -> DatasetPositions:
+        return await read_dataset_positions(dataset_id, version)
+
+    def load_snapshot(self, dataset_id: str) -> Optional[DatasetPositions]:
+        return load_snapshot(self.directory, dataset_id) if self.directory else None
+
+    def save_snapshot(self, dataset_id: str, positions: DatasetPositions):
+        if self.directory:
+            save_snapshot(self.directory, dataset_id, positions)
+
+    def nbytes(self, positions: DatasetPositions) -> int:
+        return positions.nbytes()
+
+    async def count(self, qparams: RequestParams, normalized_alleles: bool) -> Optional[Dict[str, int]]:
+        """{ dataset_id:count } of the query, or None if it has to go to the DB (see ``get_index_counter``)"""
+        if not self.enabled:
+            return None
+        counter = get_index_counter(qparams, normalized_alleles)
+        if counter is None:
+            return None
+        datasets = await self.get_all(qparams.target_datasets)
+        if datasets is None:
+            return None
+        return {dataset_id: counter(positions) for dataset_id, positions in datasets.items()}
+
+
+VARIANT_POSITION_INDEX = VariantPositionIndex(getattr(conf, 'variant_position_index_dir', None))
@@ -39,6 +39,66 @@ client.beacon.genomicVariations.create_index([
     name="genomic variation & region query"
 )
 
+# region queries: the variants overlapping a region, by bin (see beacon/db/positions.py)
+client.beacon.genomicVariations.create_index([
+        ("_info.datasetId", ASCENDING),
+        ("_position.refseqId", ASCENDING),
+        ("_position.bin", ASCENDING),
+        ("_position.start", ASCENDING)
+    ],
+    name="genomic variation overlap query"
+)
+
+# sequence queries: point lookups by variant key (see beacon/db/positions.py)
+client.beacon.genomicVariations.create_index([
+        ("_position.variantKey", HASHED),
+        ("_info.datasetId", ASCENDING)
+    ],
+    name="genomic variation key"
+)
+
+# genomic allele (HGVS) queries, by normalized id (see beacon/db/positions.py)
+client.beacon.genomicVariations.create_index([
+        ("_position.hgvsKey", ASCENDING),
+        ("_info.datasetId", ASCENDING)
+    ],
+    name="genomic variation hgvs"
+)
+
+# gene and amino acid change queries
+for field in ("molecularAttributes.geneIds", "molecularAttributes.aminoacidChanges"):
+    client.beacon.genomicVariations.create_index([
+            (field, ASCENDING),
+            ("_info.datasetId", ASCENDING)
+        ],
+        name=f"genomic variation {field.split('.')[-1]}"
+    )
+
+# variants carried by a sample (when the sample membership index can't answer, see beacon/db/sample_index.py)
+client.beacon.genomicVariations.create_index([
+        ("caseLevelData.biosampleId", ASCENDING),
+        ("_info.datasetId", ASCENDING)
+    ],
+    name="genomic variation biosampleId"
+)
+
+# keyset pagination: the order of the pages (see SORT_KEYS in beacon/db/utils.py)
+client.beacon.genomicVariations.create_index([
+        ("_info.datasetId", ASCENDING),
+        ("_position.refseqId", ASCENDING),
+        ("_position.start", ASCENDING),
+        ("_id", ASCENDING)
+    ],
+    name="genomic variation pagination"
+)
+for collection_name in ("analyses", "biosamples", "cohorts", "individuals", "runs"):
+    client.beacon[collection_name].create_index([
+            ("datasetId", ASCENDING),
+            ("_id", ASCENDING)
+        ],
+        name="pagination"
+    )
+
 client.beacon.budget.create_index([
         ("userId", ASCENDING),
         ("individualId", ASCENDING),
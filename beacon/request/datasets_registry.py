@@ -0,0 +1,123 @@
+"""
+Dataset access registry.
+
+Keeps in memory the public and registered datasets (from the YAML files next to this module),
+the ids of the datasets in the DB and their data versions, so the requests don't have to read
+them again. The YAML files are parsed again only when they change, the DB ids and versions
+are refreshed every ``conf.datasets_refresh_interval`` seconds.
+
+The data versions are in the ``dataset_versions`` collection, ``{ _id: dataset_id, version: n }``.
+The loaders increment the version of the datasets they change (or of ``"*"``, for all of them),
+which invalidates the cached results of those datasets.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import yaml
+
+from beacon import conf
+from beacon.db import client
+
+LOG = logging.getLogger(__name__)
+
+PUBLIC_DATASETS_FILE = Path(__file__).parent / "public_datasets.yml"
+REGISTERED_DATASETS_FILE = Path(__file__).parent / "registered_datasets.yml"
+
+
+class YamlDatasetList:
+    """List of dataset ids under `key` in a YAML file, parsed again only when its mtime changes"""
+
+    def __init__(self, path: Path, key: str):
+        self.path = path
+        self.key = key
+        self._mtime: Optional[int] = None
+        self._datasets: FrozenSet[str] = frozenset()
+
+    def get(self) -> FrozenSet[str]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            # keep the last list we could read
+            LOG.error(f"Can't read {self.path}: {e}")
+            return self._datasets
+
+        if mtime != self._mtime:
+            self._mtime = mtime
+            try:
+                with open(self.path, 'r') as stream:
+                    datasets = (yaml.safe_load(stream) or {}).get(self.key) or []
+            except (OSError, yaml.YAMLError) as e:
+                LOG.error(f"Can't load {self.path}, keeping the previous {self.key}: {e}")
+                return self._datasets
+            self._datasets = frozenset(str(dataset_id) for dataset_id in datasets)
+            LOG.info(f"Loaded {len(self._datasets)} {self.key} from {self.path}")
+        return self._datasets
+
+
+class DatasetRegistry:
+
+    def __init__(self, public_file: Path, registered_file: Path, refresh_interval: float):
+        self._public = YamlDatasetList(public_file, 'public_datasets')
+        self._registered = YamlDatasetList(registered_file, 'registered_datasets')
+        self.refresh_interval = refresh_interval
+        self._db_datasets: FrozenSet[str] = frozenset()
+        self._versions: Dict[str, int] = {}
+        self._db_refreshed_at: Optional[float] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def public_datasets(self) -> FrozenSet[str]:
+        return self._public.get()
+
+    @property
+    def registered_datasets(self) -> FrozenSet[str]:
+        return self._registered.get()
+
+    def _is_stale(self) -> bool:
+        return (self._db_refreshed_at is None
+            or time.monotonic() - self._db_refreshed_at > self.refresh_interval)
+
+    async def refresh(self):
+        """Reloads the dataset ids and versions from the DB"""
+        dataset_ids = await client.beacon.datasets.distinct("id")
+        versions = {
+            str(doc["_id"]): doc.get("version", 0)
+            async for doc in client.beacon.dataset_versions.find({})
+        }
+        self._db_datasets = frozenset(str(dataset_id) for dataset_id in dataset_ids)
+        self._versions = versions
+        self._db_refreshed_at = time.monotonic()
+        LOG.debug(f"Datasets in DB = {sorted(self._db_datasets)}")
+        LOG.debug(f"Dataset versions = {versions}")
+
+    async def _refresh_if_stale(self):
+        if self._is_stale():
+            async with self._refresh_lock:
+                # another request might have refreshed them while we waited
+                if self._is_stale():
+                    await self.refresh()
+
+    async def db_datasets(self) -> FrozenSet[str]:
+        await self._refresh_if_stale()
+        return self._db_datasets
+
+    async def dataset_version(self, dataset_id: str) -> Tuple[int, int]:
+        """Data version of the dataset, changes whenever a loader modifies it"""
+        await self._refresh_if_stale()
+        return self._versions.get(dataset_id, 0), self._versions.get("*", 0)
+
+    async def all_datasets(self) -> FrozenSet[str]:
+        """Public, registered and DB datasets"""
+        return self.public_datasets | self.registered_datasets | await self.db_datasets()
+
+
+DATASET_REGISTRY = DatasetRegistry(
+    PUBLIC_DATASETS_FILE,
+    REGISTERED_DATASETS_FILE,
+    refresh_interval=getattr(conf, 'datasets_refresh_interval', 60),
+)
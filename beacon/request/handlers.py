@@ -2,11 +2,9 @@ import json
 import asyncio
 import copy
 import logging
-import math
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import jwt
-import numpy as np
 from aiohttp import web
 from aiohttp.web_request import Request
 from bson import json_util
@@ -14,10 +12,13 @@ from beacon import conf
 from beacon.conf import MAX_LIMIT
 from beacon.db import client
 from pymongo import ReturnDocument
-import yaml
-import math
+from pymongo.errors import ExecutionTimeout
 from beacon.request import ontologies
-from beacon.request.model import AlphanumericFilter, Granularity, RequestParams
+from beacon.request.datasets_registry import DATASET_REGISTRY
+from beacon.request.jobs import QUERY_JOBS
+from beacon.request.result_cache import RESULT_CACHE, estimate_size
+from beacon.request.single_flight import QUERIES_IN_FLIGHT
+from beacon.request.model import AlphanumericFilter, Granularity, InvalidPageToken, RequestParams, UnsupportedQuery
 from beacon.response.build_response import (
     build_beacon_resultset_response,
     build_beacon_collection_response,
@@ -25,7 +26,8 @@ from beacon.response.build_response import (
     build_beacon_count_response,
     build_filtering_terms_response,
     build_beacon_resultset_response_by_dataset,
-    build_generic_response
+    build_generic_response,
+    build_batch_response
 )
 from beacon.utils.stream import json_stream
 from beacon.db.datasets import get_datasets, get_public_datasets
@@ -35,6 +37,106 @@ from beacon.db.reidentification_prevention import apply_rip_logic
 
 LOG = logging.getLogger(__name__)
 
+# caps how many dataset queries run at the same time (for all requests)
+QUERY_SEMAPHORE = asyncio.Semaphore(conf.query_concurrency)
+
+
+async def run_query(db_fn, entry_id, qparams: RequestParams, datasets: List[str], granularity: Optional[Granularity] = None):
+    """Runs the query on the datasets, reusing the cached results and joining the identical queries in flight"""
+
+    cached_results = {}
+    query_key = RESULT_CACHE.query_key(db_fn, entry_id, qparams, granularity)
+    versions = { dataset_id: await DATASET_REGISTRY.dataset_version(dataset_id) for dataset_id in datasets }
+    # a boolean probe that stops at the first hit of any dataset (see conf.boolean_by_dataset) only
+    # tells if the datasets have a hit together: its results by dataset are never reused
+    reuse_results = granularity != Granularity.BOOLEAN or conf.boolean_by_dataset
+
+    if RESULT_CACHE.enabled and reuse_results:
+        for dataset_id in datasets:
+            cached = RESULT_CACHE.get(query_key, dataset_id, versions[dataset_id])
+            if cached is not None:
+                cached_results[dataset_id] = cached
+
+    async def execute(dataset_ids):
+        async with QUERY_SEMAPHORE:
+            entity_schema, _, results = await db_fn(entry_id, qparams.for_datasets(dataset_ids, granularity))
+
+        executed = {}
+        for dataset_id, (count, records) in results.items():
+            # only the page of records is fetched, so it's small enough to keep
+            if RESULT_CACHE.enabled and reuse_results:
+                RESULT_CACHE.set(query_key, dataset_id, versions[dataset_id],
+                    (entity_schema, (count, records)), size=estimate_size(records))
+            executed[dataset_id] = (entity_schema, (count, records))
+        return executed
+
+    missing_datasets = [dataset_id for dataset_id in datasets if dataset_id not in cached_results]
+    executed_results = {}
+    if missing_datasets and conf.coalesce_queries and reuse_results:
+        # the data version is part of the key, so no request joins a query on outdated data
+        keys = { (query_key, dataset_id, versions[dataset_id]):dataset_id for dataset_id in missing_datasets }
+        by_dataset = { dataset_id:key for key, dataset_id in keys.items() }
+
+        async def execute_keys(own_keys):
+            executed = await execute([keys[key] for key in own_keys])
+            return { by_dataset[dataset_id]:result for dataset_id, result in executed.items() }
+
+        results = await QUERIES_IN_FLIGHT.run(keys, execute_keys)
+        executed_results = { keys[key]:result for key, result in results.items() }
+    elif missing_datasets or not cached_results:
+        executed_results = await execute(missing_datasets)
+
+    results = { **cached_results, **executed_results }
+    entity_schema = next(iter(results.values()))[0] if results else None
+    if entity_schema is None:
+        # no datasets to query, the db function still gives the schema
+        async with QUERY_SEMAPHORE:
+            entity_schema, _, _ = await db_fn(entry_id, qparams.for_datasets([], granularity))
+
+    return entity_schema, { dataset_id:results[dataset_id][1] for dataset_id in datasets }
+
+
+async def query_datasets(db_fn, entry_id, qparams: RequestParams, datasets: List[str], granularity: Granularity,
+    user_id, is_authenticated: bool, accessible_datasets: List[str], use_rip: bool):
+    """Runs the query on the datasets, followed by the RIP step of each dataset (if needed)"""
+
+    LOG.debug(f"=========================")
+    LOG.debug(f"datasets = {datasets}")
+    LOG.debug(f"=========================")
+
+    try:
+        # make the query
+        entity_schema, results = await run_query(db_fn, entry_id, qparams, datasets, granularity)
+    except Exception as e:
+        LOG.error(f"Error querying datasets {datasets}: {e}")
+        raise
+
+    if use_rip:
+        results = await apply_rip(results, qparams, user_id, is_authenticated, accessible_datasets)
+
+    return entity_schema, results
+
+
+async def apply_rip(results: Dict[str, Tuple[int, List[dict]]], qparams: RequestParams, user_id,
+    is_authenticated: bool, accessible_datasets: List[str]) -> Dict[str, Tuple[int, List[dict]]]:
+    """Applies the RIP algorithm to the results of the non-accessible datasets (variants only):
+    anonymous users get zero access (not even boolean) to non-accessible datasets,
+    authenticated users get RIP algorithm access (boolean, but limited) to non-accessible datasets"""
+    for dataset_id, (count, records) in results.items():
+        if dataset_id in accessible_datasets:
+            # RIP doesn't change the results of the accessible datasets
+            continue
+        # updates count and records with the RIP algorithm values if dataset is not accessible
+        records = await apply_rip_logic(
+            user_id=user_id,
+            qparams=qparams,
+            records=records,
+            is_authenticated=is_authenticated,
+            dataset_is_accessible=(dataset_id in accessible_datasets),
+            dataset_id=dataset_id
+        )
+        results[dataset_id] = (len(records), records)
+    return results
 
 
 def collection_handler(db_fn, request=None):
@@ -56,9 +158,9 @@ def collection_handler(db_fn, request=None):
         # add qparam to filter datasets by permissions
         
         # Get response
-        entity_schema, count, records = db_fn(entry_id, qparams)
+        entity_schema, count, records = await db_fn(entry_id, qparams)
         response_converted = (
-            [r for r in records] if records else []
+            list(records) if records else []
         )
         
         # restore qparams
@@ -72,6 +174,85 @@ def collection_handler(db_fn, request=None):
     return wrapper
 
 
+def get_access_token(request: Request) -> Optional[str]:
+    """The access token of the request, from its header or else from its cookies"""
+    access_token_header = request.headers.get('Authorization')
+    access_token_cookies = request.cookies.get("Authorization")
+    LOG.debug(f"Access token header = {access_token_header}")
+    LOG.debug(f"Access token cookies = {access_token_cookies}")
+    return access_token_header or access_token_cookies
+
+
+def get_dataset_batches(target_datasets: List[str], accessible_datasets: List[str], is_authenticated: bool,
+    response_granularity: Granularity, use_rip: bool) -> List[Tuple[List[str], Granularity]]:
+    """Splits the datasets in the batches queried together, with the granularity of the results each one needs"""
+    rip_datasets = [
+        dataset_id for dataset_id in target_datasets
+        if use_rip and is_authenticated and dataset_id not in accessible_datasets
+    ]
+    other_datasets = [dataset_id for dataset_id in target_datasets if dataset_id not in rip_datasets]
+    if use_rip and response_granularity == Granularity.BOOLEAN and not conf.boolean_by_dataset:
+        # a boolean probe stops at the first hit of any of its datasets (see conf.boolean_by_dataset),
+        # and RIP zeroes the hits of the non-accessible ones, so these are probed on their own and
+        # their hits can't hide the ones of the accessible datasets
+        granularity_datasets = [
+            ([dataset_id for dataset_id in other_datasets if dataset_id in accessible_datasets], response_granularity),
+            ([dataset_id for dataset_id in other_datasets if dataset_id not in accessible_datasets], response_granularity),
+        ]
+    else:
+        granularity_datasets = [(other_datasets, response_granularity)]
+    granularity_datasets.append((rip_datasets, Granularity.RECORD))
+
+    # all datasets in one roundtrip, or one query per dataset
+    if conf.group_dataset_queries:
+        dataset_batches = [(datasets, granularity) for datasets, granularity in granularity_datasets if datasets]
+    else:
+        dataset_batches = [
+            ([dataset_id], granularity)
+            for datasets, granularity in granularity_datasets
+            for dataset_id in datasets
+        ]
+    # without datasets, the query still gives the schema
+    return dataset_batches or [([], response_granularity)]
+
+
+async def query_dataset_batches(db_fn, entry_id, qparams: RequestParams, dataset_batches: List[Tuple[List[str], Granularity]],
+    target_datasets: List[str], user_id, is_authenticated: bool, accessible_datasets: List[str], use_rip: bool):
+    """Queries the batches of datasets concurrently, returns the results in the order of ``target_datasets``"""
+    tasks_dataset_queries = [
+        asyncio.create_task(query_datasets(
+            db_fn,
+            entry_id,
+            qparams,
+            datasets,
+            granularity,
+            user_id=user_id,
+            is_authenticated=is_authenticated,
+            accessible_datasets=accessible_datasets,
+            use_rip=use_rip,
+        ))
+        for datasets, granularity in dataset_batches
+    ]
+    try:
+        batch_results = await asyncio.gather(*tasks_dataset_queries)
+    except Exception:
+        # don't wait for the queries of the other batches
+        for task in tasks_dataset_queries:
+            task.cancel()
+        raise
+
+    # { dataset_id:(count, records) }
+    datasets_query_results:Dict[str, Tuple[int,List[dict]]] = {}
+    entity_schema = None
+    for entity_schema, results in batch_results:
+        datasets_query_results.update(results)
+    # in the order of the request
+    return entity_schema, {
+        dataset_id:datasets_query_results[dataset_id]
+        for dataset_id in target_datasets if dataset_id in datasets_query_results
+    }
+
+
 # handler with authentication & REMS
 # mostly from BioData.pt
 def generic_handler(db_fn, request=None):
@@ -91,27 +272,14 @@ def generic_handler(db_fn, request=None):
         requested_limit = qparams.query.pagination.limit
         # cap max limit if it's higher than max
         if requested_limit > MAX_LIMIT or requested_limit <= 0:
-            qparams.query.pagination = MAX_LIMIT
+            qparams.query.pagination.limit = MAX_LIMIT
             LOG.debug(f"Limit set to {MAX_LIMIT}. User requested {requested_limit}")
 
         LOG.debug(f"Query Params = {qparams}")
 
         LOG.debug(f"Headers = {request.headers}")
 
-        access_token_header = request.headers.get('Authorization')
-        access_token_cookies = request.cookies.get("Authorization")
-        LOG.debug(f"Access token header = {access_token_header}")
-        LOG.debug(f"Access token cookies = {access_token_cookies}")
-
-        is_registered = False
-        is_authenticated = False
-
-        # set access_token as the one we receive in the header
-        # if not in header, get the one from cookies
-        if access_token_header:
-            access_token = access_token_header
-        else:
-            access_token = access_token_cookies
+        access_token = get_access_token(request)
 
         # get specified datasets
         requested_datasets = qparams.query.request_parameters.get("datasets", None)
@@ -120,21 +288,13 @@ def generic_handler(db_fn, request=None):
         # Start async task to request datasets from permissions server
         task_permissions = asyncio.create_task(get_permission_info(access_token, requested_datasets))
 
-        # if no datasets were specified, use all in DB
+        # if no datasets were specified, use all of them
         if requested_datasets is None:
-            # get list of all datasets in DB
-            _, _, all_dataset_docs = get_datasets(None, RequestParams())
-            all_dataset_ids = [doc["id"] for doc in all_dataset_docs]
-            target_datasets = all_dataset_ids
+            target_datasets = sorted(await DATASET_REGISTRY.all_datasets())
         # else, query only the ones specified
         else:
             target_datasets = requested_datasets
 
-        # TODO query all datasets in parallel
-        tasks_dataset_queries = []
-        # { dataset_id:(count, records) }
-        datasets_query_results:Dict[str, Tuple[int,List[dict]]] = {}
-
         db_fn_submodule = str(db_fn.__module__).split(".")[-1]
         LOG.debug(f"db_fn submodule = {db_fn_submodule}")
 
@@ -145,70 +305,50 @@ def generic_handler(db_fn, request=None):
         LOG.debug(f"user_id: {user_id}")
         LOG.debug(f"is_authenticated: {is_authenticated}")
         LOG.debug(f"is_registered: {is_registered}")
-        
-        # TODO: do this asynchronously
-        for dataset_id in target_datasets:
-            qparams_dataset = copy.deepcopy(qparams)
-            LOG.debug(f"=========================")
-            LOG.debug(f"dataset_id = {dataset_id}")
-            LOG.debug(f"=========================")
-            # change field for genomicVariations
-            if db_fn_submodule == "g_variants":
-                filter_dataset_id = {
-                    "id": "_info.datasetId",
-                    "value": dataset_id
-                }
-            else:
-                filter_dataset_id = {
-                    "id": "datasetId",
-                    "value": dataset_id
-                }
 
-            qparams_dataset.query.filters.append(filter_dataset_id)
-            LOG.debug(f"Dataset Qparams = {qparams_dataset}")
-            try:
-                # make the query
-                entity_schema, count, records = db_fn(entry_id, qparams_dataset)
-            except Exception as e:
-                LOG.error(f"Error querying dataset {dataset_id}: {e}")
+        # get the max authorized granularity, the queries only fetch what the response shows
+        requested_granularity = qparams.query.requested_granularity
+        max_granularity = Granularity(conf.max_beacon_granularity)
+        response_granularity = Granularity.get_lower(requested_granularity, max_granularity)
+
+        use_rip = conf.USE_RIP_ALG and db_fn_submodule == "g_variants"
+        dataset_batches = get_dataset_batches(target_datasets, accessible_datasets, is_authenticated,
+            response_granularity, use_rip)
+
+        try:
+            entity_schema, datasets_query_results = await query_dataset_batches(
+                db_fn,
+                entry_id,
+                qparams,
+                dataset_batches,
+                target_datasets,
+                user_id=user_id,
+                is_authenticated=is_authenticated,
+                accessible_datasets=accessible_datasets,
+                use_rip=use_rip,
+            )
+        except (InvalidPageToken, UnsupportedQuery) as e:
+            LOG.error(f"Invalid query: {e}")
+            return web.json_response({"error": "Invalid arguments"}, status=400)
+        except ExecutionTimeout:
+            if db_fn_submodule == "g_variants" and entry_id is None:
+                # too long for a request, but not for a job
                 return web.json_response(
-                    {"error": f"There was an error running your query, please try again later."},
-                    status=500
+                    {"error": "Your query took too long, please run it as a job (POST /api/g_variants/jobs)."},
+                    status=504
                 )
-                
-            # apply RIP algorithm, if needed (variants only):
-            # anonymous users get zero access (not even boolean) to non-accessible datasets
-            # authenticated users get RIP algorithm access (boolean, but limited) to non-accessible datasets
-            if conf.USE_RIP_ALG and db_fn_submodule == "g_variants":
-                
-                ######################## RIP Algorithm ########################
-                    
-                # convert from mongoDB Cursor because we'll need to iterate over it many times
-                records = list(records)
-                
-                #LOG.debug(f"RECORDS BEFORE RIP: {records}")
-                # updates count and records with the RIP algorithm values if dataset is not accessible
-                records = apply_rip_logic(
-                    user_id=user_id,
-                    qparams=qparams, 
-                    records=records, 
-                    is_authenticated=is_authenticated,
-                    dataset_is_accessible=(dataset_id in accessible_datasets),
-                    dataset_id=dataset_id
-                )
-                count = len(records)
-                #LOG.debug(f"RECORDS AFTER RIP: {records}")
-            
-            datasets_query_results[dataset_id] = (count, records)
+            return web.json_response(
+                {"error": f"There was an error running your query, please try again later."},
+                status=500
+            )
+        except Exception:
+            return web.json_response(
+                {"error": f"There was an error running your query, please try again later."},
+                status=500
+            )
 
         #LOG.debug(f"schema = {entity_schema}")
 
-        # get the max authorized granularity
-        requested_granularity = qparams.query.requested_granularity
-        max_granularity = Granularity(conf.max_beacon_granularity)
-        response_granularity = Granularity.get_lower(requested_granularity, max_granularity)
-        
-        
         # build response
         response = build_generic_response(
             results_by_dataset=datasets_query_results,
@@ -225,6 +365,199 @@ def generic_handler(db_fn, request=None):
     return wrapper
     
     
+def batch_handler(db_fn, batch_fn, request=None):
+    """Handler of a batch of queries (POST), the response has the response of each query keyed by its index"""
+
+    async def wrapper(request: Request):
+        LOG.info("-- Batch handler --")
+
+        # Get params
+        try:
+            json_body = await request.json() if request.has_body and request.can_read_body else {}
+            queries = json_body.pop("queries", None)
+            if not isinstance(queries, list) or not queries or not all(isinstance(query, dict) for query in queries):
+                raise ValueError("'queries' must be a non-empty list of queries")
+            if len(queries) > conf.batch_max_queries:
+                raise ValueError(f"A batch has at most {conf.batch_max_queries} queries")
+            qparams: RequestParams = RequestParams(**json_body).from_request(request)
+            requested_limit = qparams.query.pagination.limit
+            # cap max limit if it's higher than max
+            if requested_limit > MAX_LIMIT or requested_limit <= 0:
+                qparams.query.pagination.limit = MAX_LIMIT
+            batch: List[RequestParams] = []
+            for query in queries:
+                if "datasets" in query.get("requestParameters", {}):
+                    raise ValueError("'datasets' is a request parameter of the batch, not of its queries")
+                query_qparams = copy.deepcopy(qparams)
+                query_qparams.query.request_parameters = {
+                    **qparams.query.request_parameters, **query.get("requestParameters", {})
+                }
+                query_qparams.query.filters = qparams.query.filters + query.get("filters", [])
+                batch.append(query_qparams.from_request(request))
+        except Exception as e:
+            LOG.error(f"Error parsing JSON body: {e}")
+            return web.json_response({"error": "Invalid arguments"}, status=400)
+
+        # permissions, once for the whole batch
+        requested_datasets = qparams.query.request_parameters.get("datasets", None)
+        task_permissions = asyncio.create_task(get_permission_info(get_access_token(request), requested_datasets))
+        if requested_datasets is None:
+            target_datasets = sorted(await DATASET_REGISTRY.all_datasets())
+        else:
+            target_datasets = requested_datasets
+        accessible_datasets, is_authenticated, is_registered, user_id = await task_permissions
+
+        requested_granularity = qparams.query.requested_granularity
+        max_granularity = Granularity(conf.max_beacon_granularity)
+        response_granularity = Granularity.get_lower(requested_granularity, max_granularity)
+
+        use_rip = conf.USE_RIP_ALG and str(db_fn.__module__).split(".")[-1] == "g_variants"
+        dataset_batches = get_dataset_batches(target_datasets, accessible_datasets, is_authenticated,
+            response_granularity, use_rip)
+
+        async def query(query_qparams: RequestParams, results):
+            if results is None:
+                return await query_dataset_batches(
+                    db_fn,
+                    None,
+                    query_qparams,
+                    dataset_batches,
+                    target_datasets,
+                    user_id=user_id,
+                    is_authenticated=is_authenticated,
+                    accessible_datasets=accessible_datasets,
+                    use_rip=use_rip,
+                )
+            if use_rip:
+                results = await apply_rip(results, query_qparams, user_id, is_authenticated, accessible_datasets)
+            return entity_schema, results
+
+        try:
+            async with QUERY_SEMAPHORE:
+                entity_schema, batch_results = await batch_fn(
+                    [query_qparams.for_datasets(target_datasets, Granularity.RECORD) for query_qparams in batch],
+                    target_datasets
+                )
+            query_results = await asyncio.gather(*[
+                query(query_qparams, results) for query_qparams, results in zip(batch, batch_results)
+            ])
+        except (InvalidPageToken, UnsupportedQuery) as e:
+            LOG.error(f"Invalid query: {e}")
+            return web.json_response({"error": "Invalid arguments"}, status=400)
+        except Exception as e:
+            LOG.error(f"Error running the batch: {e}")
+            return web.json_response(
+                {"error": f"There was an error running your query, please try again later."},
+                status=500
+            )
+
+        responses = [
+            build_generic_response(
+                results_by_dataset=results,
+                accessible_datasets=accessible_datasets,
+                granularity=response_granularity,
+                qparams=query_qparams,
+                entity_schema=query_schema,
+                is_registered=is_registered,
+                is_authenticated=is_authenticated,
+            )
+            for query_qparams, (query_schema, results) in zip(batch, query_results)
+        ]
+        response = build_batch_response(responses, qparams, entity_schema, response_granularity)
+        return await json_stream(request, response)
+
+    return wrapper
+
+
+def job_handler(db_fn, request=None):
+    """Handler that runs the query as a job in the background, responds with the status of the job (202)"""
+
+    async def wrapper(request: Request):
+        LOG.info("-- Job handler --")
+
+        # Get params
+        try:
+            json_body = await request.json() if request.method == "POST" and request.has_body and request.can_read_body else {}
+            qparams: RequestParams = RequestParams(**json_body).from_request(request)
+        except Exception as e:
+            LOG.error(f"Error parsing JSON body: {e}")
+            return web.json_response({"error": "Invalid arguments"}, status=400)
+
+        requested_datasets = qparams.query.request_parameters.get("datasets", None)
+        task_permissions = asyncio.create_task(get_permission_info(get_access_token(request), requested_datasets))
+        if requested_datasets is None:
+            target_datasets = sorted(await DATASET_REGISTRY.all_datasets())
+        else:
+            target_datasets = requested_datasets
+        accessible_datasets, is_authenticated, is_registered, user_id = await task_permissions
+
+        requested_granularity = qparams.query.requested_granularity
+        max_granularity = Granularity(conf.max_beacon_granularity)
+        response_granularity = Granularity.get_lower(requested_granularity, max_granularity)
+
+        use_rip = conf.USE_RIP_ALG and str(db_fn.__module__).split(".")[-1] == "g_variants"
+        if use_rip:
+            target_datasets = [dataset_id for dataset_id in target_datasets if dataset_id in accessible_datasets]
+        record_datasets = [dataset_id for dataset_id in target_datasets if dataset_id in accessible_datasets]
+
+        job = QUERY_JOBS.submit(db_fn, qparams, target_datasets, record_datasets, response_granularity, user_id)
+        if job is None:
+            return web.json_response(
+                {"error": "Too many query jobs running, please try again later."},
+                status=503
+            )
+        LOG.info(f"Submitted query job {job.id}")
+        return web.json_response(job.summary(), status=202)
+
+    return wrapper
+
+
+async def get_user_job(request: Request):
+    """The job of the request, if it's one of the user's"""
+    _, _, _, user_id = await get_permission_info(get_access_token(request), None)
+    return QUERY_JOBS.get(request.match_info['id'], user_id)
+
+
+async def job_status_handler(request: Request):
+    LOG.info("-- Job status handler --")
+    job = await get_user_job(request)
+    if job is None:
+        return web.json_response({"error": "Job not found"}, status=404)
+    return web.json_response(job.summary())
+
+
+async def job_results_handler(request: Request):
+    """Spooled records of the job, paged with ``skip`` and ``limit``"""
+    LOG.info("-- Job results handler --")
+    try:
+        skip = int(request.query.get("skip", 0))
+        limit = int(request.query.get("limit", conf.query_job_page_size))
+        if skip < 0:
+            raise ValueError("skip must not be negative")
+    except ValueError as e:
+        LOG.error(f"Error parsing the pagination: {e}")
+        return web.json_response({"error": "Invalid arguments"}, status=400)
+    # cap max limit if it's higher than max
+    if limit > conf.query_job_page_size or limit <= 0:
+        limit = conf.query_job_page_size
+
+    job = await get_user_job(request)
+    if job is None:
+        return web.json_response({"error": "Job not found"}, status=404)
+    try:
+        results = await QUERY_JOBS.read(job, skip, limit)
+    except OSError as e:
+        LOG.error(f"Error reading the results of query job {job.id}: {e}")
+        return web.json_response({"error": "The results of the job are not available"}, status=410)
+
+    response = {
+        **job.summary(),
+        "pagination": {"skip": skip, "limit": limit},
+        "results": results,
+    }
+    return await json_stream(request, response)
+
+
 # handler with authentication
 # mostly from CRG
 def generic_handler_crg(db_fn, request=None):
@@ -253,9 +586,7 @@ def generic_handler_crg(db_fn, request=None):
             access_token = access_token_cookies
         
         if access_token is not None:
-            with open("/beacon/beacon/request/public_datasets.yml", 'r') as stream:
-                public_datasets = yaml.safe_load(stream)
-            list_of_public_datasets= public_datasets['public_datasets']
+            list_of_public_datasets = list(DATASET_REGISTRY.public_datasets)
             try:
                 specific_datasets = qparams.query.request_parameters['datasets']
             except Exception:
@@ -287,8 +618,8 @@ def generic_handler_crg(db_fn, request=None):
                         specific_datasets_unauthorized.append(elemento)
                 qparams.query.request_parameters = {}
                 qparams.query.request_parameters['datasets'] = '*******'
-                _, _, datasets = get_datasets(None, qparams)
-                beacon_datasets = [ r for r in datasets ]
+                _, _, datasets = await get_datasets(None, qparams)
+                beacon_datasets = list(datasets)
                 all_datasets = [r['id'] for r in beacon_datasets]
                 
                 response_datasets = [ r['id'] for r in beacon_datasets if r['id'] in search_and_authorized_datasets]
@@ -325,8 +656,8 @@ def generic_handler_crg(db_fn, request=None):
             else:
                 qparams.query.request_parameters = {}
                 qparams.query.request_parameters['datasets'] = '*******'
-                _, _, datasets = get_datasets(None, qparams)
-                beacon_datasets = [ r for r in datasets ]
+                _, _, datasets = await get_datasets(None, qparams)
+                beacon_datasets = list(datasets)
                 specific_datasets = [ r['id'] for r in beacon_datasets if r['id'] not in authorized_datasets]
                 response_datasets = [ r['id'] for r in beacon_datasets if r['id'] in authorized_datasets]
                 LOG.debug(specific_datasets)
@@ -359,11 +690,9 @@ def generic_handler_crg(db_fn, request=None):
             list_of_dataset_dicts=[]
             qparams.query.request_parameters = {}
             qparams.query.request_parameters['datasets'] = '*******'
-            _, _, datasets = get_datasets(None, qparams)
-            beacon_datasets = [ r for r in datasets ]
-            with open("/beacon/beacon/request/public_datasets.yml", 'r') as stream:
-                public_datasets = yaml.safe_load(stream)
-            list_of_public_datasets= public_datasets['public_datasets']
+            _, _, datasets = await get_datasets(None, qparams)
+            beacon_datasets = list(datasets)
+            list_of_public_datasets = list(DATASET_REGISTRY.public_datasets)
             LOG.debug(f"Pub datasets = {list_of_public_datasets}")
             for data_r in list_of_public_datasets:
                 dict_dataset = {}
@@ -378,11 +707,10 @@ def generic_handler_crg(db_fn, request=None):
         
 
         entry_id = request.match_info.get('id', None)
-        entity_schema, count, records = db_fn(entry_id, qparams)
+        entity_schema, count, records = await db_fn(entry_id, qparams)
         LOG.debug(f"schema = {entity_schema}")
         
-        recordsList = list(records[0:100])
-        recordsDebug = recordsList[0:10]
+        recordsDebug = records[0:10]
         LOG.debug(f"records = {recordsDebug}")
         
         # if it had at least one record
@@ -428,7 +756,7 @@ def filtering_terms_handler(db_fn, request=None):
         #_, _, records = db_fn(entry_id, qparams)
         #resources = ontologies.get_resources()
         #response = build_filtering_terms_response(records, resources, qparams)
-        entity_schema, count, records = db_fn(entry_id, qparams)
+        entity_schema, count, records = await db_fn(entry_id, qparams)
         response = build_filtering_terms_response(records, count, qparams, lambda x, y: x, entity_schema)
         return await json_stream(request, response)
 
@@ -477,8 +805,8 @@ def filtering_terms_handler_auth(db_fn, request=None):
                         specific_datasets_unauthorized.append(elemento)
                 qparams.query.request_parameters = {}
                 qparams.query.request_parameters['datasets'] = '*******'
-                _, _, datasets = get_datasets(None, qparams)
-                beacon_datasets = [ r for r in datasets ]
+                _, _, datasets = await get_datasets(None, qparams)
+                beacon_datasets = list(datasets)
                 all_datasets = [r['id'] for r in beacon_datasets]
                 
                 response_datasets = [ r['id'] for r in beacon_datasets if r['id'] in search_and_authorized_datasets]
@@ -514,8 +842,8 @@ def filtering_terms_handler_auth(db_fn, request=None):
             else:
                 qparams.query.request_parameters = {}
                 qparams.query.request_parameters['datasets'] = '*******'
-                _, _, datasets = get_datasets(None, qparams)
-                beacon_datasets = [ r for r in datasets ]
+                _, _, datasets = await get_datasets(None, qparams)
+                beacon_datasets = list(datasets)
                 specific_datasets = [ r['id'] for r in beacon_datasets if r['id'] not in authorized_datasets]
                 response_datasets = [ r['id'] for r in beacon_datasets if r['id'] in authorized_datasets]
                 LOG.debug(specific_datasets)
@@ -547,7 +875,7 @@ def filtering_terms_handler_auth(db_fn, request=None):
         
 
         entry_id = request.match_info.get('id', None)
-        entity_schema, count, records = db_fn(entry_id, qparams)
+        entity_schema, count, records = await db_fn(entry_id, qparams)
 
         response_converted = records
         
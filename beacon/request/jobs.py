@@ -0,0 +1,259 @@
+"""
+Asynchronous query jobs.
+
+The queries too long for a request (e.g. big region queries, that hit the time limit of the
+interactive queries) can run as a job: ``POST /api/g_variants/jobs`` returns its id right away, and
+the query runs in the background, at most ``conf.query_job_workers`` at the same time and with a
+time limit of ``conf.query_job_max_time`` seconds.
+
+The records are spooled, page by page (keyset pagination), to a file of ``conf.query_jobs_dir``
+with one JSON line per record (NDJSON), so they're read back by pages without keeping them in
+memory: ``GET /api/jobs/{id}`` tells the status and counts of the job, ``GET /api/jobs/{id}/results``
+the records (also while it runs).
+
+A job spools at most ``conf.query_job_max_records`` records and ``conf.query_job_max_bytes`` bytes,
+then it's done and marked as truncated.
+
+The jobs are kept in memory, and removed with their files ``conf.query_job_ttl`` seconds after
+they finish (checked every ``conf.query_job_purge_interval`` seconds), or before if there are more
+than ``conf.query_job_max_retained`` finished jobs (the oldest first).
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import time
+import uuid
+from array import array
+from typing import Dict, List, Optional
+
+from beacon import conf
+from beacon.db.utils import QUERY_MAX_TIME_MS
+from beacon.request.model import Granularity, Pagination, RequestParams, UnsupportedQuery, encode_page_token
+from beacon.utils.json import json_iterencode, jsonb
+
+LOG = logging.getLogger(__name__)
+
+
+class QueryJob:
+
+    def __init__(self, job_id: str, user_id, qparams: RequestParams, granularity: Granularity, path: str):
+        self.id = job_id
+        # only this user gets the status and results of the job
+        self.user_id = user_id
+        self.qparams = qparams
+        self.granularity = granularity
+        self.path = path
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # { dataset_id:count }
+        self.counts: Dict[str, int] = {}
+        # byte offset of every line of the spool file
+        self.offsets = array('q')
+        self.size = 0
+        # the spooling stopped at the record or byte limit
+        self.truncated = False
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def summary(self) -> dict:
+        summary = {
+            "jobId": self.id,
+            "status": self.status,
+            "granularity": self.granularity.value,
+            "submittedAt": self.submitted_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "exists": any(count > 0 for count in self.counts.values()),
+        }
+        if self.granularity != Granularity.BOOLEAN:
+            summary["numTotalResults"] = sum(self.counts.values())
+            summary["resultsByDataset"] = self.counts
+        if self.granularity == Granularity.RECORD:
+            summary["numSpooledResults"] = len(self.offsets)
+            summary["truncated"] = self.truncated
+        if self.error is not None:
+            summary["error"] = self.error
+        return summary
+
+
+def write_lines(path: str, lines: List[bytes]):
+    with open(path, "ab") as f:
+        f.writelines(lines)
+
+
+def read_lines(path: str, start: int, end: int) -> List[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).splitlines()
+
+
+async def encode_line(obj) -> bytes:
+    return ("".join([chunk async for chunk in json_iterencode(obj)]) + "\n").encode()
+
+
+class QueryJobs:
+
+    def __init__(self):
+        self._jobs: Dict[str, QueryJob] = {}
+        self._workers = asyncio.Semaphore(conf.query_job_workers)
+        self._purge_task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.failed = 0
+
+    def submit(self, db_fn, qparams: RequestParams, datasets: List[str], record_datasets: List[str],
+            granularity: Granularity, user_id) -> Optional[QueryJob]:
+        """Starts a job with the query, that counts the results of the datasets and spools the records of
+        ``record_datasets`` (if the granularity is record). Returns None if there are too many jobs."""
+        self._purge()
+        if sum(not job.finished for job in self._jobs.values()) >= conf.query_job_max_jobs:
+            return None
+        os.makedirs(conf.query_jobs_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        job = QueryJob(job_id, user_id, qparams, granularity, os.path.join(conf.query_jobs_dir, f"{job_id}.ndjson"))
+        job.task = asyncio.create_task(self._run(job, db_fn, datasets, record_datasets))
+        self._jobs[job_id] = job
+        self.submitted += 1
+        return job
+
+    def start(self):
+        """Starts removing the expired jobs periodically (on startup)"""
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_periodically())
+
+    def get(self, job_id: str, user_id) -> Optional[QueryJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def _run(self, job: QueryJob, db_fn, datasets: List[str], record_datasets: List[str]):
+        async with self._workers:
+            job.status = "running"
+            job.started_at = time.time()
+            # the task runs in a copy of the context, so only the queries of the job get the longer time limit
+            QUERY_MAX_TIME_MS.set(conf.query_job_max_time * 1000)
+            try:
+                if job.granularity == Granularity.RECORD:
+                    count_datasets = [dataset_id for dataset_id in datasets if dataset_id not in record_datasets]
+                else:
+                    count_datasets, record_datasets = datasets, []
+                if count_datasets:
+                    _, _, results = await db_fn(None, job.qparams.for_datasets(count_datasets, Granularity.COUNT))
+                    job.counts.update({ dataset_id:int(count) for dataset_id, (count, _) in results.items() })
+                if record_datasets:
+                    await self._spool(job, db_fn, record_datasets)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except UnsupportedQuery as e:
+                job.status = "failed"
+                job.error = str(e)
+            except Exception as e:
+                LOG.error(f"Query job {job.id} failed: {e}")
+                self.failed += 1
+                job.status = "failed"
+                job.error = "There was an error running your query"
+            finally:
+                job.finished_at = time.time()
+
+    async def _spool(self, job: QueryJob, db_fn, datasets: List[str]):
+        """Writes the records of the datasets to the file of the job, a page at a time"""
+        loop = asyncio.get_running_loop()
+        qparams = copy.deepcopy(job.qparams)
+        qparams.query.pagination = Pagination(skip=0, limit=conf.query_job_page_size)
+        job.counts.update({ dataset_id:0 for dataset_id in datasets })
+        while datasets:
+            _, _, results = await db_fn(None, qparams.for_datasets(datasets, Granularity.RECORD))
+            lines = []
+            next_keys = {}
+            size = job.size
+            for dataset_id, (_, records) in results.items():
+                for record in records:
+                    line = await encode_line({"datasetId": dataset_id, "record": record})
+                    if len(job.offsets) + len(lines) >= conf.query_job_max_records or size + len(line) > conf.query_job_max_bytes:
+                        job.truncated = True
+                        break
+                    lines.append(line)
+                    size += len(line)
+                    job.counts[dataset_id] = job.counts.get(dataset_id, 0) + 1
+                next_key = getattr(records, "next_key", None)
+                if next_key is not None:
+                    next_keys[dataset_id] = next_key
+            await loop.run_in_executor(None, write_lines, job.path, lines)
+            for line in lines:
+                job.offsets.append(job.size)
+                job.size += len(line)
+            if job.truncated:
+                break
+            next_token = encode_page_token(next_keys) if next_keys else None
+            if next_token is None or next_token == qparams.query.pagination.next:
+                break
+            qparams.query.pagination.next = next_token
+            datasets = list(next_keys)
+
+    async def read(self, job: QueryJob, skip: int, limit: int) -> List[jsonb]:
+        """The spooled records from ``skip`` (at most ``limit``), as JSON"""
+        # the offsets only grow after the lines are written, so a running job is read up to them
+        count = len(job.offsets)
+        if skip >= count or limit <= 0:
+            return []
+        start = job.offsets[skip]
+        end = job.offsets[skip + limit] if skip + limit < count else job.size
+        lines = await asyncio.get_running_loop().run_in_executor(None, read_lines, job.path, start, end)
+        return [jsonb(line.decode()) for line in lines]
+
+    def _purge(self):
+        now = time.time()
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        excess = len(finished) - conf.query_job_max_retained
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished_at > conf.query_job_ttl:
+                self._remove(job)
+
+    def _remove(self, job: QueryJob):
+        del self._jobs[job.id]
+        try:
+            os.remove(job.path)
+        except FileNotFoundError:
+            pass
+
+    async def _purge_periodically(self):
+        while True:
+            await asyncio.sleep(conf.query_job_purge_interval)
+            try:
+                self._purge()
+            except Exception as e:
+                LOG.error(f"Couldn't remove the expired query jobs: {e}")
+
+    async def close(self):
+        """Cancels the jobs still running and the periodic removal (on shutdown)"""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if self._purge_task is not None:
+            tasks.append(self._purge_task)
+            self._purge_task.cancel()
+            self._purge_task = None
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "submitted": self.submitted,
+            "failed": self.failed,
+            "jobs": statuses,
+        }
+
+
+QUERY_JOBS = QueryJobs()
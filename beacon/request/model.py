@@ -1,9 +1,13 @@
+import base64
+import copy
 import logging
+from datetime import datetime
 from typing_extensions import Self
 
-from pydantic import BaseModel
+from bson import ObjectId, json_util
+from pydantic import BaseModel, PrivateAttr, validator
 from strenum import StrEnum
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from beacon import conf
 from humps.main import camelize
 from aiohttp.web_request import Request
@@ -83,9 +87,55 @@ class CustomFilter(CamelModel):
     scope: Optional[str] = None
 
 
+def encode_page_token(next_keys: Dict[str, list]) -> str:
+    """Opaque continuation token, with the sort key of the last document returned of each dataset"""
+    return base64.urlsafe_b64encode(json_util.dumps(next_keys).encode()).decode()
+
+
+class InvalidPageToken(ValueError):
+    """The pagination token wasn't returned by this beacon (answered with a 400)"""
+
+
+class UnsupportedQuery(ValueError):
+    """The query can't be answered as requested, e.g. the MISS results of a text search (answered with a 400)"""
+
+
+# types of the values of the sort keys, anything else (e.g. an operator document) isn't a key
+SORT_KEY_TYPES = (str, int, float, ObjectId, datetime)
+
+
+def is_sort_key(key) -> bool:
+    return isinstance(key, list) and all(value is None or isinstance(value, SORT_KEY_TYPES) for value in key)
+
+
+def decode_page_token(token: str) -> Dict[str, list]:
+    """{ dataset_id:key } of the token, its keys are checked against the sort keys when they're used"""
+    try:
+        next_keys = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise InvalidPageToken("Invalid pagination token")
+    if not isinstance(next_keys, dict) \
+            or not all(isinstance(dataset_id, str) and is_sort_key(key) for dataset_id, key in next_keys.items()):
+        raise InvalidPageToken("Invalid pagination token")
+    return next_keys
+
+
 class Pagination(CamelModel):
     skip: int = 0
     limit: int = 10
+    # token of the next page, from the previous response (skip is ignored with it)
+    next: Optional[str] = None
+
+    @validator("next")
+    def check_next(cls, v):
+        if v is not None:
+            decode_page_token(v)
+        return v
+
+    @property
+    def after_keys(self) -> Optional[Dict[str, list]]:
+        """{ dataset_id:key } of the last documents returned, only the datasets in it have more pages"""
+        return decode_page_token(self.next) if self.next is not None else None
 
 
 class RequestMeta(CamelModel):
@@ -105,6 +155,29 @@ class RequestQuery(CamelModel):
 class RequestParams(CamelModel):
     meta: RequestMeta = RequestMeta()
     query: RequestQuery = RequestQuery()
+    # datasets the query runs on, set by the handlers (never by the user)
+    _target_datasets: Optional[List[str]] = PrivateAttr(default=None)
+    # granularity of the results the handler needs (None: records)
+    _granularity: Optional[Granularity] = PrivateAttr(default=None)
+
+    @property
+    def target_datasets(self) -> Optional[List[str]]:
+        return self._target_datasets
+
+    @property
+    def granularity(self) -> Optional[Granularity]:
+        return self._granularity
+
+    def for_datasets(self, datasets: List[str], granularity: Optional[Granularity] = None) -> Self:
+        """Returns a copy of the params scoped to the given datasets.
+
+        The db functions return the results of scoped queries grouped by dataset.
+        With a boolean or count granularity, they don't fetch the records (and a boolean
+        query doesn't count them either)."""
+        qparams = copy.deepcopy(self)
+        qparams._target_datasets = list(datasets)
+        qparams._granularity = granularity
+        return qparams
 
     def from_request(self, request: Request) -> Self:
         
@@ -120,6 +193,9 @@ class RequestParams(CamelModel):
                     self.query.pagination.skip = int(v)
                 elif k == "limit":
                     self.query.pagination.limit = int(v)
+                elif k == "next":
+                    decode_page_token(v)
+                    self.query.pagination.next = v
                 elif k == "includeResultsetResponses":
                     self.query.include_resultset_responses = IncludeResultsetResponses(v)
                 else:
@@ -171,7 +247,7 @@ class RequestParams(CamelModel):
             "filters": filters,
             "requestParameters": self.query.request_parameters,
             "includeResultsetResponses": self.query.include_resultset_responses,
-            "pagination": self.query.pagination.dict(),
+            "pagination": self.query.pagination.dict(exclude_none=True),
             "requestedGranularity": self.query.requested_granularity,
             "testMode": self.query.test_mode
         }
@@ -0,0 +1,116 @@
+"""
+Query result cache.
+
+Keeps the results of the db functions by (query, dataset), so repeated queries don't hit the DB.
+An entry is dropped after ``conf.result_cache_ttl`` seconds, when the data version of its dataset
+changes (see ``datasets_registry``), or when the cache goes over its memory budget
+(``conf.result_cache_size`` MB, least recently used first).
+
+The cached results are the raw ones: the accessible datasets and RIP are applied on top of them,
+for every request.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import bson
+
+from beacon import conf
+
+LOG = logging.getLogger(__name__)
+
+
+def estimate_size(records) -> int:
+    """Approximate memory used by the records, in bytes"""
+    try:
+        return sum(len(bson.encode(record)) for record in records)
+    except Exception:
+        return len(str(records))
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # { key:(expires_at, version, value, size) }, from least to most recently used
+        self._entries: OrderedDict[str, Tuple[float, Any, Any, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    @staticmethod
+    def query_key(db_fn, entry_id: Optional[str], qparams, granularity=None) -> str:
+        """Canonical hash of the query, the same for all the equivalent requests"""
+        summary = qparams.summary()
+        # the dataset is part of the entry key, and the filters are and'ed (order doesn't matter)
+        summary["requestParameters"] = {
+            k: v for k, v in summary["requestParameters"].items() if k != "datasets"
+        }
+        summary["filters"] = sorted(str(f) for f in summary["filters"])
+        key = {
+            "fn": f"{db_fn.__module__}.{db_fn.__qualname__}",
+            "id": entry_id,
+            "granularity": granularity,
+            "query": summary,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, query_key: str, dataset_id: str, version) -> Optional[Any]:
+        key = f"{query_key}:{dataset_id}"
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, entry_version, value, _ = entry
+            if expires_at > time.monotonic() and entry_version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def set(self, query_key: str, dataset_id: str, version, value, size: int):
+        if size > self.max_bytes:
+            return
+        key = f"{query_key}:{dataset_id}"
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, version, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+
+RESULT_CACHE = ResultCache(
+    max_bytes=getattr(conf, 'result_cache_size', 256) * 2**20,
+    ttl=getattr(conf, 'result_cache_ttl', 300),
+)
@@ -1,8 +1,9 @@
 from aiohttp import web
 
 from beacon.db import analyses, biosamples, cohorts, datasets, g_variants, individuals, runs, filtering_terms
-from beacon.request.handlers import collection_handler, generic_handler, filtering_terms_handler
-from beacon.response import framework, info, service_info
+from beacon.request.handlers import batch_handler, collection_handler, generic_handler, filtering_terms_handler, \
+    job_handler, job_results_handler, job_status_handler
+from beacon.response import framework, info, metrics, service_info
 
 routes = [
 
@@ -18,6 +19,9 @@ routes = [
     web.get('/api/configuration/', framework.configuration),
     web.get('/api/entry_types/', framework.entry_types),
     web.get('/api/map/', framework.beacon_map),
+    web.get('/api/metrics/', metrics.handler),
+    web.get('/api/jobs/{id}/', job_status_handler),
+    web.get('/api/jobs/{id}/results/', job_results_handler),
 
     ########################################
     # GET
@@ -108,6 +112,8 @@ routes = [
 
     web.post('/api/g_variants/', generic_handler(db_fn=g_variants.get_variants)),
     web.post('/api/g_variants/filtering_terms/', filtering_terms_handler(db_fn=g_variants.get_filtering_terms_of_genomicvariation)),
+    web.post('/api/g_variants/batch/', batch_handler(db_fn=g_variants.get_variants, batch_fn=g_variants.get_variants_batch)),
+    web.post('/api/g_variants/jobs/', job_handler(db_fn=g_variants.get_variants)),
     web.post('/api/g_variants/{id}/', generic_handler(db_fn=g_variants.get_variant_with_id)),
     web.post('/api/g_variants/{id}/biosamples/', generic_handler(db_fn=g_variants.get_biosamples_of_variant)),
     web.post('/api/g_variants/{id}/individuals/', generic_handler(db_fn=g_variants.get_individuals_of_variant)),
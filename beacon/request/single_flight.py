@@ -0,0 +1,79 @@
+"""
+Single-flight query coalescing.
+
+When the same query on the same dataset is already running (e.g. a Beacon Network fan-out sending
+the same request many times within a few milliseconds), the new requests wait for its result
+instead of running it again. Unlike the result cache, nothing is kept once the query finishes.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+LOG = logging.getLogger(__name__)
+
+
+class SingleFlight:
+
+    def __init__(self):
+        # { key:future } of the executions in progress
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, keys: Iterable[Hashable],
+            fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Returns { key:value } for all the keys.
+
+        The keys that are not in flight are computed with a single ``fn(keys)`` call, that must return
+        the value of each of them, the rest are taken from the executions in progress."""
+
+        loop = asyncio.get_running_loop()
+        joined: Dict[Hashable, asyncio.Future] = {}
+        own: Dict[Hashable, asyncio.Future] = {}
+        for key in keys:
+            if key in self._in_flight:
+                joined[key] = self._in_flight[key]
+            else:
+                own[key] = self._in_flight[key] = loop.create_future()
+                # so a failure nobody else waited for isn't reported as "never retrieved"
+                own[key].add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if joined:
+            self.coalesced += len(joined)
+            LOG.debug(f"Coalesced {len(joined)} queries with the ones in flight")
+
+        results = {}
+        if own:
+            self.executions += len(own)
+            try:
+                results = await fn(list(own))
+                for key, future in own.items():
+                    future.set_result(results[key])
+            except BaseException as e:
+                for future in own.values():
+                    if not future.done():
+                        if isinstance(e, asyncio.CancelledError):
+                            future.cancel()
+                        else:
+                            future.set_exception(e)
+                raise
+            finally:
+                for key in own:
+                    del self._in_flight[key]
+
+        for key, future in joined.items():
+            # shielded: cancelling this request doesn't cancel the others waiting for the same query
+            results[key] = await asyncio.shield(future)
+
+        return results
+
+    def metrics(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inFlight": len(self._in_flight),
+        }
+
+
+QUERIES_IN_FLIGHT = SingleFlight()
@@ -3,16 +3,18 @@ from typing import Optional, Tuple, List, Dict, Set
 from beacon import conf
 from beacon.db.schemas import DefaultSchemas
 from beacon.request import RequestParams
-from beacon.request.model import Granularity
+from beacon.request.model import Granularity, encode_page_token
 
 import logging
 
 LOG = logging.getLogger(__name__)
 
-def build_meta(qparams: RequestParams, entity_schema: Optional[DefaultSchemas], returned_granularity: Granularity):
+def build_meta(qparams: RequestParams, entity_schema: Optional[DefaultSchemas], returned_granularity: Granularity,
+    count_precision: Optional[str] = None):
     """"Builds the `meta` part of the response
 
     We assume that receivedRequest is the evaluated request (qparams) sent by the user.
+    The count precision ('lowerBound' or 'estimated') is only there when the counts are approximate.
     """
 
     meta = {
@@ -22,6 +24,8 @@ def build_meta(qparams: RequestParams, entity_schema: Optional[DefaultSchemas],
         'receivedRequestSummary': qparams.summary(),
         'returnedSchemas': [entity_schema.value] if entity_schema is not None else []
     }
+    if count_precision is not None:
+        meta['countPrecision'] = count_precision
     return meta
 
 
@@ -44,6 +48,7 @@ def build_generic_response(
     """Builds the Beacon response, oculting the results from the required datasets.
     
     Receives results(count, records) of each queried dataset, authorized datasets, and granularity of results.
+    Boolean responses have no counts, and count responses no records.
     """
 
     # iterate over all results to get:
@@ -52,6 +57,8 @@ def build_generic_response(
 
     num_total_results = 0
     response_list:List[Dict] = []
+    next_keys:Dict[str,list] = {}
+    precisions:Set[str] = set()
     for dataset_id in results_by_dataset:
 
         num_dataset_results = results_by_dataset[dataset_id][0]
@@ -62,30 +69,78 @@ def build_generic_response(
             "id": dataset_id,
             "exists": num_dataset_results > 0,
             "setType": "dataset",
-            "results": dataset_results,
-            "resultsCount": num_dataset_results
         }
-        
+        if granularity != Granularity.BOOLEAN:
+            dataset_response["resultsCount"] = num_dataset_results
+            # approximate counts (see conf.count_policies)
+            precision = getattr(num_dataset_results, "precision", None)
+            if precision is not None:
+                dataset_response["resultsCountPrecision"] = precision
+                precisions.add(precision)
         # if dataset is not authorized, erase the records part
-        if dataset_id not in accessible_datasets:
-            dataset_response["results"] = []
+        if granularity == Granularity.RECORD:
+            dataset_response["results"] = dataset_results if dataset_id in accessible_datasets else []
+            # where the next page of the dataset starts (the key is part of a record, so only if it's accessible)
+            next_key = getattr(dataset_results, "next_key", None)
+            if dataset_id in accessible_datasets and next_key is not None:
+                next_keys[dataset_id] = next_key
             
         response_list.append(dataset_response)
+
+    if granularity == Granularity.BOOLEAN and not conf.boolean_by_dataset:
+        response_list = []
     
     beacon_response = []
             
     beacon_response = {
-        'meta': build_meta(qparams, entity_schema, granularity),
-        'responseSummary': build_response_summary(num_total_results > 0, num_total_results),
+        # an estimated count is less precise than a lower bound
+        'meta': build_meta(qparams, entity_schema, granularity,
+            "estimated" if "estimated" in precisions else "lowerBound" if precisions else None),
+        'responseSummary': build_response_summary(
+            num_total_results > 0,
+            num_total_results if granularity != Granularity.BOOLEAN else None
+        ),
         'beaconHandovers': conf.beacon_handovers,
         'response': {
             'resultSets': response_list
         }
     }
     
+    if next_keys:
+        # sent back as pagination.next, to get the next page
+        beacon_response['info'] = {'pagination': {'next': encode_page_token(next_keys)}}
 
     return beacon_response
 
+def build_batch_response(responses: List[dict], qparams: RequestParams, entity_schema, granularity: Granularity):
+    """Builds the response of a batch of queries from the response of each one (see ``build_generic_response``),
+    keyed by the index of the query in the batch"""
+    exists = any(response['responseSummary']['exists'] for response in responses)
+    num_total_results = None
+    if granularity != Granularity.BOOLEAN:
+        num_total_results = sum(response['responseSummary']['numTotalResults'] for response in responses)
+
+    queries = {}
+    for index, response in enumerate(responses):
+        queries[str(index)] = {
+            'requestParameters': response['meta']['receivedRequestSummary']['requestParameters'],
+            'responseSummary': response['responseSummary'],
+            'resultSets': response['response']['resultSets'],
+        }
+        if 'countPrecision' in response['meta']:
+            queries[str(index)]['countPrecision'] = response['meta']['countPrecision']
+        if 'info' in response:
+            queries[str(index)]['info'] = response['info']
+
+    return {
+        'meta': build_meta(qparams, entity_schema, granularity),
+        'responseSummary': build_response_summary(exists, num_total_results),
+        'beaconHandovers': conf.beacon_handovers,
+        'response': {
+            'queries': queries
+        }
+    }
+
 # not used at this moment
 def build_response_by_dataset(data, response_dict, num_total_results, qparams, func):
     """"Fills the `response` part with the correct format in `results`"""
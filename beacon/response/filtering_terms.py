@@ -14,13 +14,13 @@ from beacon.utils.stream import json_stream
 
 
 async def handler(request, qparams: RequestParams, entity_schema: DefaultSchemas):
-    _, _, docs = get_filtering_terms(entry_id=None, qparams=qparams)
+    _, _, docs = await get_filtering_terms(entry_id=None, qparams=qparams)
     ontology_terms = [
         {
             'id': record['ontology'] + ':' + record['term'],
             'label': record['label']
         }
-        async for record in docs
+        for record in docs
     ]
     response = {
         'meta': conf.beacon_id,
@@ -29,8 +29,8 @@ async def handler(request: Request):
     # Fetch datasets info
     json_body = await request.json() if request.method == "POST" and request.has_body and request.can_read_body else {}
     qparams = RequestParams(**json_body).from_request(request)
-    _, _, datasets = get_datasets(None, qparams)
-    beacon_datasets = [ r for r in datasets ]
+    _, _, datasets = await get_datasets(None, qparams)
+    beacon_datasets = list(datasets)
         
     all_datasets = [ r['id'] for r in beacon_datasets]
     specific_datasets = [ r['id'] for r in beacon_datasets]
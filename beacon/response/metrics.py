@@ -0,0 +1,31 @@
+"""
+Metrics Endpoint.
+
+Counters of the in-process caches of this beacon (e.g. to check their hit ratio), of the
+queries coalesced with identical ones in flight, of the variant position and sample membership
+indexes and of the query jobs.
+"""
+
+import logging
+from aiohttp.web_request import Request
+from beacon.db.sample_index import SAMPLE_MEMBERSHIP_INDEX
+from beacon.db.variant_index import VARIANT_POSITION_INDEX
+from beacon.request.jobs import QUERY_JOBS
+from beacon.request.result_cache import RESULT_CACHE
+from beacon.request.single_flight import QUERIES_IN_FLIGHT
+from beacon.utils.auth import PERMISSIONS_CACHE
+from beacon.utils.stream import json_stream
+
+LOG = logging.getLogger(__name__)
+
+async def handler(request: Request):
+    LOG.info('Running a GET metrics request')
+    response = {
+        'permissionsCache': PERMISSIONS_CACHE.metrics(),
+        'resultCache': RESULT_CACHE.metrics(),
+        'queryCoalescing': QUERIES_IN_FLIGHT.metrics(),
+        'variantPositionIndex': VARIANT_POSITION_INDEX.metrics(),
+        'sampleMembershipIndex': SAMPLE_MEMBERSHIP_INDEX.metrics(),
+        'queryJobs': QUERY_JOBS.metrics(),
+    }
+    return await json_stream(request, response)
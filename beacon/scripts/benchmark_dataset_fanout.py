@@ -0,0 +1,108 @@
+"""
+Measures the latency of a beacon query against the number of datasets it targets.
+
+For every dataset count N (1, 2, 4, ...), sends the same query restricted to the
+first N datasets of the beacon and reports the p50/p99 latencies, e.g.:
+
+    python beacon/scripts/benchmark_dataset_fanout.py --url http://localhost:5050/api/g_variants/ --repeat 50
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import requests
+from pymongo import MongoClient
+
+
+DEFAULT_QUERY = {
+    "meta": {
+        "apiVersion": "2.0"
+    },
+    "query": {
+        "requestParameters": {
+            "referenceName": "1",
+            "start": [69000],
+            "end": [70000]
+        },
+        "filters": [],
+        "includeResultsetResponses": "HIT",
+        "pagination": {
+            "skip": 0,
+            "limit": 10
+        },
+        "requestedGranularity": "record"
+    }
+}
+
+
+def get_dataset_ids():
+    # Connect to MongoDB
+    database_password = os.getenv('DB_PASSWD')
+    client = MongoClient(
+        "mongodb://{}:{}@{}:{}/{}?authSource={}".format(
+            "root",
+            database_password,
+            "db",
+            27017,
+            "beacon",
+            "admin"
+        )
+    )
+    return [doc["id"] for doc in client.beacon.get_collection('datasets').find({}, {"id": 1, "_id": 0})]
+
+
+def dataset_counts(max_datasets):
+    n = 1
+    while n < max_datasets:
+        yield n
+        n *= 2
+    yield max_datasets
+
+
+def run(url, query, datasets, repeat, access_token=None):
+    headers = {'Content-Type': 'application/json'}
+    if access_token:
+        headers['Authorization'] = f'Bearer {access_token}'
+
+    body = json.loads(json.dumps(query))
+    body["query"]["requestParameters"]["datasets"] = datasets
+
+    latencies = []
+    with requests.Session() as session:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = session.post(url, headers=headers, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser("Beacon per-dataset fan-out benchmark")
+    parser.add_argument("--url", default="http://localhost:5050/api/g_variants/", help="Endpoint to query")
+    parser.add_argument("--query", help="JSON file with the request body (default: a region query)")
+    parser.add_argument("--datasets", nargs='+', help="Dataset ids to use (default: all datasets in the DB)")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per dataset count")
+    parser.add_argument("--token", default=os.getenv('ACCESS_TOKEN'), help="Access token (optional)")
+    args = parser.parse_args()
+
+    query = DEFAULT_QUERY
+    if args.query:
+        with open(args.query, 'r') as json_file:
+            query = json.load(json_file)
+
+    datasets = args.datasets or get_dataset_ids()
+    if not datasets:
+        print("No datasets found")
+        return
+
+    print(f"{'datasets':>8} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for n in dataset_counts(len(datasets)):
+        latencies = run(args.url, query, datasets[:n], args.repeat, args.token)
+        print(f"{n:>8} {np.percentile(latencies, 50):>10.1f} {np.percentile(latencies, 99):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
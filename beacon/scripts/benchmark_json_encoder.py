@@ -0,0 +1,69 @@
+"""
+Compares the records per second of the JSON encoder backends of beacon.utils.json.
+
+Encodes genomic variation records (synthetic by default, or read from the DB with --from-db)
+with each backend, both as a page (list) and streamed from an async generator, e.g.:
+
+    python -m beacon.scripts.benchmark_json_encoder --records 20000 --from-db
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from pymongo import MongoClient
+
+from beacon.scripts.benchmark_json_stream import synthetic_variant
+from beacon.utils import json as beacon_json
+
+
+def load_records(n, from_db):
+    if not from_db:
+        return [synthetic_variant(i) for i in range(n)]
+    client = MongoClient(
+        "mongodb://{}:{}@{}:{}/{}?authSource={}".format(
+            "root",
+            os.getenv('DB_PASSWD'),
+            "db",
+            27017,
+            "beacon",
+            "admin"
+        )
+    )
+    return list(client.beacon.genomicVariations.find({}, {"_position": 0, "_info": 0}).limit(n))
+
+
+async def as_async_gen(records):
+    for record in records:
+        yield record
+
+
+async def encode(data):
+    size = 0
+    async for chunk in beacon_json.json_iterencode(data):
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser("Beacon JSON encoder benchmark")
+    parser.add_argument("--records", type=int, default=20000, help="Number of records to encode")
+    parser.add_argument("--from-db", action="store_true", help="Read genomicVariations from the DB instead of synthetic records")
+    args = parser.parse_args()
+
+    records = load_records(args.records, args.from_db)
+    print(f"{len(records)} records")
+
+    print(f"{'encoder':>8} {'input':>10} {'records/s':>12} {'MB':>8}")
+    for encoder in beacon_json.ENCODERS:
+        beacon_json.use_encoder(encoder)
+        for name, make_data in (("page", lambda: {"results": records}),
+                                ("stream", lambda: {"results": as_async_gen(records)})):
+            start = time.perf_counter()
+            size = asyncio.run(encode(make_data()))
+            elapsed = time.perf_counter() - start
+            print(f"{encoder:>8} {name:>10} {len(records) / elapsed:>12.0f} {size / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Measures the memory and time to first byte of a large JSON export through json_stream.
+
+Streams N genomic variation records (synthetic by default, or read from the DB with --from-db)
+from an in-process aiohttp server, once encoding the whole response before writing it
+(the old behaviour) and once with the incremental json_stream, and reports the peak
+Python memory (tracemalloc) of each, e.g.:
+
+    python -m beacon.scripts.benchmark_json_stream --records 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from beacon.utils.json import json_iterencode
+from beacon.utils.stream import json_stream
+
+
+def synthetic_variant(i):
+    return {
+        "variantInternalId": f"chr1:{10000 + i}:A:G",
+        "variation": {
+            "variantType": "SNP",
+            "referenceBases": "A",
+            "alternateBases": "G",
+            "location": {
+                "type": "SequenceLocation",
+                "sequence_id": "HGVSid:1:g.10000A>G",
+                "interval": {
+                    "type": "SequenceInterval",
+                    "start": {"type": "Number", "value": 10000 + i},
+                    "end": {"type": "Number", "value": 10001 + i}
+                }
+            }
+        },
+        "identifiers": {"genomicHGVSId": f"NC_000001.11:g.{10000 + i}A>G"},
+        "molecularAttributes": {"geneIds": ["DDX11L1"], "molecularEffects": [{"id": "ENSGLOSSARY:0000150", "label": "upstream_gene_variant"}]},
+        "caseLevelData": [{"biosampleId": f"sample-{j}", "zygosity": {"id": "GENO:0000458", "label": "0/1"}} for j in range(5)],
+        "frequencyInPopulations": [{"source": "gnomAD", "frequencies": [{"population": "all", "alleleFrequency": 0.0123}]}]
+    }
+
+
+async def synthetic_records(n):
+    for i in range(n):
+        yield synthetic_variant(i)
+
+
+def db_records(n):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(
+        "mongodb://{}:{}@{}:{}/{}?authSource={}".format(
+            "root",
+            os.getenv('DB_PASSWD'),
+            "db",
+            27017,
+            "beacon",
+            "admin"
+        )
+    )
+    return client.beacon.genomicVariations.find({}, {"_id": 0}).limit(n)
+
+
+async def json_materialized(request, data):
+    """json_stream as it was: encodes the whole response before writing it"""
+    content = [chunk async for chunk in json_iterencode(data)]
+    response = web.StreamResponse(headers={'Content-Type': 'application/json;charset=utf-8'})
+    await response.prepare(request)
+    await response.write(''.join(content).encode())
+    await response.write_eof()
+    return response
+
+
+async def measure(stream_fn, records_fn, n):
+    async def handler(request):
+        return await stream_fn(request, {"resultSets": [{"id": "benchmark", "results": records_fn(n)}]})
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    async with TestClient(TestServer(app)) as client:
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = await client.get('/')
+        first_byte = None
+        size = 0
+        async for data in response.content.iter_any():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(data)
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return first_byte, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser("Beacon JSON streaming benchmark")
+    parser.add_argument("--records", type=int, default=100000, help="Number of records to export")
+    parser.add_argument("--from-db", action="store_true", help="Read genomicVariations from the DB instead of synthetic records")
+    args = parser.parse_args()
+
+    records_fn = db_records if args.from_db else synthetic_records
+
+    print(f"{'mode':>12} {'TTFB (s)':>10} {'total (s)':>10} {'MB sent':>10} {'peak MB':>10}")
+    for name, stream_fn in (("materialized", json_materialized), ("streaming", json_stream)):
+        first_byte, total, size, peak = asyncio.run(measure(stream_fn, records_fn, args.records))
+        print(f"{name:>12} {first_byte:>10.2f} {total:>10.2f} {size / 2**20:>10.1f} {peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,123 @@
+import hashlib
 import logging
-from typing import List, Tuple
+import time
+from typing import Dict, List, Optional, Tuple
 
-import yaml
+import jwt
 
-from aiohttp import ClientSession, web
+from aiohttp import ClientSession, ClientTimeout, web
 
 import asyncio
 
+from beacon import conf
 from beacon.db.datasets import filter_public_datasets
+from beacon.request.datasets_registry import DATASET_REGISTRY
 from ..conf import permissions_url
 
 LOG = logging.getLogger(__name__)
 
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """Returns the exp claim (epoch seconds) of a JWT access token, or None if it can't be read.
+
+    The signature is not checked here, that's the job of the permissions server."""
+    if token.startswith('Bearer '):
+        token = token[7:]  # cut out 7 characters: len('Bearer ')
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+    return float(exp) if exp is not None else None
+
+
+class PermissionsCache:
+    """Responses of the permissions server by token, so known tokens don't cost a request to it.
+
+    Entries are keyed by the token's hash and expire at the token's exp, or after max_age seconds."""
+
+    def __init__(self, max_age: int, max_size: int):
+        self.max_age = max_age
+        self.max_size = max_size
+        self._entries: Dict[str, Tuple[float, tuple]] = {}  # { token_hash:(expires_at, permissions) }
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[tuple]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, permissions = entry
+            if expires_at > time.time():
+                self.hits += 1
+                return permissions
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, permissions: tuple):
+        now = time.time()
+        expires_at = now + self.max_age
+        token_expiry = get_token_expiry(token)
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)
+        if expires_at <= now:
+            return
+        if len(self._entries) >= self.max_size:
+            self._evict(now)
+        self._entries[self._key(token)] = (expires_at, permissions)
+
+    def _evict(self, now: float):
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        # still full, drop the oldest entries
+        while len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+
+PERMISSIONS_CACHE = PermissionsCache(
+    max_age=getattr(conf, 'permissions_cache_max_age', 300),
+    max_size=getattr(conf, 'permissions_cache_size', 10000),
+)
+
+# long-lived session, its connection pool is shared by all the requests to the permissions server
+_permissions_session: Optional[ClientSession] = None
+
+
+async def open_permissions_session() -> ClientSession:
+    global _permissions_session
+    if _permissions_session is None or _permissions_session.closed:
+        _permissions_session = ClientSession(timeout=ClientTimeout(total=10))
+    return _permissions_session
+
+
+async def close_permissions_session():
+    global _permissions_session
+    if _permissions_session is not None:
+        await _permissions_session.close()
+        _permissions_session = None
+
 async def resolve_token(token, requested_datasets_ids):
     raise KeyError("This function should not be used anymore")
     # If the user is not authenticated (ie no token)
     # we pass (requested_datasets, False) to the database function: it will filter out the datasets list, with the public ones
     if token is None:
-        public_datasets = [ d["name"] for d in filter_public_datasets(requested_datasets_ids) ]
+        public_datasets = [ d["name"] async for d in filter_public_datasets(requested_datasets_ids) ]
         return public_datasets, False
     
     new_requested_datasets_ids=[]
@@ -63,71 +163,70 @@ async def request_permissions(token) -> Tuple[List[str], bool, bool]:
         LOG.debug("Token is none")
         return [], False, False, None
     
+    permissions = PERMISSIONS_CACHE.get(token)
+    if permissions is not None:
+        LOG.debug("Permissions found in cache")
+        return permissions
+
     LOG.debug("About to ask permissions server...")
     # The permissions server will:
     # * filter out the datasets list, with the ones the user has access to
     # * return _all_ the datasets the user has access to, in case the datasets list is empty
-    async with ClientSession() as session:
-        async with session.post(
-                'http://beacon-permissions:5051/',
-                headers={#'Authorization': 'Bearer ' + token,
-                         'Authorization': token,
-                         'Accept': 'application/json'} # will set the Content-Type to application/json
-        ) as resp:
-            
-            if resp.status > 200:
-                LOG.error('Permissions server error %d', resp.status)
-                error = await resp.text()
-                LOG.error('Error: %s', error)
-                return [], False, False, None
-                #raise web.HTTPUnauthorized(body=error)
-            
-            """
-            content = await resp.content.read()
-            authorized_datasets = content.decode('utf-8')
-            LOG.debug(f"authorized_datasets decoded = {authorized_datasets}")
-            authorized_datasets_list = authorized_datasets.split('"')
-            auth_datasets = []
-            for auth_dataset in authorized_datasets_list:
-                if ',' not in auth_dataset:
-                    if '[' not in auth_dataset:
-                        if ']' not in auth_dataset:
-                            auth_datasets.append(auth_dataset)
-            """
-            
-            try:
-                content = await resp.json()
-                auth_datasets = content["datasets"]
-                is_registered = content["is_registered"]
-                user_id = content["user_id"]
-            except Exception as e:
-                LOG.error(f"Error while getting results from permission server: {e}")
-                return [], False, False, None
-            
-            LOG.debug(auth_datasets)
-            return auth_datasets, True, is_registered, user_id
+    session = await open_permissions_session()
+    async with session.post(
+            'http://beacon-permissions:5051/',
+            headers={#'Authorization': 'Bearer ' + token,
+                     'Authorization': token,
+                     'Accept': 'application/json'} # will set the Content-Type to application/json
+    ) as resp:
+        
+        if resp.status > 200:
+            LOG.error('Permissions server error %d', resp.status)
+            error = await resp.text()
+            LOG.error('Error: %s', error)
+            return [], False, False, None
+            #raise web.HTTPUnauthorized(body=error)
+        
+        """
+        content = await resp.content.read()
+        authorized_datasets = content.decode('utf-8')
+        LOG.debug(f"authorized_datasets decoded = {authorized_datasets}")
+        authorized_datasets_list = authorized_datasets.split('"')
+        auth_datasets = []
+        for auth_dataset in authorized_datasets_list:
+            if ',' not in auth_dataset:
+                if '[' not in auth_dataset:
+                    if ']' not in auth_dataset:
+                        auth_datasets.append(auth_dataset)
+        """
+        
+        try:
+            content = await resp.json()
+            auth_datasets = content["datasets"]
+            is_registered = content["is_registered"]
+            user_id = content["user_id"]
+        except Exception as e:
+            LOG.error(f"Error while getting results from permission server: {e}")
+            return [], False, False, None
+        
+        LOG.debug(auth_datasets)
+        # errors are not cached, only the answers of the permissions server
+        permissions = (auth_datasets, True, is_registered, user_id)
+        PERMISSIONS_CACHE.set(token, permissions)
+        return permissions
 
 # returns datasets that are accessible by user
 # TODO if requested_datasets is given, filters them by perms
 # otherwise returns all accessible
 async def get_permission_info(token, requested_datasets=None) -> List[str]:
     
-    accessible_datasets:List[str] = []
-    
     # Start async task to request datasets from permissions server
     task_permissions = asyncio.create_task(request_permissions(token))
     
-    # get public datasets
-    public_datasets = []
-    with open("/beacon/beacon/request/public_datasets.yml", 'r') as stream:
-        public_datasets = yaml.safe_load(stream)['public_datasets']
-        LOG.debug(f"pub datasets = {public_datasets}")    
-    
-    # get registered datasets
-    registered_datasets = []
-    with open("/beacon/beacon/request/registered_datasets.yml", 'r') as stream:
-        registered_datasets = yaml.safe_load(stream)['registered_datasets']
-        LOG.debug(f"registered datasets = {registered_datasets}")
+    public_datasets = DATASET_REGISTRY.public_datasets
+    registered_datasets = DATASET_REGISTRY.registered_datasets
+    LOG.debug(f"pub datasets = {public_datasets}")
+    LOG.debug(f"registered datasets = {registered_datasets}")
         
     # get the result from task
     controlled_datasets, is_authenticated, is_registered, user_id = await task_permissions
@@ -138,16 +237,15 @@ async def get_permission_info(token, requested_datasets=None) -> List[str]:
         accessible_datasets = public_datasets
     # authenticated but not researcher status, give access to public and controlled
     elif not is_registered:
-        accessible_datasets = public_datasets + controlled_datasets
+        accessible_datasets = public_datasets.union(controlled_datasets)
     # authenticated and registered, give access to everything
     else:
-        accessible_datasets += public_datasets + registered_datasets + controlled_datasets
+        accessible_datasets = public_datasets.union(registered_datasets, controlled_datasets)
     
     # filter by requested datasets (if applicable)
     if requested_datasets:
-        accessible_datasets = list(set(accessible_datasets).intersection(set(requested_datasets)))
+        accessible_datasets = accessible_datasets.intersection(requested_datasets)
     
-    # remove duplicates and return result
-    return list(set(accessible_datasets)), is_authenticated, is_registered, user_id
+    return list(accessible_datasets), is_authenticated, is_registered, user_id
     
     
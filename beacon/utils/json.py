@@ -10,6 +10,14 @@ from asyncpg import Record
 from json import loads as parse_json
 
 from pymongo.cursor import Cursor
+from motor.motor_asyncio import AsyncIOMotorCommandCursor, AsyncIOMotorCursor
+
+from beacon import conf
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 LOG = logging.getLogger(__name__)
 
@@ -20,6 +28,10 @@ def is_cursor(o):
     return isinstance(o, Cursor)
 
 
+def is_async_cursor(o):
+    return isinstance(o, (AsyncIOMotorCursor, AsyncIOMotorCommandCursor))
+
+
 def is_list(o):
     return (isinstance(o, (list, set, tuple)) or
             inspect.isgenerator(o) or
@@ -35,6 +47,11 @@ def is_asyncgen(o):
             inspect.isasyncgenfunction(o))
 
 
+def is_stream(o):
+    return (is_cursor(o) or is_async_cursor(o) or is_asyncgen(o) or
+            inspect.isgenerator(o) or inspect.isgeneratorfunction(o))
+
+
 class jsonb(str):
     __parsed = None
 
@@ -105,6 +122,10 @@ async def _compound(o, circulars):
     elif is_cursor(o):
         async for i in _iterencode_cursor(o, circulars):
             yield i
+    elif is_async_cursor(o):
+        # fetches the documents batch by batch, without blocking the loop
+        async for i in _iterencode_async_gen(o, circulars):
+            yield i
     else:
         raise TypeError(f'Unsupported type: {o.__class__.__name__}')
 
@@ -218,11 +239,74 @@ async def _iterencode_dataclass(d, circulars):
     yield '}'
     del circulars[marker]
 
+# Fast backend
+# encodes a whole value (e.g. a record) in one go, instead of one atom at a time.
+# Values holding cursors or generators can't be encoded this way, they are streamed
+# by the encoder above, and their items go through the fast backend again.
+
+def _orjson_default(o):
+    # with OPT_PASSTHROUGH_SUBCLASS, subclasses of str, int, dict and list end up here
+    if isinstance(o, jsonb):
+        return orjson.Fragment(o)
+    elif isinstance(o, str):
+        return str(o)
+    elif isinstance(o, int):
+        return int(o)
+    elif isinstance(o, (dict, Record)):
+        return dict(o)
+    elif isinstance(o, (list, set)):
+        return list(o)
+    elif isinstance(o, Decimal):
+        return orjson.Fragment(str(o))  # keeps the decimals, float would truncate them
+    elif isinstance(o, ObjectId):
+        return str(o)
+    # cursors, generators, ...
+    raise TypeError
+
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS) if orjson else 0
+
+
+def _orjson_encode(o):
+    """Returns o encoded, or None if it has to be streamed by the Python encoder"""
+    try:
+        return orjson.dumps(o, default=_orjson_default, option=_ORJSON_OPTIONS).decode()
+    except orjson.JSONEncodeError:
+        return None
+
+
+ENCODERS = {
+    'python': None,  # the Python encoder above, for everything
+    'orjson': _orjson_encode,
+}
+
+_fast_encode = None
+
+
+def use_encoder(name: str):
+    """Selects the backend used for the values that don't need streaming"""
+    global _fast_encode
+    if name not in ENCODERS:
+        raise ValueError(f'Unknown JSON encoder: {name}')
+    if name == 'orjson' and orjson is None:
+        LOG.warning('orjson is not installed, using the Python JSON encoder')
+        name = 'python'
+    _fast_encode = ENCODERS[name]
+
+
+use_encoder(getattr(conf, 'json_encoder', 'orjson'))
+
+
 async def _iterencode(o, circulars):
     atom = _atom(o)
     if atom is not None:
         yield atom
     else:  # not an atom type
+        if _fast_encode is not None and not is_stream(o):
+            encoded = _fast_encode(o)
+            if encoded is not None:
+                yield encoded
+                return
         async for item in _compound(o, circulars):
             yield item
 
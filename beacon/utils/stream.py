@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from aiohttp.http import SERVER_SOFTWARE
@@ -8,7 +9,8 @@ from beacon.utils.json import json_iterencode
 
 LOG = logging.getLogger(__name__)
 
-_BUF_SIZE = getattr(conf, 'json_buffer_size', 1000)
+# characters encoded before each write to the client
+_BUF_SIZE = getattr(conf, 'json_buffer_size', 64 * 1024)
 
 
 # async def json_stream(request, data):
@@ -16,11 +18,29 @@ _BUF_SIZE = getattr(conf, 'json_buffer_size', 1000)
 #     return aiohttp_json_response(data)
 
 async def json_stream(request, data, partial=False):
+    """Encodes data as JSON and streams it to the client as it's encoded.
+
+    Only a buffer of about json_buffer_size characters is kept in memory: cursors and
+    generators in data are consumed as the response is written, and every write waits
+    for the client to drain the previous ones (backpressure).
+
+    If encoding fails before the first write, the error propagates and becomes a regular
+    HTTP error. After that, the status is already sent, so the stream is cut instead
+    (no final chunk), and the client sees an incomplete response rather than a valid one.
+    """
     # No need here to check if partial is indeed a boolean
 
-    # Running this first, in case it raises an error
-    # so we don't start the StreamResponse yet
-    content_gen = [chunk async for chunk in json_iterencode(data)]
+    content_gen = json_iterencode(data)
+
+    # Encode the first buffer before starting the StreamResponse,
+    # in case it raises an error
+    buf = []
+    buf_len = 0
+    async for chunk in content_gen:
+        buf.append(chunk)
+        buf_len += len(chunk)
+        if buf_len >= _BUF_SIZE:
+            break
 
     LOG.debug('HTTP response stream')
     headers = {
@@ -33,20 +53,27 @@ async def json_stream(request, data, partial=False):
     # response.enable_chunked_encoding()
     await response.prepare(request)
 
-    # LOG.debug('HTTP response stream for rows')
-    buf = []
-    for chunk in content_gen:
-        if len(buf) < _BUF_SIZE:
-            buf.append(chunk)
-            continue
-        # flush the buffer
-        buf.append(chunk)
-        chunk = ''.join(buf)
+    try:
+        await response.write(''.join(buf).encode())  # utf-8
         buf = []
-        await response.write(chunk.encode())  # utf-8
-    if buf:  # flush the remainder in the buffer
-        chunk = ''.join(buf)
-        await response.write(chunk.encode())  # utf-8
+        buf_len = 0
+        async for chunk in content_gen:
+            buf.append(chunk)
+            buf_len += len(chunk)
+            if buf_len < _BUF_SIZE:
+                continue
+            # flush the buffer
+            await response.write(''.join(buf).encode())  # utf-8
+            buf = []
+            buf_len = 0
+            # encoding doesn't wait on anything, let the other requests run
+            await asyncio.sleep(0)
+        if buf:  # flush the remainder in the buffer
+            await response.write(''.join(buf).encode())  # utf-8
+    except Exception as e:
+        # aiohttp closes the connection when the handler fails after the response started
+        LOG.error(f'Error while streaming the response, closing it: {e}')
+        raise
 
     # LOG.debug('HTTP response stream closing')
     await response.write_eof()
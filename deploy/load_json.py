@@ -1,7 +1,37 @@
 import json
 import argparse
+import sys
+from pathlib import Path
 from pymongo.mongo_client import MongoClient
 
+# the beacon package, for the fields of the variants
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from beacon.db.positions import variant_fields
+
+def get_dataset_id(instance):
+    if "_info" in instance and "datasetId" in instance["_info"]:
+        return instance["_info"]["datasetId"]
+    return instance.get("datasetId")
+
+
+def bump_dataset_versions(client, instances):
+    """Invalidates the beacon's cached results of the datasets of the new instances"""
+    dataset_ids = { get_dataset_id(instance) for instance in instances }
+    if None in dataset_ids:
+        # some instances don't say their dataset, so all datasets might have changed
+        dataset_ids = {"*"}
+    for dataset_id in dataset_ids:
+        client.beacon.dataset_versions.update_one({"_id": dataset_id}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def add_variant_fields(instances):
+    """Writes the fields the variant queries look up (see beacon/db/variant_fields.py), as
+    'make variant-fields' does for the variants loaded without them"""
+    for instance in instances:
+        for field, value in variant_fields(instance).items():
+            instance.setdefault("_position", {})[field.split(".", 1)[1]] = value
+
+
 entities = ["analyses", "biosamples", "cohorts", "datasets", "genomicVariations", "individuals", "runs", "budget", "history"]
 
 def main():
@@ -28,8 +58,12 @@ def main():
                 all_instances = data
                 break
     
+    if args.collection == "genomicVariations":
+        add_variant_fields(all_instances)
+
     client = MongoClient(args.db)
     client.beacon.get_collection(args.collection).insert_many(all_instances)
+    bump_dataset_versions(client, all_instances)
     print("DONE!")
 
 if __name__ == "__main__":
@@ -138,4 +138,7 @@ for variant in collection.find():
         print(f"Failed to process variant {formatted_variant}: {e}")
         continue
     
-print("Finished updating allele frequencies.")
\ No newline at end of file
+print("Finished updating allele frequencies.")
+
+# the variants changed, invalidate the cached query results of all datasets
+client.beacon.dataset_versions.update_one({"_id": "*"}, {"$inc": {"version": 1}}, upsert=True)
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# the beacon package, from the root of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+@pytest.fixture
+def mongo():
+    """Runs ``test(db)`` with a scratch database of the MongoDB at BEACON_TEST_MONGO_URI (a service of the CI)"""
+    uri = os.environ.get("BEACON_TEST_MONGO_URI")
+    if not uri:
+        if os.environ.get("CI"):
+            pytest.fail("BEACON_TEST_MONGO_URI isn't set")
+        pytest.skip("needs a MongoDB, at BEACON_TEST_MONGO_URI")
+
+    def run(test):
+        async def main():
+            client = AsyncIOMotorClient(uri)
+            db = client[f"beacon_test_{uuid.uuid4().hex}"]
+            try:
+                await test(db)
+            finally:
+                await client.drop_database(db.name)
+                client.close()
+
+        asyncio.run(main())
+
+    return run
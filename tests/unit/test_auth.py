@@ -0,0 +1,59 @@
+import time
+
+import jwt
+
+from beacon.utils import auth
+from beacon.utils.auth import PermissionsCache, get_token_expiry
+
+
+def token(exp=None) -> str:
+    claims = {"sub": "someone"} if exp is None else {"sub": "someone", "exp": exp}
+    return jwt.encode(claims, "a secret of the permissions server", algorithm="HS256")
+
+
+def test_token_expiry():
+    exp = int(time.time()) + 60
+    assert get_token_expiry(token(exp)) == exp
+    assert get_token_expiry("Bearer " + token(exp)) == exp
+    assert get_token_expiry(token()) is None
+    assert get_token_expiry("not a jwt") is None
+
+
+def test_entries_expire_with_the_token(monkeypatch):
+    now = time.time()
+    cache = PermissionsCache(max_age=300, max_size=10)
+    cache.set(token(now + 10), ("dataset1",))
+    assert cache.get(token(now + 10)) == ("dataset1",)
+    monkeypatch.setattr(auth.time, "time", lambda: now + 11)
+    assert cache.get(token(now + 10)) is None
+    assert cache.metrics()["size"] == 0
+
+
+def test_entries_expire_after_max_age(monkeypatch):
+    now = time.time()
+    cache = PermissionsCache(max_age=5, max_size=10)
+    cache.set(token(now + 3600), ("dataset1",))
+    cache.set("opaque token", ("dataset2",))
+    monkeypatch.setattr(auth.time, "time", lambda: now + 6)
+    assert cache.get(token(now + 3600)) is None
+    assert cache.get("opaque token") is None
+
+
+def test_expired_tokens_are_not_cached():
+    cache = PermissionsCache(max_age=300, max_size=10)
+    cache.set(token(time.time() - 1), ("dataset1",))
+    assert cache.metrics()["size"] == 0
+
+
+def test_full_cache_drops_the_expired_then_the_oldest_entries(monkeypatch):
+    now = time.time()
+    cache = PermissionsCache(max_age=300, max_size=2)
+    cache.set(token(now + 10), ("dataset1",))
+    cache.set("second", ("dataset2",))
+    monkeypatch.setattr(auth.time, "time", lambda: now + 11)
+    cache.set("third", ("dataset3",))
+    assert cache.get("second") == ("dataset2",)
+    assert cache.get("third") == ("dataset3",)
+    cache.set("fourth", ("dataset4",))
+    assert cache.get("second") is None
+    assert cache.get("fourth") == ("dataset4",)
@@ -0,0 +1,33 @@
+from beacon.db.schemas import DefaultSchemas
+from beacon.request.model import Granularity, RequestParams
+from beacon.response.build_response import build_batch_response
+
+
+def query_response(exists, num_total_results=None, count_precision=None):
+    response = {
+        "meta": {"receivedRequestSummary": {"requestParameters": {"start": 100}}},
+        "responseSummary": {"exists": exists},
+        "response": {"resultSets": [{"id": "dataset1", "exists": exists}]},
+    }
+    if num_total_results is not None:
+        response["responseSummary"]["numTotalResults"] = num_total_results
+    if count_precision is not None:
+        response["meta"]["countPrecision"] = count_precision
+    return response
+
+
+def test_build_batch_response_count():
+    responses = [query_response(True, 3, "lowerBound"), query_response(False, 0)]
+    response = build_batch_response(responses, RequestParams(), DefaultSchemas.GENOMICVARIATIONS, Granularity.COUNT)
+    assert response["responseSummary"] == {"exists": True, "numTotalResults": 3}
+    assert list(response["response"]["queries"]) == ["0", "1"]
+    assert response["response"]["queries"]["0"]["countPrecision"] == "lowerBound"
+    assert "countPrecision" not in response["response"]["queries"]["1"]
+    assert response["response"]["queries"]["1"]["resultSets"] == [{"id": "dataset1", "exists": False}]
+    assert response["meta"]["returnedGranularity"] == Granularity.COUNT
+
+
+def test_build_batch_response_boolean():
+    responses = [query_response(False), query_response(False)]
+    response = build_batch_response(responses, RequestParams(), DefaultSchemas.GENOMICVARIATIONS, Granularity.BOOLEAN)
+    assert response["responseSummary"] == {"exists": False}
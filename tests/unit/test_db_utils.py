@@ -0,0 +1,168 @@
+from types import SimpleNamespace
+
+import pytest
+
+from beacon import conf
+from beacon.db.utils import LowerBound, anti_join_pipeline, get_count_and_page, get_join_results, get_miss_query, get_semi_join_results
+from beacon.request.model import Granularity, RequestParams, UnsupportedQuery
+
+
+def test_miss_query_negates_the_query():
+    query = {"$and": [{"variation.variantType": "SNP"}, {"_position.start": {"$gte": 100}}]}
+    assert get_miss_query(query) == {"$nor": [query]}
+
+
+def test_miss_query_of_everything():
+    assert get_miss_query({}) == {"$nor": [{}]}
+
+
+def test_miss_query_of_a_text_search():
+    with pytest.raises(UnsupportedQuery):
+        get_miss_query({"$and": [{"$text": {"$search": "cancer"}}, {"datasetId": "dataset1"}]})
+
+
+def test_capped_count_and_page(mongo, monkeypatch):
+    monkeypatch.setattr(conf, "count_policies", {"biosamples": "capped"})
+    monkeypatch.setattr(conf, "count_cap", 3)
+
+    async def test(db):
+        await db.biosamples.insert_many([
+            {"id": f"b{i}", "datasetId": "dataset1", "sampleOriginType": "blood" if i < 5 else "saliva"}
+            for i in reversed(range(7))
+        ])
+        count, docs = await get_count_and_page(db.biosamples, {"sampleOriginType": "blood"}, 0, 2)
+        assert isinstance(count, LowerBound) and count == 3
+        # the first ones in the order of the pages, not in the one of the count
+        assert [doc["id"] for doc in docs] == ["b4", "b3"]
+        count, docs = await get_count_and_page(db.biosamples, {"sampleOriginType": "saliva"}, 0, 2)
+        assert not isinstance(count, LowerBound) and count == 2
+        assert ids(docs) == ["b5", "b6"]
+
+    mongo(test)
+
+
+def request(include="HIT", datasets=None, granularity=Granularity.RECORD) -> RequestParams:
+    qparams = RequestParams(query={"includeResultsetResponses": include, "pagination": {"limit": 100}})
+    return qparams if datasets is None else qparams.for_datasets(datasets, granularity)
+
+
+def collection(name: str) -> SimpleNamespace:
+    """Stands for a collection in the pipelines, that only use its name"""
+    return SimpleNamespace(name=name)
+
+
+def ids(docs) -> list:
+    return sorted(doc["id"] for doc in docs)
+
+
+def test_anti_join_of_a_text_search():
+    with pytest.raises(UnsupportedQuery):
+        anti_join_pipeline(collection("individuals"), {}, "id", collection("genomicVariations"),
+            ["caseLevelData.biosampleId"], {"$text": {"$search": "cancer"}}, None)
+
+
+def test_anti_join_without_query_only_keeps_the_documents_without_match():
+    stages = anti_join_pipeline(collection("individuals"), {}, "id", collection("genomicVariations"),
+        ["caseLevelData.biosampleId"], {"variantType": "SNP"}, ["dataset1"])
+    assert stages[0] == {"$match": {"datasetId": "dataset1"}}
+    assert not any("$unionWith" in stage for stage in stages)
+
+
+async def insert_datasets_and_biosamples(db):
+    await db.datasets.insert_many([
+        {"id": "dataset1", "ids": {"biosampleIds": ["b1", "b2"], "individualIds": ["i1"]}},
+        # no biosamples: never joined to the ones without an id
+        {"id": "dataset2", "ids": {"individualIds": ["i2"]}},
+    ])
+    await db.biosamples.insert_many([
+        {"id": "b1", "datasetId": "dataset1", "sampleOriginType": "blood"},
+        {"id": "b2", "datasetId": "dataset1", "sampleOriginType": "saliva"},
+        {"id": "b3", "datasetId": "dataset1", "sampleOriginType": "blood"},
+        {"datasetId": "dataset1", "sampleOriginType": "blood", "notes": "without id"},
+        {"id": "b4", "datasetId": "dataset2", "sampleOriginType": "blood"},
+    ])
+
+
+def test_join_results(mongo):
+    async def test(db):
+        await insert_datasets_and_biosamples(db)
+        args = (db.datasets, {"id": "dataset1"}, ["ids.biosampleIds"], db.biosamples, "id")
+
+        count, docs = await get_join_results(*args, {}, request("HIT"))
+        assert (count, ids(docs)) == (2, ["b1", "b2"])
+        count, docs = await get_join_results(*args, {"sampleOriginType": "blood"}, request("HIT"))
+        assert (count, ids(docs)) == (1, ["b1"])
+
+    mongo(test)
+
+
+def test_join_miss_results_are_the_complement(mongo):
+    async def test(db):
+        await insert_datasets_and_biosamples(db)
+        args = (db.datasets, {"id": "dataset1"}, ["ids.biosampleIds"], db.biosamples, "id")
+
+        count, docs = await get_join_results(*args, {}, request("MISS"))
+        assert count == 3
+        assert ids(doc for doc in docs if "id" in doc) == ["b3", "b4"]
+        # the ones that don't match the target query, and the ones that do without a match
+        count, docs = await get_join_results(*args, {"sampleOriginType": "blood"}, request("MISS"))
+        assert count == 4
+        assert ids(doc for doc in docs if "id" in doc) == ["b2", "b3", "b4"]
+
+    mongo(test)
+
+
+def test_join_miss_results_by_dataset(mongo):
+    async def test(db):
+        await insert_datasets_and_biosamples(db)
+        args = (db.datasets, {"id": "dataset1"}, ["ids.biosampleIds"], db.biosamples, "id", {})
+
+        count, results = await get_join_results(*args, request("MISS", ["dataset1", "dataset2"]))
+        assert count == 3
+        assert results["dataset1"][0] == 2
+        assert ids(results["dataset2"][1]) == ["b4"]
+        count, results = await get_join_results(*args, request("MISS", ["dataset1", "dataset2"], Granularity.COUNT))
+        assert (count, results["dataset1"][0], results["dataset2"][0]) == (3, 2, 1)
+
+    mongo(test)
+
+
+async def insert_individuals_and_variants(db, other_variants: int):
+    await db.individuals.insert_many([
+        {"id": "i1", "datasetId": "dataset1", "sex": "female"},
+        {"id": "i2", "datasetId": "dataset1", "sex": "female"},
+        {"id": "i3", "datasetId": "dataset1", "sex": "male"},
+    ])
+    await db.genomicVariations.insert_many([
+        {"_info": {"datasetId": "dataset1"}, "variantType": "SNP", "caseLevelData": [{"biosampleId": "i1"}, {"biosampleId": "i3"}]},
+        {"_info": {"datasetId": "dataset1"}, "variantType": "INDEL", "caseLevelData": [{"biosampleId": "i2"}]},
+        *({"_info": {"datasetId": "dataset1"}, "variantType": "SNP", "caseLevelData": [{"biosampleId": "i3"}]} for _ in range(other_variants)),
+    ])
+
+
+# the collection with fewer matches is evaluated first, so both ways are tested
+@pytest.mark.parametrize("other_variants", [0, 10])
+def test_semi_join_results(mongo, other_variants):
+    async def test(db):
+        await insert_individuals_and_variants(db, other_variants)
+        args = (db.individuals, {"sex": "female"}, "id", db.genomicVariations, "caseLevelData.biosampleId", {"variantType": "SNP"})
+
+        count, docs = await get_semi_join_results(*args, request("HIT"))
+        assert (count, ids(docs)) == (1, ["i1"])
+        count, results = await get_semi_join_results(*args, request("HIT", ["dataset1"]))
+        assert (count, ids(results["dataset1"][1])) == (1, ["i1"])
+
+    mongo(test)
+
+
+def test_semi_join_miss_results_are_the_complement(mongo):
+    async def test(db):
+        await insert_individuals_and_variants(db, 0)
+        args = (db.individuals, {"sex": "female"}, "id", db.genomicVariations, "caseLevelData.biosampleId", {"variantType": "SNP"})
+
+        count, docs = await get_semi_join_results(*args, request("MISS"))
+        assert (count, ids(docs)) == (2, ["i2", "i3"])
+        count, results = await get_semi_join_results(*args, request("MISS", ["dataset1"]))
+        assert (count, ids(results["dataset1"][1])) == (2, ["i2", "i3"])
+
+    mongo(test)
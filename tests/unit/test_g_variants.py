@@ -0,0 +1,27 @@
+import pytest
+
+from beacon.db.g_variants import get_query_region
+from beacon.request.model import RequestParams
+
+
+def request(**request_parameters) -> RequestParams:
+    return RequestParams(query={"requestParameters": request_parameters})
+
+
+def test_region_of_an_overlap_query():
+    assert get_query_region(request(referenceName="chr1", start=100, end=200)) == ("1", 100, 200)
+    assert get_query_region(request(referenceName="1", start=[100], end=[200], datasets=["dataset1"])) == ("1", 100, 200)
+
+
+@pytest.mark.parametrize("request_parameters", [
+    # brackets
+    {"referenceName": "1", "start": [100, 150], "end": [200, 250]},
+    {"referenceName": "1", "start": [100, 150], "end": 200},
+    # the statistics aren't split by assembly
+    {"referenceName": "1", "start": 100, "end": 200, "assemblyId": "GRCh38"},
+    {"referenceName": "1", "start": 100, "end": 200, "variantType": "SNP"},
+    {"referenceName": "1", "start": 100},
+    {"referenceName": "1", "start": "first", "end": 200},
+])
+def test_no_region_of_the_other_queries(request_parameters):
+    assert get_query_region(request(**request_parameters)) is None
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from beacon.request import handlers
+from beacon.request.model import Granularity, RequestParams
+
+
+@pytest.fixture(autouse=True)
+def no_db(monkeypatch):
+    async def dataset_version(dataset_id):
+        return 0, 0
+
+    monkeypatch.setattr(handlers.DATASET_REGISTRY, "dataset_version", dataset_version)
+    monkeypatch.setattr(handlers.RESULT_CACHE, "max_bytes", 0)
+    monkeypatch.setattr(handlers.conf, "coalesce_queries", False)
+
+
+def query_dataset_batches(db_fn, dataset_batches, target_datasets):
+    return handlers.query_dataset_batches(db_fn, None, RequestParams(), dataset_batches, target_datasets,
+        user_id=None, is_authenticated=False, accessible_datasets=target_datasets, use_rip=False)
+
+
+def test_dataset_batches_run_concurrently():
+    async def run():
+        started = []
+        all_started = asyncio.Event()
+
+        async def db_fn(entry_id, qparams):
+            started.append(qparams.target_datasets)
+            if len(started) == 3:
+                all_started.set()
+            # only returns once every batch is running
+            await all_started.wait()
+            return "schema", 0, {dataset_id: (1, []) for dataset_id in qparams.target_datasets}
+
+        batches = [(["dataset1"], Granularity.COUNT), (["dataset2"], Granularity.COUNT), (["dataset3"], Granularity.COUNT)]
+        return await asyncio.wait_for(query_dataset_batches(db_fn, batches, ["dataset3", "dataset1", "dataset2"]), 5)
+
+    entity_schema, results = asyncio.run(run())
+    assert entity_schema == "schema"
+    # in the order of the request
+    assert list(results.items()) == [("dataset3", (1, [])), ("dataset1", (1, [])), ("dataset2", (1, []))]
+
+
+def test_failed_batch_cancels_the_others():
+    cancelled = []
+
+    async def run():
+        async def db_fn(entry_id, qparams):
+            if qparams.target_datasets == ["dataset1"]:
+                await asyncio.sleep(0)
+                raise RuntimeError("query failed")
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(qparams.target_datasets)
+                raise
+
+        batches = [(["dataset1"], Granularity.RECORD), (["dataset2", "dataset3"], Granularity.RECORD)]
+        await asyncio.wait_for(query_dataset_batches(db_fn, batches, ["dataset1", "dataset2", "dataset3"]), 5)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert cancelled == [["dataset2", "dataset3"]]
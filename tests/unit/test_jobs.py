@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from beacon import conf
+from beacon.db.utils import DatasetPage
+from beacon.request.jobs import QueryJobs
+from beacon.request.model import Granularity, RequestParams, decode_page_token
+
+
+class Datasets:
+    """db_fn of the jobs, with the given number of records by dataset, paged by their index"""
+
+    def __init__(self, sizes):
+        self.records = {dataset_id: [{"id": f"{dataset_id}-{i}"} for i in range(size)] for dataset_id, size in sizes.items()}
+        self.pages = 0
+
+    async def __call__(self, entry_id, qparams):
+        results = {}
+        if qparams.granularity != Granularity.RECORD:
+            for dataset_id in qparams.target_datasets:
+                results[dataset_id] = (len(self.records[dataset_id]), DatasetPage())
+            return None, None, results
+        self.pages += 1
+        token = qparams.query.pagination.next
+        next_keys = decode_page_token(token) if token else {}
+        limit = qparams.query.pagination.limit
+        for dataset_id in qparams.target_datasets:
+            records = self.records[dataset_id]
+            start = next_keys.get(dataset_id, [0])[0]
+            end = start + limit
+            results[dataset_id] = (len(records), DatasetPage(records[start:end], [end] if end < len(records) else None))
+        return None, None, results
+
+
+@pytest.fixture
+def jobs_conf(monkeypatch, tmp_path):
+    monkeypatch.setattr(conf, "query_jobs_dir", str(tmp_path))
+    monkeypatch.setattr(conf, "query_job_page_size", 2)
+    monkeypatch.setattr(conf, "query_job_max_records", 1000)
+    monkeypatch.setattr(conf, "query_job_max_bytes", 1024 ** 2)
+    monkeypatch.setattr(conf, "query_job_max_retained", 1000)
+    return tmp_path
+
+
+def run_job(db_fn, datasets, record_datasets=None, granularity=Granularity.RECORD):
+    """Runs a job to the end, returns it with all its spooled records"""
+    async def run():
+        jobs = QueryJobs()
+        job = jobs.submit(db_fn, RequestParams(), datasets,
+            datasets if record_datasets is None else record_datasets, granularity, "user")
+        await job.task
+        return job, [line.parsed for line in await jobs.read(job, 0, len(job.offsets) + 1)]
+
+    return asyncio.run(run())
+
+
+def test_job_spools_every_page(jobs_conf):
+    db_fn = Datasets({"dataset1": 5, "dataset2": 2})
+    job, records = run_job(db_fn, ["dataset1", "dataset2"])
+    assert job.status == "done" and not job.truncated
+    assert job.counts == {"dataset1": 5, "dataset2": 2}
+    assert db_fn.pages == 3
+    assert sorted(record["record"]["id"] for record in records) == \
+        sorted(record["id"] for dataset in db_fn.records.values() for record in dataset)
+
+
+def test_job_counts_the_datasets_without_records(jobs_conf):
+    job, records = run_job(Datasets({"dataset1": 3, "dataset2": 4}), ["dataset1", "dataset2"], ["dataset1"])
+    assert job.counts == {"dataset1": 3, "dataset2": 4}
+    assert [record["datasetId"] for record in records] == ["dataset1"] * 3
+
+
+def test_count_job_spools_nothing(jobs_conf):
+    db_fn = Datasets({"dataset1": 3})
+    job, records = run_job(db_fn, ["dataset1"], granularity=Granularity.COUNT)
+    assert job.summary()["numTotalResults"] == 3
+    assert records == [] and db_fn.pages == 0
+
+
+def test_job_stops_at_the_record_limit(jobs_conf, monkeypatch):
+    monkeypatch.setattr(conf, "query_job_max_records", 3)
+    db_fn = Datasets({"dataset1": 10})
+    job, records = run_job(db_fn, ["dataset1"])
+    assert job.status == "done" and job.truncated
+    assert len(job.offsets) == len(records) == 3
+    assert job.counts == {"dataset1": 3}
+    assert db_fn.pages == 2
+
+
+def test_job_stops_at_the_byte_limit(jobs_conf, monkeypatch):
+    monkeypatch.setattr(conf, "query_job_max_bytes", 100)
+    job, records = run_job(Datasets({"dataset1": 10}), ["dataset1"])
+    assert job.truncated
+    assert 0 < len(records) < 10
+    assert job.size <= 100
+    assert job.size == sum(path.stat().st_size for path in jobs_conf.iterdir())
+
+
+def test_read_pages_of_the_spooled_records(jobs_conf):
+    async def run():
+        jobs = QueryJobs()
+        job = jobs.submit(Datasets({"dataset1": 5}), RequestParams(), ["dataset1"], ["dataset1"],
+            Granularity.RECORD, "user")
+        await job.task
+        page = await jobs.read(job, 1, 2)
+        assert [line.parsed["record"]["id"] for line in page] == ["dataset1-1", "dataset1-2"]
+        assert await jobs.read(job, 5, 2) == []
+        assert jobs.get(job.id, "someone else") is None
+
+    asyncio.run(run())
+
+
+def test_oldest_finished_jobs_are_removed(jobs_conf, monkeypatch):
+    monkeypatch.setattr(conf, "query_job_max_retained", 1)
+
+    async def run():
+        jobs = QueryJobs()
+        first = jobs.submit(Datasets({"dataset1": 1}), RequestParams(), ["dataset1"], ["dataset1"],
+            Granularity.RECORD, "user")
+        await first.task
+        second = jobs.submit(Datasets({"dataset1": 1}), RequestParams(), ["dataset1"], ["dataset1"],
+            Granularity.RECORD, "user")
+        await second.task
+        third = jobs.submit(Datasets({"dataset1": 1}), RequestParams(), ["dataset1"], ["dataset1"],
+            Granularity.RECORD, "user")
+        await third.task
+        assert jobs.get(first.id, "user") is None
+        assert jobs.get(second.id, "user") is second
+        return first
+
+    first = asyncio.run(run())
+    assert not (jobs_conf / f"{first.id}.ndjson").exists()
+    assert len(list(jobs_conf.iterdir())) == 2
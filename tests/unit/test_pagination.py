@@ -0,0 +1,47 @@
+import pytest
+
+from bson import ObjectId
+
+from beacon.db.utils import seek_query
+from beacon.request.model import InvalidPageToken, Pagination, decode_page_token, encode_page_token
+
+
+def test_page_token_round_trip():
+    next_keys = {"dataset1": ["dataset1", "NC_000001.11", 12345, ObjectId()], "dataset2": ["dataset2", None]}
+    assert decode_page_token(encode_page_token(next_keys)) == next_keys
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    encode_page_token([]),
+    encode_page_token({"dataset1": "key"}),
+    encode_page_token({"dataset1": [{"$gt": ""}]}),
+])
+def test_invalid_page_token(token):
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(token)
+
+
+def test_pagination_rejects_invalid_token():
+    with pytest.raises(ValueError):
+        Pagination(next=encode_page_token({"dataset1": [{"$ne": None}]}))
+
+
+def test_seek_query():
+    assert seek_query(["datasetId", "_id"], ["dataset1", 7]) == {"$or": [
+        {"datasetId": {"$gt": "dataset1"}},
+        {"datasetId": "dataset1", "_id": {"$gt": 7}},
+    ]}
+
+
+def test_seek_query_after_null():
+    assert seek_query(["a", "b"], [None, 1]) == {"$or": [
+        {"a": {"$ne": None}},
+        {"a": None, "b": {"$gt": 1}},
+    ]}
+
+
+@pytest.mark.parametrize("after", [["dataset1"], ["dataset1", {"$gt": 0}], "dataset1"])
+def test_seek_query_invalid_key(after):
+    with pytest.raises(InvalidPageToken):
+        seek_query(["datasetId", "_id"], after)
@@ -0,0 +1,24 @@
+import pytest
+
+from beacon.db.positions import overlapping_bins, position_bin
+
+
+@pytest.mark.parametrize("start, end", [
+    (0, 0), (1000, 1010), (131071, 131072), (5000000, 5300000), (200000000, 200000001),
+])
+def test_overlapping_bins_have_the_bins_of_the_overlapping_variants(start, end):
+    bins = set(overlapping_bins(start, end))
+    for variant_start, variant_end in [
+        (start, start), (end, end), (max(0, start - 100000), start), (end, end + 100000), (max(0, start - 1), end + 1),
+    ]:
+        assert position_bin(variant_start, variant_end) in bins
+
+
+def test_overlapping_bins_of_a_position():
+    # one bin by level
+    assert len(overlapping_bins(123456, 123456)) == 6
+    assert position_bin(123456) in overlapping_bins(123456, 123456)
+
+
+def test_overlapping_bins_exclude_far_variants():
+    assert position_bin(10000000, 10000010) not in overlapping_bins(1000, 2000)
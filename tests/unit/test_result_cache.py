@@ -0,0 +1,55 @@
+import pytest
+
+from beacon.request.model import Granularity, RequestParams
+from beacon.request.result_cache import ResultCache
+
+
+async def get_variants(entry_id, qparams):
+    pass
+
+
+async def get_analyses(entry_id, qparams):
+    pass
+
+
+def request(request_parameters=None, filters=None, **query) -> RequestParams:
+    return RequestParams(query={"requestParameters": request_parameters or {}, "filters": filters or [], **query})
+
+
+def test_same_key_for_equivalent_queries():
+    a = request({"referenceName": "1", "start": 100, "datasets": ["dataset1"]}, [{"id": "NCIT:C20197"}, {"id": "NCIT:C16576"}])
+    b = request({"start": 100, "referenceName": "1"}, [{"id": "NCIT:C16576"}, {"id": "NCIT:C20197"}])
+    assert ResultCache.query_key(get_variants, None, a, Granularity.COUNT) \
+        == ResultCache.query_key(get_variants, None, b, Granularity.COUNT)
+
+
+@pytest.mark.parametrize("db_fn, entry_id, qparams, granularity", [
+    (get_analyses, None, request({"start": 100}), Granularity.COUNT),
+    (get_variants, "variant1", request({"start": 100}), Granularity.COUNT),
+    (get_variants, None, request({"start": 101}), Granularity.COUNT),
+    (get_variants, None, request({"start": 100}, [{"id": "NCIT:C20197"}]), Granularity.COUNT),
+    (get_variants, None, request({"start": 100}, pagination={"skip": 10}), Granularity.COUNT),
+    (get_variants, None, request({"start": 100}), Granularity.RECORD),
+])
+def test_different_key_for_different_queries(db_fn, entry_id, qparams, granularity):
+    assert ResultCache.query_key(db_fn, entry_id, qparams, granularity) \
+        != ResultCache.query_key(get_variants, None, request({"start": 100}), Granularity.COUNT)
+
+
+def test_entries_of_another_version_are_dropped():
+    cache = ResultCache(max_bytes=1000, ttl=60)
+    cache.set("query", "dataset1", (1, 0), "results", size=10)
+    assert cache.get("query", "dataset1", (1, 0)) == "results"
+    assert cache.get("query", "dataset1", (2, 0)) is None
+    assert cache.get("query", "dataset1", (1, 0)) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_bytes=100, ttl=60)
+    cache.set("query1", "dataset1", 0, "results1", size=40)
+    cache.set("query2", "dataset1", 0, "results2", size=40)
+    cache.get("query1", "dataset1", 0)
+    cache.set("query3", "dataset1", 0, "results3", size=40)
+    assert cache.get("query2", "dataset1", 0) is None
+    assert cache.get("query1", "dataset1", 0) == "results1"
+    assert cache.size == 80
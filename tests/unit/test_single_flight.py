@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from beacon.request.single_flight import SingleFlight
+
+
+class Query:
+    """fn of SingleFlight.run that records the keys of each call and waits for release"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.fail = fail
+
+    async def __call__(self, keys):
+        self.calls.append(sorted(keys))
+        self.started.set()
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("query failed")
+        return {key: key.upper() for key in keys}
+
+
+def test_identical_queries_run_once():
+    async def test():
+        flight, query = SingleFlight(), Query()
+        first = asyncio.create_task(flight.run(["a", "b"], query))
+        await query.started.wait()
+        second = asyncio.create_task(flight.run(["a", "b"], query))
+        await asyncio.sleep(0)
+        query.release.set()
+        assert await first == await second == {"a": "A", "b": "B"}
+        assert query.calls == [["a", "b"]]
+        assert flight.metrics() == {"executions": 2, "coalesced": 2, "inFlight": 0}
+
+    asyncio.run(test())
+
+
+def test_only_the_keys_not_in_flight_run():
+    async def test():
+        flight, query = SingleFlight(), Query()
+        first = asyncio.create_task(flight.run(["a"], query))
+        await query.started.wait()
+        second = asyncio.create_task(flight.run(["a", "b"], query))
+        await asyncio.sleep(0)
+        query.release.set()
+        assert await second == {"a": "A", "b": "B"}
+        assert await first == {"a": "A"}
+        assert query.calls == [["a"], ["b"]]
+
+    asyncio.run(test())
+
+
+def test_finished_queries_run_again():
+    async def test():
+        flight, query = SingleFlight(), Query()
+        query.release.set()
+        await flight.run(["a"], query)
+        await flight.run(["a"], query)
+        assert query.calls == [["a"], ["a"]]
+
+    asyncio.run(test())
+
+
+def test_failure_reaches_the_coalesced_queries():
+    async def test():
+        flight, query = SingleFlight(), Query(fail=True)
+        first = asyncio.create_task(flight.run(["a"], query))
+        await query.started.wait()
+        second = asyncio.create_task(flight.run(["a"], query))
+        await asyncio.sleep(0)
+        query.release.set()
+        for task in (first, second):
+            with pytest.raises(RuntimeError):
+                await task
+        assert flight.metrics()["inFlight"] == 0
+
+    asyncio.run(test())
+
+
+def test_cancelled_waiter_does_not_cancel_the_query():
+    async def test():
+        flight, query = SingleFlight(), Query()
+        first = asyncio.create_task(flight.run(["a"], query))
+        await query.started.wait()
+        second = asyncio.create_task(flight.run(["a"], query))
+        await asyncio.sleep(0)
+        second.cancel()
+        query.release.set()
+        assert await first == {"a": "A"}
+        assert second.cancelled()
+
+    asyncio.run(test())
@@ -0,0 +1,58 @@
+import numpy as np
+
+from beacon.db.variant_index import NO_END, DatasetPositions, allele_hash
+
+
+def dataset_positions(variants, normalized_alleles=False) -> DatasetPositions:
+    """Index of [(assemblyId, refseqId, start, end, referenceBases, alternateBases)], sorted by start"""
+    partitions = {}
+    columns = {"start": [], "end": [], "allele": []}
+    first = 0
+    for assembly_id, refseq_id in sorted({(variant[0], variant[1]) for variant in variants}):
+        rows = sorted((v for v in variants if (v[0], v[1]) == (assembly_id, refseq_id)), key=lambda v: v[2])
+        for _, _, start, end, reference_bases, alternate_bases in rows:
+            columns["start"].append(start)
+            columns["end"].append(NO_END if end is None else end)
+            columns["allele"].append(allele_hash(reference_bases, alternate_bases, normalized_alleles))
+        max_length = max((end - start for _, _, start, end, _, _ in rows if end is not None), default=0)
+        partitions.setdefault(refseq_id, {})[assembly_id] = [first, first + len(rows), max_length]
+        first += len(rows)
+    arrays = {
+        "start": np.array(columns["start"], dtype=np.int64),
+        "end": np.array(columns["end"], dtype=np.int64),
+        "allele": np.array(columns["allele"], dtype=np.uint64),
+    }
+    return DatasetPositions(("v1",), partitions, arrays, normalized_alleles)
+
+
+POSITIONS = dataset_positions([
+    ("GRCh38", "1", 100, 100, "A", "T"),
+    ("GRCh38", "1", 100, 100, "A", "G"),
+    ("GRCh38", "1", 150, 400, "A", "<DEL>"),
+    ("GRCh38", "1", 500, None, "C", "T"),
+    ("GRCh37", "1", 100, 100, "A", "T"),
+    ("GRCh38", "2", 100, 100, "A", "T"),
+])
+
+
+def test_count_sequence():
+    assert POSITIONS.count_sequence("1", "GRCh38", 100, [allele_hash("A", "T", False)]) == 1
+    assert POSITIONS.count_sequence("1", None, 100, [allele_hash("A", "T", False)]) == 2
+    assert POSITIONS.count_sequence("1", "GRCh38", 100, [allele_hash("A", "T", False), allele_hash("A", "G", False)]) == 2
+    assert POSITIONS.count_sequence("1", "GRCh38", 101, [allele_hash("A", "T", False)]) == 0
+    assert POSITIONS.count_sequence("X", "GRCh38", 100, [allele_hash("A", "T", False)]) == 0
+
+
+def test_count_overlapping():
+    assert POSITIONS.count_overlapping("1", "GRCh38", 90, 110) == 2
+    # the long variant starts before the region
+    assert POSITIONS.count_overlapping("1", "GRCh38", 300, 350) == 1
+    assert POSITIONS.count_overlapping("1", None, 100, 100) == 3
+    # variants without an end don't overlap
+    assert POSITIONS.count_overlapping("1", "GRCh38", 450, 600) == 0
+    assert POSITIONS.count_overlapping("2", "GRCh37", 0, 1000) == 0
+
+
+def test_allele_hash_normalization():
+    assert allele_hash(" a", "t ", True) == allele_hash("A", "T", True)
+    assert allele_hash("a", "t", False) != allele_hash("A", "T", False)